@@ -0,0 +1,95 @@
+"""Benchmark archive codecs (throughput & ratio) on a generated JEL.
+
+The JEL is generated by repeating the events in 'tests/job_event_logs/condor_test_logfile'
+with varied cluster/proc ids, so it compresses like a real one.
+
+Run with the package installed (or from the repo root w/ PYTHONPATH=.):
+
+    JOB_EVENT_LOG_DIR=$(mktemp -d) EWMS_ADDRESS= EWMS_TOKEN_URL= \
+    EWMS_CLIENT_ID= EWMS_CLIENT_SECRET= \
+        python benchmarks/bench_archive_codecs.py [SIZE_MB]
+"""
+
+import random
+import re
+import shutil
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+from tms.file_manager import codecs, file_manager
+
+SAMPLE_JEL = Path(__file__).parent.parent / "tests/job_event_logs/condor_test_logfile"
+
+# (codec, level, threads) -- level=None -> codec's default
+CANDIDATES = [
+    ("gzip", 1, 1),
+    ("gzip", 6, 1),
+    ("gzip", None, 1),
+    ("gzip", None, 2),
+    ("gzip", None, 4),
+    ("gzip", None, 8),
+    ("zstd", 1, 1),
+    ("zstd", None, 1),
+    ("zstd", 9, 1),
+    ("zstd", 9, 4),
+    ("none", None, 1),
+]
+
+
+def generate_jel(fpath: Path, size_mb: int) -> None:
+    """Write a JEL of ~`size_mb` MB."""
+    events = SAMPLE_JEL.read_text().split("...\n")
+    rng = random.Random(42)
+    with open(fpath, "w") as f:
+        while f.tell() < size_mb * 1024 * 1024:
+            cluster = rng.randint(100_000_000, 100_000_500)
+            for event in events:
+                event = re.sub(
+                    r"\(\d+\.(\d+)\.(\d+)\)",
+                    lambda m: f"({cluster}.{rng.randint(0, 999):03d}.{m.group(2)})",
+                    event,
+                )
+                f.write(event + "...\n")
+
+
+def main() -> None:
+    size_mb = int(sys.argv[1]) if len(sys.argv) > 1 else 64
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        src = Path(tmpdir) / "bench.tms.jel"
+        generate_jel(src, size_mb)
+        n_bytes = src.stat().st_size
+        print(f"generated JEL: {n_bytes / 1024**2:.1f} MB")
+        print(
+            f"{'codec':>6} {'level':>7} {'threads':>7} {'MB/s':>9} {'ratio':>7} {'size MB':>9}"
+        )
+
+        for name, level, threads in CANDIDATES:
+            try:
+                codec = codecs.get_codec(name, level, threads)
+            except RuntimeError as e:  # ex: zstandard not installed
+                print(f"{name:>6} {'-':>7} {'-':>7} skipped: {e}")
+                continue
+
+            work = Path(tmpdir) / f"{name}-{level}-{threads}.tms.jel"
+            shutil.copyfile(src, work)
+
+            start = time.perf_counter()
+            file_manager.action_compress(work, codec=codec)
+            elapsed = time.perf_counter() - start
+
+            archive = work.with_name(work.name + codec.file_suffix)
+            n_out = archive.stat().st_size
+            print(
+                f"{name:>6} {str(level):>7} {threads:>7} "
+                f"{n_bytes / 1024**2 / elapsed:9.1f} "
+                f"{n_bytes / n_out:7.1f} "
+                f"{n_out / 1024**2:9.2f}"
+            )
+            archive.unlink()
+
+
+if __name__ == "__main__":
+    main()
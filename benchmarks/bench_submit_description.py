@@ -0,0 +1,69 @@
+"""Microbenchmark for building a taskforce's condor submit description.
+
+Compares building the submit description with warm caches (the normal case:
+many taskforces sharing a few distinct requirements/sizes) against cold
+caches (every taskforce is novel).
+
+Run with the package installed (or from the repo root w/ PYTHONPATH=.):
+
+    JOB_EVENT_LOG_DIR=$(mktemp -d) EWMS_ADDRESS= EWMS_TOKEN_URL= \
+    EWMS_CLIENT_ID= EWMS_CLIENT_SECRET= \
+        python benchmarks/bench_submit_description.py [N]
+"""
+
+import sys
+import time
+
+import htcondor  # type: ignore[import-untyped]
+
+from tms.scalar import starter, submit_template
+
+
+def _make_one(i: int) -> None:
+    submit_dict, _ = starter.make_condor_job_description(
+        f"TF-bench-{i % 100}",  # reuse dirs, so this measures cpu not mkdir
+        dict(
+            tag="v1.2.3",
+            image_source="cvmfs",
+            environment={"EWMS_PILOT_TASK_IMAGE": "foo", "N": str(i % 10)},
+            input_files=[],
+        ),
+        dict(
+            do_transfer_worker_stdouterr=True,
+            max_worker_runtime=60 * 60,
+            n_cores=1,
+            priority=100,
+            worker_disk="8 GB",
+            worker_memory="4 GB",
+            condor_requirements='GLIDEIN_Site =!= "Nowhere"',
+        ),
+        1000,
+    )
+    htcondor.Submit(submit_dict)
+
+
+def _bench(n: int, clear_caches: bool) -> float:
+    start = time.perf_counter()
+    for i in range(n):
+        if clear_caches:
+            submit_template.get_requirements.cache_clear()
+            submit_template.to_condor_size.cache_clear()
+        _make_one(i)
+    return (time.perf_counter() - start) / n
+
+
+def main() -> None:
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 2_000
+    _make_one(0)  # warm-up (imports, first mkdirs)
+
+    cold = _bench(n, clear_caches=True)
+    warm = _bench(n, clear_caches=False)
+
+    print(f"submit descriptions built: {n}")
+    print(f"cold caches: {cold * 1e6:9.1f} us/taskforce")
+    print(f"warm caches: {warm * 1e6:9.1f} us/taskforce")
+    print(f"speedup:     {cold / warm:9.2f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,172 @@
+"""Load & latency benchmark: the whole TMS against a fake EWMS & schedd.
+
+Runs `tms.__main__.main()` (scalar, watcher, file manager, ...) unmodified,
+against `fake_ewms.FakeEWMS` (over HTTP, w/ injectable latency & errors)
+and `fake_schedd.FakeSchedd` (which writes real JELs), with a backlog of
+pending-starter taskforces. Each taskforce is stopped `--stop-after` secs
+after it's submitted. Then, the end-to-end latencies are reported, as
+seen by EWMS:
+
+    submit    -- taskforce created -> condor-submit (queueing in the backlog + the start)
+    status    -- condor-submit -> first status update
+    rm        -- pending-stopper -> condor-rm
+    complete  -- condor-rm -> condor-complete
+
+Run from the repo root (TMS_* env vars can be set to override the defaults here):
+
+    PYTHONPATH=. python benchmarks/bench_tms_loadtest.py \
+        --taskforces 200 --latency 0.05 --jitter 0.02 --error-rate 0.01
+
+W/ '--schedds N', one TMS serves N fake schedds ('TMS_SCHEDDS'), each w/
+its own backlog.
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+import os
+import statistics
+import sys
+import tempfile
+import time
+from collections import Counter
+from pathlib import Path
+from typing import Any
+from unittest.mock import MagicMock, patch
+
+from fake_ewms import FakeEWMS, Faults
+from fake_schedd import FakeSchedd
+
+SCHEDD = "fake-schedd.localhost"
+
+# fast loops, so the run is about the TMS's work, not its waits
+TMS_ENV_DEFAULTS = dict(
+    EWMS_CLIENT_ID="tms",
+    EWMS_CLIENT_SECRET="secret",
+    TMS_OUTER_LOOP_WAIT="1",
+    TMS_WATCHER_INTERVAL="1",
+    TMS_FILE_MANAGER_INTERVAL=str(60 * 60),
+    TMS_ERROR_WAIT="1",
+    TMS_EWMS_BREAKER_COOLDOWN="2",
+    TMS_LOOP_STALL_THRESHOLD="0.5",
+)
+
+
+def _summarize(vals: list[float]) -> dict[str, float | int]:
+    if not vals:
+        return {"n": 0}
+    vals = sorted(vals)
+    return {
+        "n": len(vals),
+        "p50": round(statistics.median(vals), 3),
+        "p95": round(vals[min(len(vals) - 1, int(len(vals) * 0.95))], 3),
+        "max": round(vals[-1], 3),
+    }
+
+
+def _per_sec(timelines: list[dict[str, float]], t0: float, phase: str) -> float:
+    """Get the rate of taskforces reaching the phase (from t0 until the last one)."""
+    if not (ts := [t[phase] - t0 for t in timelines if phase in t]):
+        return 0.0
+    return round(len(ts) / max(ts), 2)
+
+
+def report(ewms: FakeEWMS, duration: float) -> dict[str, Any]:
+    """Get the latencies, throughputs & request counts."""
+    spans = {
+        "submit": ("created", "condor-submit"),
+        "status": ("condor-submit", "first_status"),
+        "rm": ("pending-stopper", "condor-rm"),
+        "complete": ("condor-rm", "condor-complete"),
+    }
+    timelines = [ewms.timeline[u] for u in ewms.taskforces]
+    t0 = min((t["created"] for t in timelines), default=0.0)
+    return {
+        "duration": round(duration, 1),
+        "taskforces": len(timelines),
+        "latencies": {
+            name: _summarize([t[b] - t[a] for t in timelines if a in t and b in t])
+            for name, (a, b) in spans.items()
+        },
+        "per_sec": {
+            phase: _per_sec(timelines, t0, phase)
+            for phase in ["condor-submit", "condor-rm", "condor-complete"]
+        },
+        "submits_per_schedd": dict(
+            Counter(
+                tf["schedd"] for tf in ewms.taskforces.values() if tf["cluster_id"] is not None
+            ).most_common()
+        ),
+        "requests": dict(ewms.n_requests.most_common()),
+        "injected_errors": dict(ewms.n_injected_errors.most_common()),
+        "status_updates": ewms.n_status_updates,
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--taskforces", type=int, default=50, help="backlog, per schedd")
+    parser.add_argument("--schedds", type=int, default=1, help="1 -> just the local schedd")
+    parser.add_argument("--workers", type=int, default=10, help="per taskforce")
+    parser.add_argument("--duration", type=float, default=60, help="secs to run the TMS")
+    parser.add_argument("--stop-after", type=float, default=10, help="secs after submit")
+    parser.add_argument("--latency", type=float, default=0.0, help="EWMS's, secs")
+    parser.add_argument("--jitter", type=float, default=0.0, help="EWMS's, secs")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="EWMS's 503s")
+    parser.add_argument("--exec-delay", type=float, default=1.0, help="secs till jobs run")
+    parser.add_argument("--submit-latency", type=float, default=0.0, help="schedd's, secs")
+    parser.add_argument("--json", type=Path, default=None, help="also write the report here")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.WARNING)
+
+    names = [SCHEDD] if args.schedds == 1 else [f"ap{i}.{SCHEDD}" for i in range(args.schedds)]
+    ewms = FakeEWMS(Faults(args.latency, args.jitter, args.error_rate), args.stop_after)
+    for name in names:
+        ewms.add_taskforces(args.taskforces, name, args.workers)
+    address = ewms.start()
+    schedds = {n: FakeSchedd(args.exec_delay, submit_latency=args.submit_latency) for n in names}
+
+    # the TMS's config is read at import, so set it up first
+    jel_dir = tempfile.TemporaryDirectory(prefix="tms-loadtest-")
+    os.environ.update(
+        EWMS_ADDRESS=address,
+        EWMS_TOKEN_URL=address,
+        JOB_EVENT_LOG_DIR=jel_dir.name,
+    )
+    if args.schedds > 1:
+        os.environ["TMS_SCHEDDS"] = " ".join(names)
+    for key, val in TMS_ENV_DEFAULTS.items():
+        os.environ.setdefault(key, val)
+    from tms.__main__ import main as tms_main
+
+    # a listed schedd is "located" by its name
+    collector = MagicMock()
+    collector.return_value.locate.side_effect = lambda _, name: name
+
+    start = time.monotonic()
+    with (
+        patch("htcondor.Schedd", side_effect=lambda ad=SCHEDD: schedds[ad]),
+        patch("htcondor.Collector", collector),
+        patch("htcondor.RemoteParam", return_value={}),
+        patch("htcondor.param", new={"FULL_HOSTNAME": SCHEDD}),
+    ):
+        try:
+            asyncio.run(asyncio.wait_for(tms_main(), args.duration))
+        except TimeoutError:
+            pass  # (the TMS runs forever)
+    results = report(ewms, time.monotonic() - start)
+    for schedd in schedds.values():
+        schedd.stop()
+    ewms.stop()
+    jel_dir.cleanup()
+
+    json.dump(results, sys.stdout, indent=2)
+    print()
+    if args.json:
+        args.json.write_text(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,356 @@
+"""A self-contained stand-in for EWMS, for load & latency testing the TMS.
+
+It implements every endpoint the TMS uses (plus a token endpoint, so the
+TMS's normal client-credentials auth works unmodified), keeps taskforces
+in memory, and moves them through their phases as the TMS reports back:
+
+    pending-starter -> condor-submit -> pending-stopper -> condor-rm -> condor-complete
+
+Faults are injectable: added latency (w/ jitter) and a rate of 503s. The
+server runs on its own thread & event loop, so its work doesn't show up
+as the TMS's event-loop lag.
+
+Standalone (ex: for a TMS running elsewhere):
+
+    python benchmarks/fake_ewms.py --port 8080 --taskforces 100 --schedd my.schedd
+"""
+
+import argparse
+import asyncio
+import dataclasses as dc
+import json
+import logging
+import random
+import re
+import threading
+import time
+import uuid
+from collections import Counter, defaultdict
+from typing import Any
+
+import jwt
+import tornado.httpserver
+import tornado.netutil
+import tornado.web
+
+LOGGER = logging.getLogger("fake_ewms")
+
+V = "v1"
+
+PENDING_STARTER = "pending-starter"
+CONDOR_SUBMIT = "condor-submit"
+PENDING_STOPPER = "pending-stopper"
+CONDOR_RM = "condor-rm"
+CONDOR_COMPLETE = "condor-complete"
+FAILED = "failed"
+
+
+@dc.dataclass
+class Faults:
+    """What to inject into every (non-token) response."""
+
+    latency: float = 0.0  # secs
+    jitter: float = 0.0  # secs, +/- uniformly
+    error_rate: float = 0.0  # fraction answered w/ 503
+
+    async def inject(self) -> bool:
+        """Sleep for the latency, then return whether to fail the request."""
+        if delay := max(0.0, self.latency + random.uniform(-self.jitter, self.jitter)):
+            await asyncio.sleep(delay)
+        return random.random() < self.error_rate
+
+
+def _matches(record: dict[str, Any], query: dict[str, Any]) -> bool:
+    """Match a record against a (tiny subset of a) mongo query: ==, $in, $ne."""
+    for key, cond in query.items():
+        val = record.get(key)
+        if isinstance(cond, dict):
+            if "$in" in cond and val not in cond["$in"]:
+                return False
+            if "$ne" in cond and val == cond["$ne"]:
+                return False
+        elif val != cond:
+            return False
+    return True
+
+
+class FakeEWMS:
+    """The taskforces, their timeline, and request stats."""
+
+    def __init__(self, faults: Faults | None = None, stop_after: float | None = None) -> None:
+        self.faults = faults or Faults()
+        self.stop_after = stop_after  # secs after condor-submit -> pending-stopper (None: never)
+
+        self.taskforces: dict[str, dict[str, Any]] = {}
+        self.timeline: dict[str, dict[str, float]] = defaultdict(dict)  # uuid -> event -> time
+        self.n_requests: Counter[str] = Counter()  # by endpoint
+        self.n_injected_errors: Counter[str] = Counter()
+        self.n_status_updates = 0
+        self._lock = threading.Lock()  # (requests come in on the server's thread)
+
+        self.address = ""
+        self._loop: asyncio.AbstractEventLoop | None = None
+
+    # ------------------------------------------------------------------
+    # backlog
+
+    def add_taskforces(
+        self,
+        n: int,
+        schedd: str,
+        n_workers: int = 10,
+        worker_config: dict[str, Any] | None = None,
+    ) -> list[str]:
+        """Add `n` pending-starter taskforces for the schedd."""
+        uuids = []
+        with self._lock:
+            for _ in range(n):
+                tf_uuid = f"TF-{uuid.uuid4().hex[:12]}"
+                self.taskforces[tf_uuid] = dict(
+                    taskforce_uuid=tf_uuid,
+                    schedd=schedd,
+                    phase=PENDING_STARTER,
+                    n_workers=n_workers,
+                    pilot_config=dict(
+                        tag="latest",
+                        image_source="cvmfs",
+                        environment={},
+                        input_files=[],
+                    ),
+                    worker_config=worker_config
+                    or dict(
+                        do_transfer_worker_stdouterr=False,
+                        max_worker_runtime=60 * 60,
+                        n_cores=1,
+                        priority=50,
+                        worker_disk="1 GB",
+                        worker_memory="1 GB",
+                        condor_requirements="",
+                    ),
+                    cluster_id=None,
+                    job_event_log_fpath=None,
+                    condor_complete_ts=None,
+                )
+                self.timeline[tf_uuid]["created"] = time.time()
+                uuids.append(tf_uuid)
+        return uuids
+
+    def _tick(self) -> None:
+        """Request stops for taskforces that have run long enough."""
+        if self.stop_after is None:
+            return
+        now = time.time()
+        for tf_uuid, tf in self.taskforces.items():
+            if (
+                tf["phase"] == CONDOR_SUBMIT
+                and now - self.timeline[tf_uuid][CONDOR_SUBMIT] >= self.stop_after
+            ):
+                tf["phase"] = PENDING_STOPPER
+                self.timeline[tf_uuid][PENDING_STOPPER] = now
+
+    def _set_phase(self, tf_uuid: str, phase: str, **attrs: Any) -> None:
+        self.taskforces[tf_uuid].update(phase=phase, **attrs)
+        self.timeline[tf_uuid].setdefault(phase, time.time())
+
+    # ------------------------------------------------------------------
+    # endpoints -- each returns the response body
+
+    def pending_starter(self, args: dict[str, Any]) -> dict[str, Any]:
+        for tf in self.taskforces.values():
+            if tf["phase"] == PENDING_STARTER and tf["schedd"] == args.get("schedd"):
+                return dict(
+                    taskforce=json.loads(json.dumps(tf)),  # (a copy, like over the wire)
+                    task_directive=dict(
+                        task_image="/cvmfs/foo/task:latest",
+                        task_args="",
+                        init_image="",
+                        init_args="",
+                        task_env={},
+                        init_env={},
+                        input_queues=["in"],
+                        output_queues=["out"],
+                    ),
+                    mqprofiles=[
+                        dict(
+                            mqid=q,
+                            auth_token="token",
+                            broker_type="rabbitmq",
+                            broker_address="localhost",
+                        )
+                        for q in ["in", "out"]
+                    ],
+                )
+        return {}
+
+    def pending_stopper(self, args: dict[str, Any]) -> dict[str, Any]:
+        self._tick()
+        for tf in self.taskforces.values():
+            if tf["phase"] == PENDING_STOPPER and tf["schedd"] == args.get("schedd"):
+                return {k: tf[k] for k in ["taskforce_uuid", "cluster_id"]}
+        return {}
+
+    def condor_submit(self, tf_uuid: str, args: dict[str, Any]) -> dict[str, Any]:
+        self._set_phase(
+            tf_uuid,
+            CONDOR_SUBMIT,
+            cluster_id=args["cluster_id"],
+            n_workers=args["n_workers"],
+            job_event_log_fpath=args["job_event_log_fpath"],
+        )
+        return {}
+
+    def condor_rm(self, tf_uuid: str) -> dict[str, Any]:
+        self._set_phase(tf_uuid, CONDOR_RM)
+        return {}
+
+    def failed(self, tf_uuid: str) -> dict[str, Any]:
+        self._set_phase(tf_uuid, FAILED)
+        return {}
+
+    def condor_complete(self, tf_uuid: str, args: dict[str, Any]) -> dict[str, Any]:
+        self._set_phase(tf_uuid, CONDOR_COMPLETE, condor_complete_ts=args["condor_complete_ts"])
+        return {}
+
+    def statuses(self, args: dict[str, Any]) -> dict[str, Any]:
+        self.n_status_updates += 1
+        now = time.time()
+        for field in ["compound_statuses_by_taskforce", "top_task_errors_by_taskforce"]:
+            for tf_uuid in args.get(field, {}):
+                self.timeline[tf_uuid].setdefault("first_status", now)
+        return {}
+
+    def query(self, args: dict[str, Any]) -> dict[str, Any]:
+        projection = args.get("projection")
+        return dict(
+            taskforces=[
+                {k: tf.get(k) for k in projection} if projection else tf
+                for tf in self.taskforces.values()
+                if _matches(tf, args.get("query", {}))
+            ]
+        )
+
+    def get_taskforce(self, tf_uuid: str) -> dict[str, Any]:
+        return self.taskforces[tf_uuid]
+
+    # ------------------------------------------------------------------
+    # routing
+
+    def route(self, method: str, path: str, args: dict[str, Any]) -> tuple[str, Any]:
+        """Get the endpoint name & response for the request (raises KeyError -> 404)."""
+        tms = f"/{V}/tms"
+        routes: list[tuple[str, str, Any]] = [
+            ("GET", rf"{tms}/pending-starter/taskforces", lambda: self.pending_starter(args)),
+            ("GET", rf"{tms}/pending-stopper/taskforces", lambda: self.pending_stopper(args)),
+            ("POST", rf"{tms}/condor-submit/taskforces/([^/]+)/failed", self.failed),
+            ("POST", rf"{tms}/condor-submit/taskforces/([^/]+)", lambda u: self.condor_submit(u, args)),
+            ("POST", rf"{tms}/condor-rm/taskforces/([^/]+)/failed", self.failed),
+            ("POST", rf"{tms}/condor-rm/taskforces/([^/]+)", self.condor_rm),
+            ("POST", rf"{tms}/condor-complete/taskforces/([^/]+)", lambda u: self.condor_complete(u, args)),
+            ("POST", rf"{tms}/statuses/taskforces", lambda: self.statuses(args)),
+            ("POST", rf"/{V}/query/taskforces", lambda: self.query(args)),
+            ("GET", rf"/{V}/taskforces/([^/]+)", self.get_taskforce),
+        ]  # fmt: skip
+        for route_method, pattern, func in routes:
+            if method == route_method and (m := re.fullmatch(pattern, path)):
+                endpoint = re.sub(r"\(\[\^/\]\+\)", "{uuid}", pattern)
+                with self._lock:
+                    return endpoint, func(*m.groups())
+        raise KeyError(f"{method} {path}")
+
+    # ------------------------------------------------------------------
+    # server
+
+    def start(self, port: int = 0) -> str:
+        """Start serving on a background thread; returns the address."""
+        started = threading.Event()
+
+        def serve() -> None:
+            self._loop = asyncio.new_event_loop()
+            asyncio.set_event_loop(self._loop)
+            server = tornado.httpserver.HTTPServer(self._make_app())
+            socks = tornado.netutil.bind_sockets(port, "127.0.0.1")
+            server.add_sockets(socks)
+            self.address = f"http://127.0.0.1:{socks[0].getsockname()[1]}"
+            started.set()
+            self._loop.run_forever()
+
+        threading.Thread(target=serve, name="fake-ewms", daemon=True).start()
+        started.wait()
+        LOGGER.info(f"fake EWMS serving at {self.address}")
+        return self.address
+
+    def stop(self) -> None:
+        if self._loop:
+            self._loop.call_soon_threadsafe(self._loop.stop)
+
+    def _make_app(self) -> tornado.web.Application:
+        ewms = self
+
+        class Handler(tornado.web.RequestHandler):
+            async def _handle(self, method: str) -> None:
+                if method == "GET":
+                    args = {k: self.get_query_argument(k) for k in self.request.query_arguments}
+                else:
+                    args = json.loads(self.request.body or b"{}")
+                try:
+                    endpoint, body = ewms.route(method, self.request.path, args)
+                except KeyError:
+                    raise tornado.web.HTTPError(404)
+                ewms.n_requests[endpoint] += 1  # (counted when handled -- even if failed below)
+                if await ewms.faults.inject():
+                    ewms.n_injected_errors[endpoint] += 1
+                    raise tornado.web.HTTPError(503)
+                self.write(body)
+
+            async def get(self, *_: Any) -> None:
+                await self._handle("GET")
+
+            async def post(self, *_: Any) -> None:
+                await self._handle("POST")
+
+        class DiscoveryHandler(tornado.web.RequestHandler):
+            def get(self) -> None:
+                self.write({"token_endpoint": f"{ewms.address}/token", "jwks_uri": ""})
+
+        class TokenHandler(tornado.web.RequestHandler):
+            def post(self) -> None:
+                token = jwt.encode(
+                    {"exp": time.time() + 60 * 60, "sub": "tms"},
+                    "fake-ewms-signing-key-of-sufficient-length",
+                    algorithm="HS256",
+                )
+                self.write({"access_token": token})
+
+        return tornado.web.Application(
+            [
+                (r"/\.well-known/openid-configuration", DiscoveryHandler),
+                (r"/token", TokenHandler),
+                (r"/.*", Handler),
+            ]
+        )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--schedd", required=True, help="the TMS's schedd (FULL_HOSTNAME)")
+    parser.add_argument("--taskforces", type=int, default=10, help="pending-starter backlog")
+    parser.add_argument("--workers", type=int, default=10, help="per taskforce")
+    parser.add_argument("--stop-after", type=float, default=None, help="secs after submit")
+    parser.add_argument("--latency", type=float, default=0.0)
+    parser.add_argument("--jitter", type=float, default=0.0)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    ewms = FakeEWMS(Faults(args.latency, args.jitter, args.error_rate), args.stop_after)
+    ewms.add_taskforces(args.taskforces, args.schedd, args.workers)
+    ewms.start(args.port)
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,194 @@
+"""A stand-in for `htcondor.Schedd`, for load & latency testing the TMS.
+
+It implements what the TMS calls (submit, act/remove, query) and writes
+real job events to each cluster's JEL, so the TMS's watcher has the same
+work to do as on an AP: every proc is submitted, starts executing after
+`exec_delay` secs, and runs until removed (or for `runtime` secs).
+"""
+
+import logging
+import threading
+import time
+from datetime import datetime
+from pathlib import Path
+from typing import Any
+
+import htcondor  # type: ignore[import-untyped]
+
+LOGGER = logging.getLogger("fake_schedd")
+
+TICK = 0.1  # secs
+
+
+def _event(code: int, cluster: int, proc: int, text: str, subproc: int = 0) -> str:
+    """Format a job event, as the schedd writes it to the JEL."""
+    ts = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    return f"{code:03d} ({cluster:03d}.{proc:03d}.{subproc:03d}) {ts} {text}\n...\n"
+
+
+_SUBMITTED = "Job submitted from host: <127.0.0.1:9618>"
+_EXECUTING = "Job executing on host: <127.0.0.1:9618>"
+_ABORTED = "Job was aborted.\n\tvia condor_rm (by user tms)"
+_CLUSTER_REMOVED = "Cluster removed\n\tMaterialized {n} jobs from 1 items.\tComplete"
+
+
+_TERMINATED = (
+    "Job terminated.\n"
+    "\t(1) Normal termination (return value 0)\n"
+    + "".join(
+        f"\t\tUsr 0 00:00:00, Sys 0 00:00:00  -  {x} Usage\n"
+        for x in ["Run Remote", "Run Local", "Total Remote", "Total Local"]
+    )
+    + "".join(
+        f"\t0  -  {x} Bytes {y} By Job\n"
+        for x in ["Run", "Total"]
+        for y in ["Sent", "Received"]
+    )
+).rstrip("\n")
+
+
+class _SubmitResult:
+    def __init__(self, cluster_id: int, n_procs: int) -> None:
+        self._cluster_id = cluster_id
+        self._n_procs = n_procs
+
+    def cluster(self) -> int:
+        return self._cluster_id
+
+    def num_procs(self) -> int:
+        return self._n_procs
+
+
+class _Cluster:
+    def __init__(self, cluster_id: int, tf_uuid: str, jel: Path, n_procs: int) -> None:
+        self.cluster_id = cluster_id
+        self.tf_uuid = tf_uuid
+        self.jel = jel
+        self.submitted_at = time.monotonic()
+        self.status = {p: htcondor.JobStatus.IDLE for p in range(n_procs)}
+        self.removed = False
+
+
+class FakeSchedd:
+    """Clusters kept in memory; job events written to their JELs."""
+
+    def __init__(
+        self,
+        exec_delay: float = 1.0,
+        runtime: float | None = None,
+        submit_latency: float = 0.0,
+    ) -> None:
+        self.exec_delay = exec_delay
+        self.runtime = runtime  # None -> until removed
+        self.submit_latency = submit_latency  # secs blocking in each submit (like a busy schedd)
+
+        self.clusters: dict[int, _Cluster] = {}
+        self._next_cluster_id = 1000
+        self._lock = threading.Lock()
+        self._stopped = threading.Event()
+        threading.Thread(target=self._run, name="fake-schedd", daemon=True).start()
+
+    def stop(self) -> None:
+        self._stopped.set()
+
+    @staticmethod
+    def _write(jel: Path, events: list[str]) -> None:
+        if events:
+            with open(jel, "a") as f:
+                f.write("".join(events))
+
+    # ------------------------------------------------------------------
+    # htcondor.Schedd's interface
+
+    def submit(self, submit_obj: htcondor.Submit, count: int = 1, **_: Any) -> _SubmitResult:
+        time.sleep(self.submit_latency)
+        with self._lock:
+            cluster_id = self._next_cluster_id
+            self._next_cluster_id += 1
+            cluster = _Cluster(
+                cluster_id,
+                str(submit_obj.get("MY.EWMSTaskforceUUID", "")).strip('"'),
+                Path(submit_obj["log"]),
+                count,
+            )
+            self.clusters[cluster_id] = cluster
+            self._write(cluster.jel, [_event(0, cluster_id, p, _SUBMITTED) for p in cluster.status])
+        return _SubmitResult(cluster_id, count)
+
+    def act(self, action: Any, constraint: str, reason: str = "") -> dict[str, int]:
+        assert action == htcondor.JobAction.Remove
+        cluster_id = int(constraint.split("==")[1])
+        with self._lock:
+            n_removed = self._remove(self.clusters[cluster_id])
+        return {"TotalSuccess": n_removed}
+
+    def query(
+        self,
+        constraint: str = "",
+        projection: list[str] | None = None,
+        opts: Any = None,
+        **_: Any,
+    ) -> list[dict[str, Any]]:
+        with self._lock:
+            if opts == htcondor.QueryOpts.SummaryOnly:
+                statuses = [s for c in self.clusters.values() for s in c.status.values()]
+                return [
+                    dict(
+                        MyType="Summary",
+                        Jobs=len(statuses),
+                        Idle=statuses.count(htcondor.JobStatus.IDLE),
+                        Running=statuses.count(htcondor.JobStatus.RUNNING),
+                        Held=0,
+                    )
+                ]
+            # (only the TMS's "existing ewms clusters" query is supported)
+            return [
+                dict(
+                    ClusterId=c.cluster_id,
+                    ProcId=-1,
+                    EWMSTaskforceUUID=c.tf_uuid,
+                    UserLog=str(c.jel),
+                    TotalSubmitProcs=len(c.status),
+                )
+                for c in self.clusters.values()
+                if not c.removed
+            ]
+
+    # ------------------------------------------------------------------
+    # job lifecycle
+
+    def _remove(self, cluster: _Cluster) -> int:
+        n_procs = len(cluster.status)
+        procs = [p for p, s in cluster.status.items() if s != htcondor.JobStatus.COMPLETED]
+        events = [_event(9, cluster.cluster_id, p, _ABORTED) for p in procs]
+        for p in procs:
+            del cluster.status[p]
+        cluster.removed = True
+        events.append(
+            _event(36, cluster.cluster_id, -1, _CLUSTER_REMOVED.format(n=n_procs), subproc=-1)
+        )
+        self._write(cluster.jel, events)
+        return len(procs)
+
+    def _run(self) -> None:
+        """Move jobs along: idle -> running (-> completed)."""
+        while not self._stopped.wait(TICK):
+            with self._lock:
+                now = time.monotonic()
+                for cluster in self.clusters.values():
+                    if cluster.removed:
+                        continue
+                    events = []
+                    age = now - cluster.submitted_at
+                    for p, status in cluster.status.items():
+                        if status == htcondor.JobStatus.IDLE and age >= self.exec_delay:
+                            cluster.status[p] = htcondor.JobStatus.RUNNING
+                            events.append(_event(1, cluster.cluster_id, p, _EXECUTING))
+                        elif (
+                            status == htcondor.JobStatus.RUNNING
+                            and self.runtime is not None
+                            and age >= self.exec_delay + self.runtime
+                        ):
+                            cluster.status[p] = htcondor.JobStatus.COMPLETED
+                            events.append(_event(5, cluster.cluster_id, p, _TERMINATED))
+                    self._write(cluster.jel, events)
@@ -0,0 +1,258 @@
+"""Unit tests for the EWMS client's limits & policies."""
+
+import asyncio
+import dataclasses as dc
+import logging
+import time
+from pathlib import Path
+from typing import Iterator, cast
+from unittest.mock import AsyncMock, MagicMock, patch
+
+import pytest
+import requests
+from rest_tools.client import ClientCredentialsAuth
+
+from tms import ewms_client
+from tms.ewms_client import (
+    CircuitBreaker,
+    ConcurrencyLimiter,
+    EWMSClient,
+    EWMSRequestShed,
+    Priority,
+    RetryBudget,
+)
+from tms.watcher import watcher
+
+LOGGER = logging.getLogger(__name__)
+
+
+@pytest.fixture(autouse=True)
+def fresh_state() -> Iterator[None]:
+    """Each test gets its own limiter, budget & breaker, and no backoff sleeps."""
+    for getter in [ewms_client.get_limiter, ewms_client.get_retry_budget, ewms_client.get_breaker]:
+        getter.cache_clear()
+    with patch.object(ewms_client, "BACKOFF_FACTOR", 0):
+        yield
+    for getter in [ewms_client.get_limiter, ewms_client.get_retry_budget, ewms_client.get_breaker]:
+        getter.cache_clear()
+
+
+def _http_error(status: int) -> requests.HTTPError:
+    resp = requests.Response()
+    resp.status_code = status
+    return requests.HTTPError(response=resp)
+
+
+def _client() -> EWMSClient:
+    return EWMSClient.__new__(EWMSClient)  # (don't connect to a token service)
+
+
+def test_000_policies() -> None:
+    """Endpoints map to timeouts & priorities; the scalar's requests are critical."""
+    p = ewms_client.get_policy("POST", "/v1/tms/statuses/taskforces", "watcher")
+    assert p.priority == Priority.SHEDDABLE and p.timeout == 30
+
+    p = ewms_client.get_policy("GET", "/v1/tms/pending-starter/taskforces", "scalar")
+    assert p.priority == Priority.CRITICAL
+    p = ewms_client.get_policy("POST", "/v1/tms/condor-complete/taskforces/TF-1", "watcher")
+    assert p.priority == Priority.CRITICAL
+
+    p = ewms_client.get_policy("POST", "/v1/query/taskforces", "file_manager")
+    assert p.priority == Priority.NORMAL and p.timeout == 30
+
+    # default
+    p = ewms_client.get_policy("GET", "/v1/taskforces/TF-1", "other")
+    assert p.priority == Priority.NORMAL and p.timeout == ewms_client.ENV.TMS_EWMS_TIMEOUT
+    p = ewms_client.get_policy("GET", "/v1/taskforces/TF-1", "scalar")
+    assert p.priority == Priority.CRITICAL
+
+
+async def test_010_limiter() -> None:
+    """Reserved slots are only for critical requests; subsystems have their own limits."""
+    limiter = ConcurrencyLimiter(limit=3, reserved=1, subsystem_limits={"watcher": 1})
+
+    await limiter.acquire(Priority.NORMAL, "file_manager", None)
+    await limiter.acquire(Priority.NORMAL, "watcher", None)
+
+    # watcher is at its own limit
+    limiter.release("file_manager")
+    with pytest.raises(TimeoutError):
+        await limiter.acquire(Priority.NORMAL, "watcher", 0.05)
+    await limiter.acquire(Priority.NORMAL, "file_manager", None)
+
+    # only the reserved slot is left
+    with pytest.raises(TimeoutError):
+        await limiter.acquire(Priority.SHEDDABLE, "other", 0.05)
+    await limiter.acquire(Priority.CRITICAL, "scalar", None)
+    assert limiter.in_flight == 3
+
+    # a waiter gets in when a slot frees up
+    waiting = asyncio.create_task(limiter.acquire(Priority.NORMAL, "other", None))
+    await asyncio.sleep(0.05)
+    assert not waiting.done()
+    limiter.release("scalar")
+    assert not waiting.done()  # (scalar's was the reserved slot)
+    limiter.release("file_manager")
+    await asyncio.wait_for(waiting, 1)
+    assert limiter.in_flight == 2
+
+
+def test_020_retry_budget() -> None:
+    """Retries are limited to a fraction of requests."""
+    budget = RetryBudget(ratio=0.5, max_tokens=2)
+    assert budget.withdraw() and budget.withdraw()
+    assert not budget.withdraw()
+    budget.deposit()
+    assert not budget.withdraw()  # 0.5
+    budget.deposit()
+    assert budget.withdraw()  # 1.0
+    for _ in range(10):
+        budget.deposit()
+    assert budget.tokens == 2  # capped
+
+
+def test_030_circuit_breaker() -> None:
+    """closed -> open -> half-open (one probe) -> closed/open."""
+    breaker = CircuitBreaker(failure_threshold=2, cooldown=0.1)
+    assert breaker.allow()
+    breaker.record_failure()
+    assert breaker.state == ewms_client.BreakerState.CLOSED
+    breaker.record_failure()
+    assert breaker.state == ewms_client.BreakerState.OPEN
+    assert not breaker.allow()
+
+    time.sleep(0.1)
+    assert breaker.state == ewms_client.BreakerState.HALF_OPEN
+    assert breaker.allow()  # the probe
+    assert not breaker.allow()
+    breaker.record_failure()  # probe failed
+    assert breaker.state == ewms_client.BreakerState.OPEN
+
+    time.sleep(0.1)
+    assert breaker.allow()
+    breaker.record_success()
+    assert breaker.state == ewms_client.BreakerState.CLOSED
+    assert breaker.allow() and breaker.allow()
+
+
+async def test_040_retries() -> None:
+    """Transient errors are retried (non-critical: from the budget); others are raised as-is."""
+    rc = _client()
+
+    mock = AsyncMock(side_effect=[requests.ConnectionError(), _http_error(503), {"a": 1}])
+    with patch.object(ClientCredentialsAuth, "request", mock):
+        assert await rc.request("POST", "/v1/query/taskforces", {}) == {"a": 1}
+    assert mock.await_count == 3
+    assert ewms_client.get_breaker().failures == 0  # reset by the success
+
+    # not transient
+    mock = AsyncMock(side_effect=_http_error(404))
+    with patch.object(ClientCredentialsAuth, "request", mock):
+        with pytest.raises(requests.HTTPError):
+            await rc.request("GET", "/v1/taskforces/TF-1")
+    assert mock.await_count == 1
+
+    # budget is spent -> no more retries
+    ewms_client.get_retry_budget().tokens = 0
+    mock = AsyncMock(side_effect=requests.ConnectionError())
+    with patch.object(ClientCredentialsAuth, "request", mock):
+        with pytest.raises(requests.ConnectionError):
+            await rc.request("GET", "/v1/taskforces/TF-1")
+    assert mock.await_count == 1
+
+    # ...but critical requests (starts/stops) still are
+    mock = AsyncMock(side_effect=[requests.ConnectionError(), {"b": 2}])
+    with patch.object(ClientCredentialsAuth, "request", mock):
+        assert await rc.request("GET", "/v1/tms/pending-starter/taskforces") == {"b": 2}
+    assert mock.await_count == 2
+    assert ewms_client.get_retry_budget().tokens < 1  # (not drawn from)
+
+
+async def test_050_per_endpoint_timeout() -> None:
+    """Each attempt uses its endpoint's timeout."""
+    rc = _client()
+    rc.timeout = 60.0
+    rc.token_func = None
+    rc.access_token = None
+    rc.address = "http://ewms"
+    rc.session = MagicMock(headers={})
+
+    seen = []
+
+    async def fake_request(self, method, path, args=None, headers=None):  # type: ignore[no-untyped-def]
+        seen.append(self._prepare(method, path, args, headers)[1]["timeout"])
+
+    with patch.object(ClientCredentialsAuth, "request", fake_request):
+        await rc.request("POST", "/v1/tms/statuses/taskforces", {})
+        await rc.request("GET", "/v1/taskforces/TF-1")
+    assert seen == [30, ewms_client.ENV.TMS_EWMS_TIMEOUT]
+
+
+async def test_060_breaker_sheds_first() -> None:
+    """While the breaker is open, status updates are shed, but starts/stops wait for it."""
+    rc = _client()
+    breaker = ewms_client.get_breaker()
+    breaker.cooldown = 0.2
+    for _ in range(breaker.failure_threshold):
+        breaker.record_failure()
+
+    mock = AsyncMock(return_value={})
+    with patch.object(ClientCredentialsAuth, "request", mock):
+        with pytest.raises(EWMSRequestShed):
+            await rc.request("POST", "/v1/tms/statuses/taskforces", {})
+        assert mock.await_count == 0
+
+        start = time.monotonic()
+        await rc.request("POST", "/v1/tms/condor-rm/taskforces/TF-1", {})
+        assert time.monotonic() - start >= 0.2  # waited for the probe
+        assert mock.await_count == 1
+    assert breaker.state == ewms_client.BreakerState.CLOSED
+
+
+async def test_065_unsent_probe_is_abandoned() -> None:
+    """A half-open probe that's shed (or cancelled) waiting for a slot lets another probe."""
+    rc = _client()
+    breaker = ewms_client.get_breaker()
+    breaker.cooldown = 0
+    for _ in range(breaker.failure_threshold):
+        breaker.record_failure()
+    assert breaker.state == ewms_client.BreakerState.HALF_OPEN
+
+    limiter = ewms_client.get_limiter()
+    limiter.in_flight = limiter.limit  # (no slots)
+    mock = AsyncMock(return_value={})
+    with (
+        patch.object(ClientCredentialsAuth, "request", mock),
+        patch.object(ewms_client, "ENV", dc.replace(ewms_client.ENV, TMS_EWMS_SHED_WAIT=0.05)),
+    ):
+        with pytest.raises(EWMSRequestShed):
+            await rc.request("POST", "/v1/tms/statuses/taskforces", {})
+        task = asyncio.create_task(rc.request("GET", "/v1/taskforces/TF-1"))
+        await asyncio.sleep(0.05)
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+        assert mock.await_count == 0
+
+        limiter.in_flight = 0
+        await asyncio.wait_for(rc.request("POST", "/v1/tms/condor-rm/taskforces/TF-1", {}), 5)
+        assert mock.await_count == 1
+    assert breaker.state == ewms_client.BreakerState.CLOSED
+
+
+async def test_070_shed_status_update_is_resent(tmp_path: Path) -> None:
+    """A shed status update is re-sent on the next update."""
+    rc = MagicMock()
+    rc.request = AsyncMock(side_effect=EWMSRequestShed("overloaded"))
+    jel_watcher = watcher.JobEventLogWatcher(tmp_path / "foo.tms.jel", rc)
+
+    info = watcher.ClusterInfo(123, "TF-1", LOGGER)
+    info._jobs = {0: {watcher.JobInfoKey.JobStatus: cast(watcher.JobInfoVal, 2)}}  # (running)
+    jel_watcher.cluster_infos[123] = info
+
+    await jel_watcher.maybe_update_ewms(log_verbose=False, force=True)  # shed
+    rc.request.side_effect = None
+    await jel_watcher.maybe_update_ewms(log_verbose=False, force=True)
+    assert rc.request.await_count == 2
+    sent = rc.request.await_args.args[2]
+    assert "TF-1" in sent["compound_statuses_by_taskforce"]
@@ -2,7 +2,9 @@
 
 import os
 import tarfile
+from functools import partial
 from pathlib import Path
+from unittest.mock import AsyncMock, MagicMock, patch
 
 import pytest
 
@@ -270,6 +272,9 @@ def test_1010_is_old_enough_dir_uses_latest_child_mtime(tmp_path):
 
     # Now make the young child old too → NOW old enough
     _make_old(young_f, seconds_old=60)
+    # (backdating a file doesn't change its dir's mtime, so use a new manager,
+    #  which has no cached 'newest mtime' -- real files never get older)
+    act = fm.FileManager(fpattern="*", action=fm.action_rm, age_threshold=10)
     assert act.is_old_enough(d)
 
 
@@ -308,6 +313,8 @@ def test_1030_is_old_enough_recurses_into_nested_subdirs(tmp_path):
 
     # Once the deep child is old, the whole dir becomes old enough
     _make_old(deep_file, seconds_old=60)
+    # (new manager: no cached 'newest mtime' -- see test_1010)
+    act = fm.FileManager(fpattern="*", action=fm.action_rm, age_threshold=10)
     assert act.is_old_enough(top)
 
 
@@ -361,3 +368,539 @@ async def test_1200_action_exception_raised(tmp_path, caplog):
 
     # File remains because action failed
     assert f.exists()
+
+
+async def test_1300_shared_file_rm_only_when_unreferenced(tmp_path, monkeypatch):
+    """A shared file is only removed once no taskforce dir links to it."""
+    from tms.utils import SharedFileLogic
+
+    monkeypatch.setattr(SharedFileLogic, "parent", tmp_path / "shared")
+    tf_dir = tmp_path / "ewms-taskforce-abc"
+    tf_dir.mkdir()
+    linked = SharedFileLogic.link(b"export FOO=1\n", tf_dir / "envfile.sh")
+    (obj,) = (tmp_path / "shared").iterdir()
+
+    mgr = fm.FileManager(
+        fpattern="*",
+        action=fm.action_rm,
+        age_threshold=0,
+        precheck_async=SharedFileLogic.is_unreferenced,
+    )
+
+    # still linked into a taskforce dir
+    assert not await mgr.act(obj)
+    assert obj.exists()
+
+    # taskforce dir is gone
+    linked.unlink()
+    assert await mgr.act(obj)
+    assert not obj.exists()
+
+
+async def test_1400_run_once_actions_do_not_block_event_loop(tmp_path):
+    """Actions run in the worker pool, so other tasks keep running meanwhile."""
+    import asyncio
+    import time
+
+    for i in range(3):
+        _touch(tmp_path / f"slow-{i}.txt")
+
+    def slow_action(fpath: Path) -> None:
+        time.sleep(0.5)  # blocking, like gzip'ing a large file
+        fpath.unlink()
+
+    ticks = 0
+
+    async def ticker() -> None:
+        nonlocal ticks
+        while True:
+            await asyncio.sleep(0.05)
+            ticks += 1
+
+    ticker_task = asyncio.create_task(ticker())
+    n_actions = await fm.run_once(
+        None,  # type: ignore[arg-type]  # not needed when managers are given
+        [
+            fm.FileManager(
+                fpattern=str(tmp_path / "slow-*.txt"),
+                action=slow_action,
+                age_threshold=0,
+            )
+        ],
+    )
+    ticker_task.cancel()
+
+    assert n_actions == 3
+    assert not list(tmp_path.glob("slow-*.txt"))
+    assert ticks >= 5  # the loop kept ticking while the actions ran
+
+
+@pytest.mark.parametrize("codec_name", ["gzip", "zstd", "none"])
+def test_1500_compress_and_tar_roundtrip_per_codec(tmp_path, codec_name):
+    """Every codec's archives can be read back, and have the codec's suffix."""
+    from tms.file_manager import codecs
+
+    if codec_name == "zstd":
+        pytest.importorskip("zstandard")
+    codec = codecs.get_codec(codec_name, level=1)
+
+    # single file
+    f = tmp_path / "job.tms.jel"
+    f.write_text("payload" * 100)
+    fm.action_compress(f, codec=codec)
+    archive = tmp_path / f"job.tms.jel{codec.file_suffix}"
+    assert not f.exists()
+    with codec.open_reader(archive) as reader:
+        assert reader.read().decode() == "payload" * 100
+
+    # dir
+    src_dir = tmp_path / "srcdir"
+    _touch(src_dir / "file.log", "payload")
+    fm.action_tar(src_dir, dest=tmp_path, codec=codec)
+    tarball = tmp_path / f"srcdir{codec.tar_suffix}"
+    assert not src_dir.exists()
+    with codec.open_reader(tarball) as reader, tarfile.open(
+        fileobj=reader, mode="r|"
+    ) as tf:
+        assert "srcdir/file.log" in tf.getnames()
+
+
+def test_1510_unknown_codec():
+    from tms.file_manager import codecs
+
+    with pytest.raises(ValueError, match="unknown codec"):
+        codecs.get_codec("lzma")
+
+
+async def test_1600_run_once_lists_each_dir_once(tmp_path, monkeypatch):
+    """All managers share one listing (and stat) of their directory per pass."""
+    for name in ["a.jel", "b.jel", "c.jel.gz"]:
+        _touch(tmp_path / name)
+        _make_old(tmp_path / name, 100)
+    (tmp_path / "tf-1").mkdir()
+    _touch(tmp_path / "tf-1.tar.gz")
+
+    n_scans = 0
+    orig_scandir = os.scandir
+
+    def counting_scandir(path):  # type: ignore[no-untyped-def]
+        nonlocal n_scans
+        if Path(path) == tmp_path:  # (not the age check's walk inside 'tf-1')
+            n_scans += 1
+        return orig_scandir(path)
+
+    monkeypatch.setattr(fm.os, "scandir", counting_scandir)
+
+    seen: dict[str, list[str]] = {"jel": [], "jel-again": [], "gz": [], "dir": []}
+
+    def record(key: str, fpath: Path) -> None:
+        seen[key].append(fpath.name)
+
+    n_actions = await fm.run_once(
+        None,  # type: ignore[arg-type]  # not needed when managers are given
+        [
+            fm.FileManager(str(tmp_path / "*.jel"), partial(record, "jel"), 10),
+            # same pattern -- paths acted on by the previous manager are skipped
+            fm.FileManager(str(tmp_path / "*.jel"), partial(record, "jel-again"), 0),
+            fm.FileManager(str(tmp_path / "*.gz"), partial(record, "gz"), 10),
+            fm.FileManager(str(tmp_path / "tf-*"), partial(record, "dir"), 0, entry_type="dir"),
+        ],
+    )
+
+    assert n_scans == 1
+    assert n_actions == 4
+    assert sorted(seen["jel"]) == ["a.jel", "b.jel"]
+    assert seen["jel-again"] == []
+    assert seen["gz"] == ["c.jel.gz"]
+    assert seen["dir"] == ["tf-1"]  # not the tarball
+
+
+def test_1700_dir_age_not_rewalked_while_unchanged(tmp_path, monkeypatch):
+    """A dir known to hold a young file isn't walked again until it changes."""
+    d = tmp_path / "tf"
+    for i in range(5):
+        _touch(d / "sub" / f"{i}.out")
+        _make_old(d / "sub" / f"{i}.out", seconds_old=60)
+    _touch(d / "sub" / "young.out")
+
+    n_scans = 0
+    orig_scandir = os.scandir
+
+    def counting_scandir(path):  # type: ignore[no-untyped-def]
+        nonlocal n_scans
+        n_scans += 1
+        return orig_scandir(path)
+
+    monkeypatch.setattr(fm.os, "scandir", counting_scandir)
+    act = fm.FileManager(fpattern="*", action=fm.action_rm, age_threshold=10)
+
+    assert not act.is_old_enough(d)
+    assert n_scans == 2  # tf/ & tf/sub/
+
+    # unchanged -> cached
+    assert not act.is_old_enough(d)
+    assert n_scans == 2
+
+    # an entry removed from a subdir -> that subdir's mtime changes -> rewalked
+    (d / "sub" / "young.out").unlink()
+    _make_old(d / "sub", seconds_old=60)
+    _make_old(d, seconds_old=60)
+    assert act.is_old_enough(d)
+    assert n_scans == 4
+
+
+@patch("htcondor.param", new={"FULL_HOSTNAME": "foo.bar.schedd"})
+async def test_1800_jel_precheck_is_one_bulk_request(tmp_path):
+    """All candidate JELs are looked up in one request, and reused for a while."""
+    from tms.taskforce_cache import get_taskforce_cache
+    from tms.utils import JELFileLogic
+
+    get_taskforce_cache.cache_clear()
+    for name in ["a.tms.jel", "b.tms.jel", "c.tms.jel", "young.tms.jel"]:
+        _touch(tmp_path / name)
+    for name in ["a.tms.jel", "b.tms.jel", "c.tms.jel"]:
+        _make_old(tmp_path / name, 100)
+
+    rc = MagicMock()
+    rc.request = AsyncMock(
+        return_value={"taskforces": [{"job_event_log_fpath": str(tmp_path / "b.tms.jel")}]}
+    )
+    acted: list[str] = []
+
+    def build() -> list[fm.FileManager]:
+        return [
+            fm.FileManager(
+                str(tmp_path / "*.tms.jel"),
+                action=lambda p: acted.append(p.name),
+                age_threshold=10,
+                precheck_async=partial(JELFileLogic.has_no_noncompleted_taskforces, rc),
+                precheck_prefetch_async=partial(JELFileLogic.prefetch_usage, rc),
+            )
+        ]
+
+    assert await fm.run_once(rc, build()) == 2
+    assert sorted(acted) == ["a.tms.jel", "c.tms.jel"]  # not 'b' (in use), nor 'young'
+    rc.request.assert_awaited_once()
+    query = rc.request.await_args.args[2]["query"]
+    assert sorted(query["job_event_log_fpath"]["$in"]) == [
+        str(tmp_path / n) for n in ["a.tms.jel", "b.tms.jel", "c.tms.jel"]
+    ]
+
+    # another pass soon after (ex: startup's, then the loop's) -> no new request
+    await fm.run_once(rc, build())
+    rc.request.assert_awaited_once()
+
+
+async def test_1900_due_scheduler_acts_only_when_due(tmp_path):
+    """Paths are acted on once their mtime + threshold passes, not before."""
+    import time
+
+    for name in ["old.txt", "soon.txt", "young.txt"]:
+        _touch(tmp_path / name)
+    _make_old(tmp_path / "old.txt", 60)
+    _make_old(tmp_path / "soon.txt", 9)  # due in ~1 sec
+
+    acted: list[str] = []
+
+    def record(fpath: Path) -> None:
+        acted.append(fpath.name)
+        fpath.unlink()
+
+    scheduler = fm.DueScheduler(
+        [fm.FileManager(str(tmp_path / "*.txt"), action=record, age_threshold=10)]
+    )
+    assert scheduler.needs_rebuild()
+    scheduler.rebuild()
+    assert not scheduler.needs_rebuild()
+
+    assert await fm.run_due(scheduler) == 1
+    assert acted == ["old.txt"]
+    next_due = scheduler.next_due()
+    assert next_due is not None and 0 < next_due - time.time() <= 1.5
+
+    time.sleep(max(0.0, next_due - time.time()))
+    assert await fm.run_due(scheduler) == 1
+    assert acted == ["old.txt", "soon.txt"]
+
+    # not due for a while
+    assert await fm.run_due(scheduler) == 0
+
+    # a new file changes the dir -> rebuild
+    _touch(tmp_path / "new.txt")
+    assert scheduler.needs_rebuild()
+
+
+async def test_1910_due_scheduler_defers_when_precheck_fails(tmp_path):
+    """If a due path isn't acted on, it's looked at again an interval later (even after a rebuild)."""
+    import time
+
+    _touch(tmp_path / "a.txt")
+    _make_old(tmp_path / "a.txt", 60)
+
+    n_prechecks = 0
+
+    async def precheck(_: Path) -> bool:
+        nonlocal n_prechecks
+        n_prechecks += 1
+        return False
+
+    scheduler = fm.DueScheduler(
+        [
+            fm.FileManager(
+                str(tmp_path / "*.txt"),
+                action=fm.action_rm,
+                age_threshold=10,
+                precheck_async=precheck,
+            )
+        ]
+    )
+    scheduler.rebuild()
+    assert await fm.run_due(scheduler) == 0
+    assert n_prechecks == 1
+
+    next_due = scheduler.next_due()
+    assert next_due is not None and next_due - time.time() > 60 * 59  # ~TMS_FILE_MANAGER_INTERVAL
+
+    scheduler.rebuild()  # ex: dir changed
+    assert await fm.run_due(scheduler) == 0
+    assert n_prechecks == 1  # still deferred
+
+
+async def test_2000_actions_are_io_paced_and_report_throughput(tmp_path, monkeypatch, caplog):
+    """With an i/o budget, compressing & rm'ing are paced; throughput is logged."""
+    import logging
+    import time
+
+    from tms.file_manager import io_throttle
+
+    bucket = io_throttle.TokenBucket(rate=2 * 1024 * 1024, burst=0)  # 2 MiB/s
+    monkeypatch.setattr(io_throttle, "get_bucket", lambda: bucket)
+
+    f = tmp_path / "big.tms.jel"
+    f.write_bytes(os.urandom(1024 * 1024))  # 1 MiB
+    _make_old(f, 60)
+
+    mgr = fm.FileManager(
+        str(tmp_path / "*.tms.jel"),
+        action=partial(fm.action_compress, codec=fm.GzipCodec()),
+        age_threshold=10,
+    )
+    start = time.monotonic()
+    with caplog.at_level(logging.INFO):
+        assert await mgr.act(f)
+    assert time.monotonic() - start >= 0.45  # 1 MiB @ 2 MiB/s
+    assert any("throughput: 1 MiB" in r.message for r in caplog.records)
+
+    # rm -r is paced per entry
+    d = tmp_path / "tf"
+    for i in range(10):
+        _touch(d / "sub" / f"{i}.out")
+    start = time.monotonic()
+    assert io_throttle.paced_rmtree(d) == 12  # 10 files + 'sub' + 'tf'
+    assert not d.exists()
+    assert time.monotonic() - start >= 12 * io_throttle.RM_COST_PER_ENTRY / bucket.rate * 0.9
+
+
+async def test_2100_disk_pressure_acts_early_oldest_first(tmp_path):
+    """Under disk pressure, allowed managers act oldest-first, ignoring age, until relieved."""
+
+    class FakePressure(fm.DiskPressure):
+        def get_usage(self) -> float:
+            return len(list(tmp_path.iterdir())) / 10  # each file is 10% of the disk
+
+    ages = {
+        "never-early.jel": 5000,  # manager doesn't allow early
+        "inuse.tms.jel": 2000,  # precheck says no
+        "free.tms.jel": 1000,
+        **{f"x{i}.arch": 900 - i * 100 for i in range(7)},
+    }
+    for name, age in ages.items():
+        _touch(tmp_path / name)
+        _make_old(tmp_path / name, age)
+
+    async def is_unused(fpath: Path) -> bool:
+        return fpath.name != "inuse.tms.jel"
+
+    managers = [
+        fm.FileManager(str(tmp_path / "*.jel"), fm.action_rm, age_threshold=10**6),
+        fm.FileManager(
+            str(tmp_path / "*.tms.jel"),
+            fm.action_rm,
+            age_threshold=10**6,
+            precheck_async=is_unused,
+            allow_early=True,
+        ),
+        fm.FileManager(str(tmp_path / "*.arch"), fm.action_rm, 10**6, allow_early=True),
+    ]
+    pressure = FakePressure(tmp_path)
+    assert pressure.is_high()
+
+    assert await fm.relieve_disk_pressure(managers, pressure) == 2  # 100% -> 80%
+    assert pressure.is_relieved()
+    assert sorted(p.name for p in tmp_path.iterdir()) == sorted(
+        set(ages) - {"free.tms.jel", "x0.arch"}
+    )
+
+    # not allowed
+    with pytest.raises(RuntimeError):
+        await managers[0].act(tmp_path / "never-early.jel", early=True)
+
+
+@patch("htcondor.param", new={"FULL_HOSTNAME": "foo.bar.schedd"})
+async def test_2101_disk_pressure_spares_live_jels(tmp_path):
+    """Under disk pressure, only quiet JELs that EWMS says are unused *now* are archived."""
+    import dataclasses as dc
+
+    from tms import condor_tools
+    from tms.config import ENV
+    from tms.taskforce_cache import get_taskforce_cache
+    from tms.utils import JELFileLogic
+
+    class AlwaysHigh(fm.DiskPressure):
+        def get_usage(self) -> float:
+            return 1.0
+
+    get_taskforce_cache.cache_clear()
+    with patch.object(
+        condor_tools, "ENV", dc.replace(condor_tools.ENV, JOB_EVENT_LOG_DIR=tmp_path)
+    ):
+        today = JELFileLogic.get_todays_path()
+        young, in_use, unused = [
+            tmp_path / f"2024-01-0{i}.tms.jel" for i in [3, 2, 1]
+        ]
+        for f in [today, young, in_use, unused]:
+            _touch(f)
+        _make_old(young, ENV.JOB_EVENT_LOG_MODIFICATION_EXPIRY_SHORT - 60)
+        for f in [in_use, unused]:
+            _make_old(f, ENV.JOB_EVENT_LOG_MODIFICATION_EXPIRY_SHORT + 60)
+        # a stale lookup says it's unused
+        get_taskforce_cache().put_jel_usage(in_use, False)
+
+        rc = MagicMock()
+        rc.request = AsyncMock(
+            side_effect=lambda *args: {
+                "taskforces": (
+                    [{"job_event_log_fpath": str(in_use)}]
+                    if str(in_use) in args[2]["query"]["job_event_log_fpath"]["$in"]
+                    else []
+                )
+            }
+        )
+        jel_manager = fm.build_file_managers(rc)[0]
+        assert await fm.relieve_disk_pressure([jel_manager], AlwaysHigh(tmp_path)) == 1
+
+    assert not unused.exists()
+    assert today.exists() and young.exists() and in_use.exists()
+    # each early action asked EWMS -- the cache wasn't trusted
+    asked = [c.args[2]["query"]["job_event_log_fpath"]["$in"] for c in rc.request.await_args_list]
+    assert [str(in_use)] in asked and [str(unused)] in asked
+    assert not any(str(f) in q for q in asked for f in [today, young])
+
+
+def test_2200_parallel_gzip_is_standard_multi_member_gzip(tmp_path, monkeypatch):
+    """Blocks compressed in parallel make one gzip stream that gunzip can read."""
+    import gzip
+    import shutil
+    import subprocess
+
+    from tms.file_manager import codecs
+
+    monkeypatch.setattr(codecs.ParallelGzipWriter, "BLOCK_SIZE", 64 * 1024)
+    payload = b"".join(
+        f"{i:08d} 000 (123.{i % 1000:03d}.000) 2025-08-26 Job executing\n".encode()
+        for i in range(20_000)
+    ) + os.urandom(100_000)  # ~1.2 MB -> ~19 blocks
+
+    f = tmp_path / "big.tms.jel"
+    f.write_bytes(payload)
+    fm.action_compress(f, codec=codecs.GzipCodec(threads=4))
+
+    final = tmp_path / "big.tms.jel.gz"
+    assert not f.exists()
+    assert gzip.decompress(final.read_bytes()) == payload
+    # (at least) a member per block
+    assert final.read_bytes().count(b"\x1f\x8b\x08") >= len(payload) // (64 * 1024)
+    if shutil.which("gunzip"):
+        out = subprocess.run(["gunzip", "-c", str(final)], capture_output=True, check=True)
+        assert out.stdout == payload
+
+    # tarballs too
+    d = tmp_path / "ewms-taskforce-TF-1"
+    (d / "a.out").parent.mkdir()
+    (d / "a.out").write_bytes(payload)
+    fm.action_tar(d, dest=tmp_path, codec=codecs.GzipCodec(threads=4))
+    with tarfile.open(tmp_path / "ewms-taskforce-TF-1.tar.gz", "r:gz") as tar:
+        assert tar.extractfile("ewms-taskforce-TF-1/a.out").read() == payload  # type: ignore[union-attr]
+
+    # empty input is still a valid gzip file
+    e = tmp_path / "empty.tms.jel"
+    e.write_bytes(b"")
+    fm.action_compress(e, codec=codecs.GzipCodec(threads=4))
+    assert gzip.decompress((tmp_path / "empty.tms.jel.gz").read_bytes()) == b""
+
+
+@pytest.mark.parametrize("codec_name", ["gzip", "zstd"])
+def test_2300_indexed_jel_archive(tmp_path, monkeypatch, capsys, codec_name):
+    """Archived JELs are indexed frames -- a cluster's events only need its frames."""
+    if codec_name == "zstd":
+        pytest.importorskip("zstandard")
+    from tms.file_manager import codecs, jel_archive
+
+    monkeypatch.setattr(jel_archive, "FRAME_SIZE", 4 * 1024)
+
+    # one day per cluster, so clusters (and times) end up in different frames
+    sample = (Path(__file__).parent.parent / "job_event_logs/condor_test_logfile").read_text()
+    jel = tmp_path / "2024-01-05.tms.jel"
+    jel.write_text(
+        "".join(
+            sample.replace("104501503", f"1000{i}").replace("2024-01-05", f"2024-01-{5 + i:02d}")
+            for i in range(5)
+        )
+    )
+    original = jel.read_bytes()
+
+    codec = codecs.get_codec(codec_name, threads=2)
+    n_bytes = fm.action_archive_jel(jel, codec=codec)
+    assert n_bytes == len(original)
+
+    archive = tmp_path / f"2024-01-05.tms.jel{codec.file_suffix}"
+    assert not jel.exists()
+    assert jel_archive.index_path(archive).exists()
+
+    # still a standard stream
+    with codec.open_reader(archive) as f:
+        assert f.read() == original
+
+    # only the cluster's frames are decompressed
+    n_decompressed = 0
+    orig_decompress = type(codec).decompress_frame
+
+    def counting_decompress(self, data):  # type: ignore[no-untyped-def]
+        nonlocal n_decompressed
+        n_decompressed += 1
+        return orig_decompress(self, data)
+
+    monkeypatch.setattr(type(codec), "decompress_frame", counting_decompress)
+    _, frames = jel_archive.read_index(archive)
+    events = list(jel_archive.read_events(archive, cluster_id=10002))
+    expected = [
+        e + "...\n"
+        for e in original.decode().split("...\n")
+        if e.split(" ", 2)[1:2] and e.split(" ", 2)[1].startswith("(10002.")
+    ]
+    assert events == expected
+    assert 0 < n_decompressed < len(frames)
+
+    # time window
+    events = list(jel_archive.read_events(archive, since="2024-01-08", until="2024-01-08"))
+    assert any("(10003." in e for e in events)
+    assert all(e.split(" ")[2] == "2024-01-08" for e in events)
+
+    # cli
+    monkeypatch.setattr("sys.argv", ["jel_archive", str(archive), "--cluster", "10004"])
+    jel_archive.main()
+    assert capsys.readouterr().out.count("...\n") == len(expected)
+
+    # rm'ing the archive rm's its index
+    fm.action_rm_archive(archive)
+    assert not list(tmp_path.iterdir())
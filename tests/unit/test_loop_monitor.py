@@ -0,0 +1,76 @@
+"""Unit tests for the event-loop monitor."""
+
+import asyncio
+import logging
+import sys
+import time
+
+import prometheus_client
+
+from tms import loop_monitor
+
+LOGGER = logging.getLogger(__name__)
+
+
+def _stalls(subsystem: str) -> float:
+    return (
+        prometheus_client.REGISTRY.get_sample_value(
+            "tms_event_loop_stalls_total", {"subsystem": subsystem}
+        )
+        or 0.0
+    )
+
+
+def test_000_get_subsystem() -> None:
+    """The innermost TMS module decides, else the task's name."""
+    assert loop_monitor.get_subsystem(None, "watcher:foo.tms.jel") == "watcher"
+    assert loop_monitor.get_subsystem(None, "scalar") == "scalar"
+    assert loop_monitor.get_subsystem(None, None) == "unknown"
+
+    # this test module isn't a TMS module -> task name
+    assert loop_monitor.get_subsystem(sys._getframe(), "scalar") == "scalar"
+
+    # a TMS module's frame is on the stack
+    grab = eval("lambda: sys._getframe()", {"__name__": "tms.file_manager.file_manager", "sys": sys})
+    assert loop_monitor.get_subsystem(grab(), "scalar") == "file_manager"
+
+
+async def test_010_stall_is_attributed() -> None:
+    """A blocking call is caught mid-stall, with its stack & subsystem."""
+    monitor = loop_monitor.LoopMonitor(interval=0.05, threshold=0.2)
+    before = _stalls("scalar")
+
+    def blocking_call() -> None:
+        time.sleep(0.6)
+
+    async def culprit() -> None:
+        await asyncio.sleep(0.1)  # let the monitor start
+        blocking_call()
+        await asyncio.sleep(0.2)  # let the ticker see the lag
+
+    mon_task = asyncio.create_task(monitor.run(), name="loop_monitor")
+    await asyncio.create_task(culprit(), name="scalar")
+    mon_task.cancel()
+
+    assert len(monitor.recent_stalls) == 1  # one report per stall
+    stall = monitor.recent_stalls[0]
+    assert stall.subsystem == "scalar"
+    assert stall.task_name == "scalar"
+    assert stall.blocked >= 0.2
+    assert "blocking_call" in "".join(stall.stack)
+    assert "time.sleep" in stall.stack[-1]
+    assert _stalls("scalar") == before + 1
+
+
+async def test_020_no_stall() -> None:
+    """A loop that isn't blocked has no stalls, and its lag is measured."""
+    monitor = loop_monitor.LoopMonitor(interval=0.02, threshold=0.2)
+    before = prometheus_client.REGISTRY.get_sample_value("tms_event_loop_lag_seconds_count") or 0
+
+    mon_task = asyncio.create_task(monitor.run())
+    await asyncio.sleep(0.3)
+    mon_task.cancel()
+
+    assert not monitor.recent_stalls
+    after = prometheus_client.REGISTRY.get_sample_value("tms_event_loop_lag_seconds_count")
+    assert after is not None and after > before
@@ -0,0 +1,96 @@
+"""Unit tests for the metrics."""
+
+import logging
+from pathlib import Path
+from unittest.mock import AsyncMock, MagicMock, patch
+
+import prometheus_client
+import pytest
+from rest_tools.client import ClientCredentialsAuth
+
+from tms import metrics
+from tms.ewms_client import EWMSClient
+from tms.scalar import stopper
+
+LOGGER = logging.getLogger(__name__)
+
+
+def _get(name: str, labels: dict[str, str] | None = None) -> float:
+    return prometheus_client.REGISTRY.get_sample_value(name, labels or {}) or 0.0
+
+
+def test_000_normalize_endpoint() -> None:
+    """Uuids are removed from endpoint labels."""
+    assert (
+        metrics.normalize_endpoint("/v1/tms/condor-submit/taskforces/TF-1234-abcd/failed")
+        == "/v1/tms/condor-submit/taskforces/{uuid}/failed"
+    )
+    assert metrics.normalize_endpoint("/v1/query/taskforces") == "/v1/query/taskforces"
+
+
+async def test_010_ewms_client_records_latency() -> None:
+    """Each EWMS request is observed, per endpoint & outcome."""
+    rc = EWMSClient.__new__(EWMSClient)  # (don't connect to a token service)
+    labels = {
+        "method": "POST",
+        "endpoint": "/v1/tms/condor-rm/taskforces/{uuid}",
+        "outcome": "ok",
+    }
+    before = _get("tms_ewms_request_seconds_count", labels)
+
+    with patch.object(ClientCredentialsAuth, "request", AsyncMock(return_value={"a": 1})):
+        assert await rc.request("POST", "/v1/tms/condor-rm/taskforces/TF-1", {}) == {"a": 1}
+        assert await rc.request("POST", "/v1/tms/condor-rm/taskforces/TF-2", {}) == {"a": 1}
+    assert _get("tms_ewms_request_seconds_count", labels) == before + 2
+
+    # errors are observed too, then re-raised
+    labels["outcome"] = "error"
+    before = _get("tms_ewms_request_seconds_count", labels)
+    with patch.object(ClientCredentialsAuth, "request", AsyncMock(side_effect=ValueError)):
+        with pytest.raises(ValueError):
+            await rc.request("POST", "/v1/tms/condor-rm/taskforces/TF-3", {})
+    assert _get("tms_ewms_request_seconds_count", labels) == before + 1
+
+
+@patch("htcondor.param", new={"FULL_HOSTNAME": "foo.bar.schedd"})
+def test_020_schedd_act_duration() -> None:
+    """condor_rm's are timed."""
+    before = _get("tms_schedd_act_seconds_count", {"action": "remove"})
+    schedd_obj = MagicMock()
+    schedd_obj.act.return_value = {"TotalSuccess": 3}
+    stopper.stop(schedd_obj, 123)
+    assert _get("tms_schedd_act_seconds_count", {"action": "remove"}) == before + 1
+
+
+async def test_030_file_manager_action_metrics(tmp_path: Path) -> None:
+    """File-manager actions' durations & bytes are recorded per action name."""
+    from functools import partial
+
+    from tms.file_manager import codecs, file_manager as fm
+
+    f = tmp_path / "x.tms.jel"
+    f.write_bytes(b"x" * 1000)
+    mgr = fm.FileManager(
+        str(tmp_path / "*.tms.jel"),
+        action=partial(fm.action_compress, codec=codecs.GzipCodec(threads=1)),
+        age_threshold=0,
+    )
+    labels = {"action": "action_compress"}
+    before_n = _get("tms_file_manager_action_seconds_count", labels)
+    before_bytes = _get("tms_file_manager_action_bytes_total", labels)
+
+    assert await mgr.act(f)
+
+    assert _get("tms_file_manager_action_seconds_count", labels) == before_n + 1
+    assert _get("tms_file_manager_action_bytes_total", labels) == before_bytes + 1000
+
+
+def test_040_forget_jel() -> None:
+    """A finished JEL's labeled metrics are removed (no unbounded label growth)."""
+    metrics.JEL_EVENTS.labels("old.tms.jel").inc()
+    metrics.TRACKED_CLUSTERS.labels("old.tms.jel").set(5)
+    assert _get("tms_tracked_clusters", {"jel": "old.tms.jel"}) == 5
+
+    metrics.forget_jel("old.tms.jel")
+    assert prometheus_client.REGISTRY.get_sample_value("tms_tracked_clusters", {"jel": "old.tms.jel"}) is None
+    metrics.forget_jel("never-seen.tms.jel")  # no error
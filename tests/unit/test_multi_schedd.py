@@ -0,0 +1,98 @@
+"""Unit tests for serving multiple schedds ('TMS_SCHEDDS')."""
+
+import asyncio
+import dataclasses as dc
+import logging
+from pathlib import Path
+from typing import Iterator
+from unittest.mock import AsyncMock, MagicMock, patch
+
+import pytest
+
+from tms import condor_tools
+from tms.condor_tools import get_schedd, get_schedd_obj, schedd_context
+from tms.scalar.scalar import EWMSCaller
+from tms.utils import JELFileLogic, SharedFileLogic, TaskforceDirLogic
+
+LOGGER = logging.getLogger(__name__)
+
+LOCAL = "foo.bar.schedd"
+
+
+@pytest.fixture(autouse=True)
+def jel_root(tmp_path: Path) -> Iterator[Path]:
+    """The JEL dir, w/ a subdir per schedd."""
+    condor_tools._LOCATED.clear()
+    with (
+        patch("htcondor.param", new={"FULL_HOSTNAME": LOCAL}),
+        patch.object(
+            condor_tools,
+            "ENV",
+            dc.replace(condor_tools.ENV, JOB_EVENT_LOG_DIR=tmp_path, TMS_SCHEDDS=["ap1", "ap2"]),
+        ),
+    ):
+        yield tmp_path
+
+
+def test_000_scoped(jel_root: Path) -> None:
+    """The schedd, its dirs & connection are per context -- else, the local schedd's."""
+    assert condor_tools.get_schedds() == ["ap1", "ap2"]
+    assert get_schedd() == LOCAL
+    assert JELFileLogic.parent == jel_root
+
+    def scoped() -> tuple[str, Path, Path, Path]:
+        return (
+            get_schedd(),
+            JELFileLogic.parent,
+            TaskforceDirLogic.parent,
+            SharedFileLogic.parent,
+        )
+
+    assert schedd_context("ap1").run(scoped) == (
+        "ap1",
+        jel_root / "ap1",
+        jel_root / "ap1",
+        jel_root / "ap1/ewms-shared-files",
+    )
+    assert get_schedd() == LOCAL  # (only that context)
+
+
+def test_010_connect() -> None:
+    """A listed schedd is located via the collector; the local one isn't."""
+    with (
+        patch("htcondor.Collector") as collector,
+        patch("htcondor.Schedd") as schedd,
+    ):
+        collector.return_value.locate.return_value = "ap1's ad"
+        get_schedd_obj()
+        schedd.assert_called_with()
+        schedd_context("ap1").run(get_schedd_obj)
+        schedd.assert_called_with("ap1's ad")
+        schedd_context("ap1").run(get_schedd_obj)
+        collector.return_value.locate.assert_called_once()  # (the ad is reused)
+
+
+async def test_020_ewms_requests() -> None:
+    """Concurrent tasks ask EWMS for their own schedd's taskforces."""
+    rc = MagicMock()
+    rc.request = AsyncMock(return_value={})
+
+    async with asyncio.TaskGroup() as tg:
+        for schedd in ["ap1", "ap2"]:
+            tg.create_task(
+                EWMSCaller.get_next_to_start(rc), context=schedd_context(schedd)
+            )
+    assert sorted(c.args[2]["schedd"] for c in rc.request.await_args_list) == ["ap1", "ap2"]
+
+
+def test_030_jels(jel_root: Path) -> None:
+    """Each schedd's JELs are found in its own dir (made at startup)."""
+    for schedd in ["ap1", "ap2"]:
+        assert (jel_root / schedd).is_dir()
+        (jel_root / schedd / "2024-01-05.tms.jel").touch()
+    (jel_root / "2024-01-05.tms.jel").touch()
+
+    assert schedd_context("ap2").run(JELFileLogic.find_all) == [
+        jel_root / "ap2/2024-01-05.tms.jel"
+    ]
+    assert JELFileLogic.find_all() == [jel_root / "2024-01-05.tms.jel"]
@@ -0,0 +1,96 @@
+"""Unit tests for the on-demand profiler."""
+
+import asyncio
+import logging
+import pstats
+import threading
+import time
+from pathlib import Path
+
+from tms import profiler
+
+LOGGER = logging.getLogger(__name__)
+
+
+def busy_in_loop(secs: float) -> None:
+    end = time.monotonic() + secs
+    while time.monotonic() < end:
+        sum(range(1000))
+
+
+def busy_in_thread(secs: float) -> None:
+    busy_in_loop(secs)
+
+
+async def _wait_done(prof: profiler.Profiler) -> None:
+    while prof.is_running:
+        await asyncio.sleep(0.05)
+
+
+async def test_000_profile(tmp_path: Path) -> None:
+    """A profile writes collapsed stacks (all threads) & cProfile stats (loop thread)."""
+    prof = profiler.Profiler(tmp_path / "profiles", duration=0.4, sample_interval=0.005)
+
+    assert prof.start()
+    assert not prof.start()  # one at a time
+
+    thread = threading.Thread(target=busy_in_thread, args=(0.3,), name="worker")
+    thread.start()
+    busy_in_loop(0.3)
+    thread.join()
+    await _wait_done(prof)
+
+    collapsed, = (tmp_path / "profiles").glob("*.collapsed")
+    lines = collapsed.read_text().splitlines()
+    assert all(line.rsplit(" ", 1)[1].isdigit() for line in lines)
+    assert any(
+        line.startswith("MainThread;") and "busy_in_loop (test_profiler.py" in line
+        for line in lines
+    )
+    assert any(
+        line.startswith("worker;") and "busy_in_thread (test_profiler.py" in line
+        for line in lines
+    )
+
+    stats_fpath, = (tmp_path / "profiles").glob("*.pstats")
+    stats = pstats.Stats(str(stats_fpath))
+    assert any(func[2] == "busy_in_loop" for func in stats.stats)  # type: ignore[attr-defined]
+    assert not any(func[2] == "busy_in_thread" for func in stats.stats)  # type: ignore[attr-defined]
+
+    # can profile again
+    assert prof.start(0.05)
+    await _wait_done(prof)
+    assert len(list((tmp_path / "profiles").glob("*.pstats"))) in [1, 2]  # (same-second names)
+
+
+async def test_010_trigger_file(tmp_path: Path) -> None:
+    """The trigger file starts a profile (w/ its duration), then is removed."""
+    prof = profiler.Profiler(tmp_path, duration=60, sample_interval=0.01)
+
+    profiler.check_trigger_file(prof)  # no trigger
+    assert not prof.is_running
+
+    (tmp_path / profiler.TRIGGER_FILENAME).write_text("0.1\n")
+    profiler.check_trigger_file(prof)
+    assert prof.is_running
+    assert not (tmp_path / profiler.TRIGGER_FILENAME).exists()
+    await asyncio.wait_for(_wait_done(prof), timeout=5)  # 0.1s, not the default 60s
+    assert list(tmp_path.glob("*.collapsed"))
+
+
+async def test_020_trigger_needs_private_dir(tmp_path: Path) -> None:
+    """A trigger file in a dir that others can write to is ignored."""
+    outdir = tmp_path / "profiles"
+    profiler.make_private_dir(outdir)
+    assert outdir.stat().st_mode & 0o777 == 0o700
+
+    prof = profiler.Profiler(outdir, duration=0.05, sample_interval=0.01)
+    outdir.chmod(0o777)
+    (outdir / profiler.TRIGGER_FILENAME).write_text("")
+    profiler.check_trigger_file(prof)
+    assert not prof.is_running
+
+    outdir.chmod(0o700)
+    profiler.check_trigger_file(prof)
+    assert prof.is_running
+    await asyncio.wait_for(_wait_done(prof), timeout=5)
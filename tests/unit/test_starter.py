@@ -1,14 +1,18 @@
 """Unit tests for the starter functionality."""
 
+import dataclasses as dc
 import logging
 import os
 from datetime import date
+from pathlib import Path
+from typing import Iterator
 from unittest.mock import AsyncMock, MagicMock, patch
 
 import htcondor  # type: ignore[import-untyped]
 import humanfriendly  # type: ignore[import-untyped]
+import pytest
 
-from tms import config  # noqa: F401  # setup env vars
+from tms import condor_tools, config  # noqa: F401  # setup env vars
 from tms.scalar import starter
 
 LOGGER = logging.getLogger(__name__)
@@ -17,6 +21,15 @@ LOGGER = logging.getLogger(__name__)
 htcondor.enable_debug()
 
 
+@pytest.fixture
+def jel_dir(tmp_path: Path) -> Iterator[Path]:
+    """The JEL dir -- so the taskforce dirs & shared files aren't made in the repo."""
+    with patch.object(
+        condor_tools, "ENV", dc.replace(condor_tools.ENV, JOB_EVENT_LOG_DIR=tmp_path)
+    ):
+        yield tmp_path
+
+
 @patch(
     "htcondor.param",
     new=dict(
@@ -26,7 +39,9 @@ htcondor.enable_debug()
 )
 @patch("tms.scalar.starter.is_taskforce_still_pending_starter")
 @patch("htcondor.Submit")
-async def test_000(htcs_mock: MagicMock, itsps_mock: AsyncMock) -> None:
+async def test_000(
+    htcs_mock: MagicMock, itsps_mock: AsyncMock, jel_dir: Path
+) -> None:
     """Test the starter."""
     schedd_obj = MagicMock()
     itsps_mock.return_value = True
@@ -38,7 +53,7 @@ async def test_000(htcs_mock: MagicMock, itsps_mock: AsyncMock) -> None:
         "def=True",
     ]
     envfile = (
-        config.ENV.JOB_EVENT_LOG_DIR
+        jel_dir
         / "ewms-taskforce-9874abcdef"
         / "ewms_htcondor_envfile.sh"
     )
@@ -69,7 +84,7 @@ async def test_000(htcs_mock: MagicMock, itsps_mock: AsyncMock) -> None:
         ),
         "+FileSystemDomain": '"blah"',  # must be quoted
         #
-        "log": str(config.ENV.JOB_EVENT_LOG_DIR / f"{date.today()}.tms.jel"),
+        "log": str(jel_dir / f"{date.today()}.tms.jel"),
         #
         "transfer_input_files": ",".join(["foofile", "bardir/barfile", str(envfile)]),
         "transfer_output_files": "",
@@ -95,13 +110,13 @@ async def test_000(htcs_mock: MagicMock, itsps_mock: AsyncMock) -> None:
         #
         #
         "output": str(
-            config.ENV.JOB_EVENT_LOG_DIR
+            jel_dir
             / "ewms-taskforce-9874abcdef"
             / "cluster-$(ClusterId)"
             / "$(ProcId).out"
         ),
         "error": str(
-            config.ENV.JOB_EVENT_LOG_DIR
+            jel_dir
             / "ewms-taskforce-9874abcdef"
             / "cluster-$(ClusterId)"
             / "$(ProcId).err"
@@ -145,7 +160,7 @@ async def test_000(htcs_mock: MagicMock, itsps_mock: AsyncMock) -> None:
         n_workers=schedd_obj.submit.return_value.num_procs.return_value,
         submit_dict=submit_dict,
         job_event_log_fpath=str(
-            config.ENV.JOB_EVENT_LOG_DIR / f"{date.today()}.tms.jel"
+            jel_dir / f"{date.today()}.tms.jel"
         ),
     )
     # assert envfile
@@ -156,3 +171,191 @@ async def test_000(htcs_mock: MagicMock, itsps_mock: AsyncMock) -> None:
                 line = line.strip().replace("export ", "")
                 got_env.append(line)
         assert sorted(got_env) == sorted(envlist)
+
+
+@patch(
+    "htcondor.param",
+    new=dict(
+        CONDOR_HOST=os.environ["_TEST_COLLECTOR"],
+        FULL_HOSTNAME=os.environ["_TEST_SCHEDD"],
+    ),
+)
+@patch("tms.scalar.starter.is_taskforce_still_pending_starter")
+@patch("htcondor.Submit")
+async def test_010_late_materialization(
+    htcs_mock: MagicMock, itsps_mock: AsyncMock, jel_dir: Path
+) -> None:
+    """Test the starter using late materialization."""
+    schedd_obj = MagicMock()
+    schedd_obj.submit.return_value.num_procs.return_value = 0  # nothing materialized yet
+    itsps_mock.return_value = True
+
+    ret = await starter.start(
+        schedd_obj=schedd_obj,
+        ewms_rc=MagicMock(),
+        #
+        taskforce_uuid="late123",
+        n_workers=5000,
+        pilot_config=dict(
+            tag="my_image",
+            image_source="cvmfs",
+            environment={},
+            input_files=[],
+        ),
+        worker_config=dict(
+            do_transfer_worker_stdouterr=False,
+            max_worker_runtime=95487,
+            n_cores=1,
+            priority=100,
+            worker_disk=85461235,
+            worker_memory=4235,
+            condor_requirements="",
+            max_idle=250,
+        ),
+    )
+
+    submit_dict = htcs_mock.call_args.args[0]
+    assert submit_dict["max_idle"] == "250"
+    assert "max_materialize" not in submit_dict
+    schedd_obj.submit.assert_called_with(
+        htcs_mock.return_value,
+        count=5000,  # the factory's total
+    )
+
+    # EWMS gets the total number of workers, not what was materialized at submit
+    assert ret["n_workers"] == 5000
+    assert ret["submit_dict"] == submit_dict
+
+
+@patch(
+    "htcondor.param",
+    new=dict(
+        CONDOR_HOST=os.environ["_TEST_COLLECTOR"],
+        FULL_HOSTNAME=os.environ["_TEST_SCHEDD"],
+    ),
+)
+@patch("tms.scalar.starter.is_taskforce_still_pending_starter")
+@patch("htcondor.Submit")
+async def test_020_existing_cluster_not_resubmitted(
+    htcs_mock: MagicMock, itsps_mock: AsyncMock, jel_dir: Path
+) -> None:
+    """Test that a taskforce with a cluster already on the schedd is not resubmitted."""
+    schedd_obj = MagicMock()
+    schedd_obj.query.return_value = [
+        # cluster ad
+        {"ClusterId": 456, "EWMSTaskforceUUID": "dup123", "TotalSubmitProcs": 3},
+        # job ads
+        *[
+            {
+                "ClusterId": 456,
+                "ProcId": i,
+                "EWMSTaskforceUUID": "dup123",
+                "UserLog": "/jels/yesterday.tms.jel",
+            }
+            for i in range(3)
+        ],
+        {"ClusterId": 789, "ProcId": 0, "EWMSTaskforceUUID": "other"},
+    ]
+    itsps_mock.return_value = True
+    cluster_index = starter.SubmittedClusterIndex(schedd_obj)
+
+    def _start(taskforce_uuid: str):
+        return starter.start(
+            schedd_obj=schedd_obj,
+            ewms_rc=MagicMock(),
+            #
+            taskforce_uuid=taskforce_uuid,
+            n_workers=3,
+            pilot_config=dict(
+                tag="my_image",
+                image_source="cvmfs",
+                environment={},
+                input_files=[],
+            ),
+            worker_config=dict(
+                do_transfer_worker_stdouterr=False,
+                max_worker_runtime=95487,
+                n_cores=1,
+                priority=100,
+                worker_disk=85461235,
+                worker_memory=4235,
+                condor_requirements="",
+            ),
+            cluster_index=cluster_index,
+        )
+
+    ret = await _start("dup123")
+    schedd_obj.submit.assert_not_called()
+    assert ret["cluster_id"] == 456
+    assert ret["n_workers"] == 3
+    assert ret["job_event_log_fpath"] == "/jels/yesterday.tms.jel"
+
+    # a new taskforce is submitted (and the index is not re-queried)
+    ret = await _start("new456")
+    schedd_obj.submit.assert_called_once()
+    assert ret["cluster_id"] == schedd_obj.submit.return_value.cluster.return_value
+    schedd_obj.query.assert_called_once()
+    assert cluster_index.get("new456")
+
+
+def test_021_removed_cluster_not_indexed() -> None:
+    """Test that a cluster whose jobs are all removed can be resubmitted."""
+    schedd_obj = MagicMock()
+    schedd_obj.query.return_value = [
+        # removed cluster (cluster ads have no JobStatus)
+        {"ClusterId": 111, "EWMSTaskforceUUID": "abc123", "TotalSubmitProcs": 2},
+        *[
+            {"ClusterId": 111, "ProcId": i, "JobStatus": 3, "EWMSTaskforceUUID": "abc123"}
+            for i in range(2)
+        ],
+        # partly removed cluster
+        {"ClusterId": 222, "ProcId": 0, "JobStatus": 3, "EWMSTaskforceUUID": "def456"},
+        {"ClusterId": 222, "ProcId": 1, "JobStatus": 2, "EWMSTaskforceUUID": "def456"},
+        # late-materialization cluster w/o jobs yet
+        {"ClusterId": 333, "EWMSTaskforceUUID": "ghi789", "TotalSubmitProcs": 5},
+    ]
+    cluster_index = starter.SubmittedClusterIndex(schedd_obj)
+
+    assert not cluster_index.get("abc123")
+    assert cluster_index.get("def456") == starter.SubmittedCluster(222, 2, "")
+    assert cluster_index.get("ghi789") == starter.SubmittedCluster(333, 5, "")
+
+
+def test_030_envfiles_are_deduplicated(jel_dir: Path) -> None:
+    """Test that identical envfiles are stored once and hardlinked."""
+    env = {"abc": "932", "def": "True"}
+
+    envfile_1 = starter.write_envfile("dedup-1", env)
+    envfile_2 = starter.write_envfile("dedup-2", env)
+    envfile_3 = starter.write_envfile("dedup-3", {**env, "ghi": "different"})
+
+    assert envfile_1.parent.name == "ewms-taskforce-dedup-1"
+    assert envfile_1.read_text() == envfile_2.read_text()
+    assert os.path.samefile(envfile_1, envfile_2)
+    assert not os.path.samefile(envfile_1, envfile_3)
+    assert os.access(envfile_1, os.X_OK)
+    # the store's link + each taskforce dir's link
+    assert envfile_1.stat().st_nlink >= 3
+
+
+def test_040_invalid_requirements_raise_before_submit(jel_dir: Path) -> None:
+    """Test that unparsable condor requirements are caught before submitting."""
+    worker_config = dict(
+        do_transfer_worker_stdouterr=False,
+        max_worker_runtime=95487,
+        n_cores=1,
+        priority=100,
+        worker_disk=85461235,
+        worker_memory=4235,
+        condor_requirements="foo && (",
+    )
+    with pytest.raises(starter.submit_template.InvalidCondorRequirements):
+        starter.make_condor_job_description(
+            "badreqs123",
+            dict(tag="my_image", image_source="cvmfs", environment={}, input_files=[]),
+            worker_config,
+            10,
+        )
+
+    # nothing was written for the taskforce
+    assert not (jel_dir / "ewms-taskforce-badreqs123").exists()
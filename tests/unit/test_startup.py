@@ -0,0 +1,197 @@
+"""Unit tests for (re)starting the TMS."""
+
+import asyncio
+import dataclasses as dc
+import logging
+import os
+import shutil
+import time
+from pathlib import Path
+from typing import Any, Iterator
+from unittest.mock import AsyncMock, MagicMock, patch
+
+import pytest
+
+from tms import __main__ as tms_main
+from tms import condor_tools, startup
+from tms.file_manager import file_manager as fm
+from tms.taskforce_cache import get_taskforce_cache
+from tms.utils import PathGuard
+from tms.watcher import watcher, watcher_loop
+
+LOGGER = logging.getLogger(__name__)
+
+# from startup to the first status update -- w/ a slow startup file-manager pass
+#   and a long watcher interval, neither of which should be waited on
+FIRST_UPDATE_BUDGET = 5.0
+
+SAMPLE_JEL = Path(__file__).parent.parent / "job_event_logs/condor_test_logfile"
+
+
+def _make_old(path: Path, seconds_old: float) -> None:
+    then = time.time() - seconds_old
+    os.utime(path, (then, then))
+
+
+@pytest.fixture
+def jel_dir(tmp_path: Path) -> Iterator[Path]:
+    """A JEL dir for the TMS -- & watchers that'd otherwise wait a long interval."""
+    get_taskforce_cache.cache_clear()
+    startup.MILESTONES.clear()
+    with (
+        patch("htcondor.param", new={"FULL_HOSTNAME": "foo.bar.schedd"}),
+        patch.object(
+            condor_tools, "ENV", dc.replace(condor_tools.ENV, JOB_EVENT_LOG_DIR=tmp_path)
+        ),
+        patch.object(
+            watcher,
+            "ENV",
+            dc.replace(watcher.ENV, JOB_EVENT_LOG_DIR=tmp_path, TMS_WATCHER_INTERVAL=60),
+        ),
+    ):
+        yield tmp_path
+    get_taskforce_cache.cache_clear()
+
+
+async def test_000_time_to_first_update(jel_dir: Path) -> None:
+    """Watchers start right away -- not after the startup file-manager pass."""
+    fresh_jel = jel_dir / "2024-01-06.tms.jel"
+    shutil.copy(SAMPLE_JEL, fresh_jel)
+    old_jel = jel_dir / "2024-01-05.tms.jel"
+    old_jel.touch()
+    _make_old(old_jel, 2 * 60 * 60)
+
+    # the startup pass's precheck for the old JEL is slow
+    async def slow_precheck(fpath: Path) -> bool:
+        await asyncio.sleep(30)
+        return False
+
+    file_managers = [
+        fm.FileManager(
+            str(jel_dir / "*.tms.jel"),
+            action=fm.action_rm,
+            age_threshold=60 * 60,
+            precheck_async=slow_precheck,
+        )
+    ]
+
+    first_update = asyncio.Event()
+
+    async def mock_request(method: str, path: str, body: dict[str, Any]) -> Any:
+        if path.endswith("/query/taskforces"):
+            assert body["query"]["job_event_log_fpath"] == str(fresh_jel)  # not the held one
+            if cid := body["query"].get("cluster_id"):
+                return {"taskforces": [{"taskforce_uuid": f"TF-{cid}"}]}
+            return {"taskforces": []}
+        if path.endswith("/tms/statuses/taskforces"):
+            first_update.set()
+            return {}
+        raise RuntimeError(f"unexpected request: {method} {path}")
+
+    rc = MagicMock()
+    rc.request = AsyncMock(side_effect=mock_request)
+
+    with (
+        patch.object(tms_main, "EWMSClient", return_value=rc),
+        patch.object(tms_main.scalar, "run", new=lambda _: asyncio.Event().wait()),
+        patch.object(fm, "build_file_managers", return_value=file_managers),
+    ):
+        start = time.monotonic()
+        task = asyncio.create_task(tms_main.main())
+        try:
+            await asyncio.wait_for(first_update.wait(), FIRST_UPDATE_BUDGET)
+            LOGGER.info(f"first update after {time.monotonic() - start:.2f}s")
+        finally:
+            task.cancel()
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+
+    assert "first EWMS status update" in startup.MILESTONES
+    assert "startup file-manager pass done" not in startup.MILESTONES  # (still going)
+    assert old_jel.exists()
+
+
+async def test_010_guard(tmp_path: Path) -> None:
+    """The startup pass holds just the paths it may act on, until it's done w/ them."""
+    old, fresh = tmp_path / "old.tms.jel", tmp_path / "fresh.tms.jel"
+    for f in [old, fresh]:
+        f.touch()
+    _make_old(old, 60)
+
+    guard = PathGuard()
+    held_during_action = []
+
+    def action(fpath: Path) -> None:
+        held_during_action.append((fpath, guard.is_held(fpath), guard.is_held(fresh)))
+        fpath.unlink()
+
+    file_managers = [fm.FileManager(str(tmp_path / "*.tms.jel"), action, age_threshold=10)]
+    assert await fm.run_once(MagicMock(), file_managers, guard) == 1
+    assert held_during_action == [(old, True, False)]
+    assert not guard.is_held(old)
+
+    # waiting on a guard w/o held paths is just a sleep
+    start = time.monotonic()
+    await guard.wait(0.1)
+    assert time.monotonic() - start >= 0.1
+
+
+async def test_020_watcher_loop_skips_held(jel_dir: Path) -> None:
+    """A held JEL is watched once it's released -- w/o waiting for the next scan."""
+    jel = jel_dir / "2024-01-05.tms.jel"
+    jel.touch()
+    guard = PathGuard()
+    guard.hold([jel])
+
+    started: list[Path] = []
+
+    class FakeWatcher:
+        def __init__(self, jel_fpath: Path, _: Any) -> None:
+            self.jel_fpath = jel_fpath
+
+        async def start(self) -> None:
+            started.append(self.jel_fpath)
+            await asyncio.Event().wait()
+
+    with patch.object(watcher_loop.watcher, "JobEventLogWatcher", FakeWatcher):
+        task = asyncio.create_task(watcher_loop.run(MagicMock(), guard))
+        await asyncio.sleep(0.2)
+        assert not started
+
+        guard.release([jel])
+        await asyncio.sleep(0.2)
+        assert started == [jel]
+        task.cancel()
+        try:
+            await task
+        except asyncio.CancelledError:
+            pass
+
+
+@pytest.mark.parametrize("read_on_start", [True, False])
+async def test_030_watcher_read_on_start(jel_dir: Path, read_on_start: bool) -> None:
+    """A watcher reads its JEL right away -- unless 'TMS_WATCHER_READ_ON_START' is off."""
+    jel = jel_dir / "2024-01-05.tms.jel"
+    shutil.copy(SAMPLE_JEL, jel)
+    rc = MagicMock()
+    rc.request = AsyncMock(return_value={"taskforces": []})
+
+    jel_watcher = watcher.JobEventLogWatcher(jel, rc)
+    with (
+        patch.object(
+            watcher,
+            "ENV",
+            dc.replace(watcher.ENV, TMS_WATCHER_INTERVAL=60, TMS_WATCHER_READ_ON_START=read_on_start),
+        ),
+        patch.object(jel_watcher, "_look_at_job_event_log", AsyncMock()) as read,
+    ):
+        task = asyncio.create_task(jel_watcher.start())
+        await asyncio.sleep(0.2)
+        task.cancel()
+        try:
+            await task
+        except asyncio.CancelledError:
+            pass
+    assert read.await_count == (1 if read_on_start else 0)
@@ -0,0 +1,182 @@
+"""Unit tests for the multi-process supervisor."""
+
+import dataclasses as dc
+import logging
+import pickle
+from pathlib import Path
+from typing import Any, Iterator, cast
+from unittest.mock import patch
+
+import pytest
+
+from tms import supervisor
+from tms.supervisor import Supervisor, WorkerSpec
+from tms.utils import JELFileLogic
+
+LOGGER = logging.getLogger(__name__)
+
+
+class FakeProcess:
+    """Stands in for a spawned worker process."""
+
+    n_started = 0
+
+    def __init__(self, target: Any, args: tuple[Any, ...], name: str) -> None:
+        self.name = name
+        self.exitcode: int | None = None
+        self.pid: int | None = None
+
+    def start(self) -> None:
+        FakeProcess.n_started += 1
+        self.pid = 1000 + FakeProcess.n_started
+
+    def is_alive(self) -> bool:
+        return self.exitcode is None
+
+    def terminate(self) -> None:
+        self.exitcode = -15
+
+    def join(self, timeout: float | None = None) -> None:
+        pass
+
+
+class FakeClock:
+    def __init__(self) -> None:
+        self.now = 0.0
+
+    def monotonic(self) -> float:
+        return self.now
+
+
+@pytest.fixture
+def clock() -> Iterator[FakeClock]:
+    """Fake processes & a fake clock."""
+    FakeProcess.n_started = 0
+    fake_clock = FakeClock()
+    with (
+        patch.object(supervisor._MP, "Process", FakeProcess),
+        patch.object(supervisor, "time", fake_clock),
+        patch.object(supervisor, "ENV", dc.replace(supervisor.ENV, TMS_ERROR_WAIT=10)),
+    ):
+        yield fake_clock
+
+
+def _exit(sup: Supervisor, name: str, exitcode: int) -> None:
+    cast(FakeProcess, sup.workers[name].process).exitcode = exitcode
+
+
+def test_000_spec() -> None:
+    """A spec names its worker & subsystem, and can be sent to a spawned process."""
+    jel = Path("/data/2024-01-05.tms.jel")
+    assert WorkerSpec("watcher", jel).name == "watcher:2024-01-05.tms.jel"
+    assert WorkerSpec("watcher", jel).subsystem == "watcher"
+    assert WorkerSpec("watcher_loop").subsystem == "watcher"
+    assert WorkerSpec("file_manager_once").subsystem == "file_manager"
+    assert WorkerSpec("scalar").name == "scalar"
+    assert pickle.loads(pickle.dumps(WorkerSpec("watcher", jel))) == WorkerSpec("watcher", jel)
+
+
+def test_010_restart_with_backoff(clock: FakeClock) -> None:
+    """A failed worker is restarted, w/ backoff -- reset after a stable run."""
+    sup = Supervisor()
+    sup.add(WorkerSpec("scalar"))
+    sup.add(WorkerSpec("scalar"))  # (already there)
+    assert FakeProcess.n_started == 1
+
+    # 1st failure -> 10s
+    _exit(sup, "scalar", 1)
+    sup.check()
+    clock.now = 9
+    sup.check()
+    assert FakeProcess.n_started == 1
+    clock.now = 10
+    sup.check()
+    assert FakeProcess.n_started == 2
+
+    # 2nd failure, right away -> 20s
+    _exit(sup, "scalar", 1)
+    sup.check()
+    clock.now = 29
+    sup.check()
+    assert FakeProcess.n_started == 2
+    clock.now = 30
+    sup.check()
+    assert FakeProcess.n_started == 3
+    assert sup.workers["scalar"].n_failures == 2
+
+    # failure after a stable run -> back to 10s
+    clock.now += supervisor.STABLE_RUNTIME
+    _exit(sup, "scalar", 1)
+    sup.check()
+    assert sup.workers["scalar"].n_failures == 1
+    clock.now += 10
+    sup.check()
+    assert FakeProcess.n_started == 4
+
+
+def test_020_finite_workers(clock: FakeClock) -> None:
+    """A one-off worker that's done is forgotten; a long-running one is restarted."""
+    sup = Supervisor()
+    for kind in ["file_manager_once", "file_manager"]:
+        sup.add(WorkerSpec(kind))
+        _exit(sup, kind, 0)
+    sup.check()
+    assert list(sup.workers) == ["file_manager"]
+    assert sup.workers["file_manager"].restart_at is not None
+
+    # a one-off worker that fails is retried
+    sup.add(WorkerSpec("file_manager_once"))
+    _exit(sup, "file_manager_once", 1)
+    sup.check()
+    assert "file_manager_once" in sup.workers
+
+
+def test_030_watcher_per_jel(clock: FakeClock, tmp_path: Path) -> None:
+    """Each JEL gets one watcher worker; a deleted JEL's is done."""
+    (tmp_path / "2024-01-05.tms.jel").touch()
+    (tmp_path / "2024-01-06.tms.jel").touch()
+    (tmp_path / "not-a-jel.txt").touch()
+    with patch.object(JELFileLogic, "parent", tmp_path):
+        sup = Supervisor()
+        sup.add_jel_watchers()
+        sup.add_jel_watchers()
+        assert sorted(sup.workers) == [
+            "watcher:2024-01-05.tms.jel",
+            "watcher:2024-01-06.tms.jel",
+        ]
+        assert FakeProcess.n_started == 2
+
+        (tmp_path / "2024-01-05.tms.jel").unlink()
+        _exit(sup, "watcher:2024-01-05.tms.jel", 0)
+        sup.check()
+        sup.add_jel_watchers()
+        assert list(sup.workers) == ["watcher:2024-01-06.tms.jel"]
+
+
+def test_040_stop_all(clock: FakeClock) -> None:
+    """All live workers are stopped."""
+    sup = Supervisor()
+    sup.add(WorkerSpec("scalar"))
+    sup.add(WorkerSpec("watcher_loop"))
+    sup.stop_all()
+    assert all(not w.process.is_alive() for w in sup.workers.values())  # type: ignore[union-attr]
+
+
+def test_050_per_schedd(clock: FakeClock) -> None:
+    """Each schedd gets its own workers."""
+    jel = Path("/data/ap1/2024-01-05.tms.jel")
+    assert WorkerSpec("scalar", schedd="ap1").name == "scalar:ap1"
+    assert WorkerSpec("watcher", jel, "ap1").name == "watcher:ap1/2024-01-05.tms.jel"
+
+    sup = Supervisor()
+    for schedd in ["ap1", "ap2"]:
+        sup.add(WorkerSpec("scalar", schedd=schedd))
+    assert sorted(sup.workers) == ["scalar:ap1", "scalar:ap2"]
+
+
+def test_060_warn_per_process_ewms_limits(caplog: pytest.LogCaptureFixture) -> None:
+    """The startup warning gives the combined EWMS concurrency of all workers."""
+    env = dc.replace(supervisor.ENV, TMS_EWMS_MAX_CONCURRENCY=8, TMS_WATCHER_PROCESS_PER_JEL=True)
+    with patch.object(supervisor, "ENV", env), caplog.at_level(logging.WARNING):
+        supervisor._warn_per_process_ewms_limits(3)
+    assert "up to 8 x (3 + 1 per JEL) in-flight requests" in caplog.text
@@ -0,0 +1,139 @@
+"""Unit tests for the shared taskforce cache."""
+
+import dataclasses as dc
+import logging
+import time
+from pathlib import Path
+from typing import Iterator
+from unittest.mock import AsyncMock, MagicMock, patch
+
+import pytest
+
+from tms import taskforce_cache
+from tms.scalar import starter
+from tms.scalar.scalar import EWMSCaller
+from tms.taskforce_cache import TaskforceCache, get_taskforce_cache
+from tms.utils import JELFileLogic, TaskforceDirLogic
+from tms.watcher import utils as watcher_utils
+
+LOGGER = logging.getLogger(__name__)
+
+JEL = Path("/data/2024-01-05.tms.jel")
+
+
+@pytest.fixture(autouse=True)
+def fresh_cache() -> Iterator[None]:
+    """Each test gets its own cache."""
+    get_taskforce_cache.cache_clear()
+    with patch("htcondor.param", new={"FULL_HOSTNAME": "foo.bar.schedd"}):
+        yield
+    get_taskforce_cache.cache_clear()
+
+
+def test_000_ttls() -> None:
+    """Ids are kept long, phases briefly -- except the final one."""
+    tf_cache = TaskforceCache(ttl=0.2, phase_ttl=0.05, usage_ttl=0.05)
+    tf_cache.put("TF-1", 123, JEL, phase="pending-starter")
+    tf_cache.put("TF-2", phase="condor-complete")
+    tf_cache.put_jel_usage(JEL, True)
+    assert tf_cache.get_uuid(JEL, 123) == "TF-1"
+    assert tf_cache.get_uuid(str(JEL), 123) == "TF-1"
+    assert tf_cache.get_uuid(JEL, 456) is None
+    assert tf_cache.get_phase("TF-1") == "pending-starter"
+    assert tf_cache.get_jel_usage(JEL) is True
+
+    time.sleep(0.1)
+    assert tf_cache.get_uuid(JEL, 123) == "TF-1"
+    assert tf_cache.get_phase("TF-1") is None
+    assert tf_cache.get_phase("TF-2") == "condor-complete"
+    assert tf_cache.get_jel_usage(JEL) is None
+
+    time.sleep(0.15)
+    assert tf_cache.get_uuid(JEL, 123) is None
+    assert tf_cache.get_phase("TF-2") is None
+
+
+def test_010_invalidate() -> None:
+    """A state change forgets the taskforce's phase & its JEL's usage, not its ids."""
+    tf_cache = TaskforceCache(ttl=60, phase_ttl=60, usage_ttl=60)
+    tf_cache.put("TF-1", 123, JEL, phase="condor-submit")
+    tf_cache.put_jel_usage(JEL, True)
+    tf_cache.put_jel_usage("/data/other.tms.jel", False)
+
+    tf_cache.invalidate("TF-1")
+    assert tf_cache.get_phase("TF-1") is None
+    assert tf_cache.get_jel_usage(JEL) is None
+    assert tf_cache.get_jel_usage("/data/other.tms.jel") is False  # not its JEL
+    assert tf_cache.get_uuid(JEL, 123) == "TF-1"
+
+    # JEL unknown -> any JEL's usage may have changed
+    tf_cache.invalidate("TF-unknown")
+    assert tf_cache.get_jel_usage("/data/other.tms.jel") is None
+
+
+def test_015_multiprocess_usage_ttl() -> None:
+    """W/ a cache per process, a JEL's usage is kept no longer than a phase."""
+    assert get_taskforce_cache().usage_ttl == taskforce_cache.ENV.TMS_JEL_USAGE_CACHE_TTL
+    get_taskforce_cache.cache_clear()
+    env = dc.replace(
+        taskforce_cache.ENV,
+        TMS_MULTIPROCESS=True,
+        TMS_JEL_USAGE_CACHE_TTL=600,
+        TMS_TASKFORCE_PHASE_CACHE_TTL=10,
+    )
+    with patch.object(taskforce_cache, "ENV", env):
+        assert get_taskforce_cache().usage_ttl == 10
+
+
+async def test_020_watcher_lookups() -> None:
+    """A cluster's uuid is looked up once -- or never, if the TMS submitted it."""
+    rc = MagicMock()
+    rc.request = AsyncMock(
+        return_value={"taskforces": [{"taskforce_uuid": "TF-1", "cluster_id": 123}]}
+    )
+    assert [x async for x in watcher_utils.query_all_taskforces(rc, JEL)] == [("TF-1", 123)]
+    assert await watcher_utils.get_taskforce_uuid(rc, 123, JEL) == "TF-1"
+    assert rc.request.await_count == 1
+
+    # not tracked (yet) -> not cached
+    rc.request = AsyncMock(return_value={"taskforces": []})
+    for _ in range(2):
+        with pytest.raises(watcher_utils.ClusterNotTrackedByEWMSError):
+            await watcher_utils.get_taskforce_uuid(rc, 456, JEL)
+    assert rc.request.await_count == 2
+
+    # submitted by this TMS
+    await EWMSCaller.confirm_condor_submit(
+        rc, "TF-2", {"cluster_id": 456, "job_event_log_fpath": str(JEL), "n_workers": 1}
+    )
+    assert await watcher_utils.get_taskforce_uuid(rc, 456, JEL) == "TF-2"
+    assert rc.request.await_count == 3  # just the confirmation
+
+
+async def test_030_pending_starter_check() -> None:
+    """The pre-submit check always asks EWMS -- it may have aborted the taskforce."""
+    rc = MagicMock()
+    rc.request = AsyncMock(return_value={"phase": "pending-starter"})
+    assert await starter.is_taskforce_still_pending_starter(rc, "TF-1")
+    rc.request.return_value = {"phase": "pending-stopper"}  # aborted by EWMS
+    assert not await starter.is_taskforce_still_pending_starter(rc, "TF-1")
+    assert rc.request.await_count == 2
+
+
+async def test_040_file_manager_lookups(tmp_path: Path) -> None:
+    """A JEL's usage is re-looked up after a taskforce using it completes."""
+    rc = MagicMock()
+    rc.request = AsyncMock(return_value={"taskforces": [{"job_event_log_fpath": str(JEL)}]})
+    assert not await JELFileLogic.has_no_noncompleted_taskforces(rc, JEL)
+    assert not await JELFileLogic.has_no_noncompleted_taskforces(rc, JEL)
+    assert rc.request.await_count == 1
+
+    get_taskforce_cache().put("TF-1", 123, JEL)
+    await watcher_utils.send_condor_complete(rc, "TF-1", 1704457764)
+    rc.request.return_value = {"taskforces": []}
+    assert await JELFileLogic.has_no_noncompleted_taskforces(rc, JEL)
+    assert rc.request.await_count == 3  # condor-complete + lookup
+
+    # ...and its dir's known to be done
+    assert await TaskforceDirLogic.is_not_in_use(rc, tmp_path / "ewms-taskforce-TF-1")
+    assert rc.request.await_count == 3
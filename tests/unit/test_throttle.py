@@ -0,0 +1,125 @@
+"""Unit tests for the submit throttle."""
+
+import getpass
+import logging
+import os
+from unittest.mock import MagicMock, patch
+
+import htcondor  # type: ignore[import-untyped]
+
+from tms import config  # noqa: F401  # setup env vars
+from tms.scalar import throttle
+
+LOGGER = logging.getLogger(__name__)
+
+
+htcondor.enable_debug()
+
+
+def _schedd_mock(n_jobs: int, n_idle: int, n_others_jobs: int = 0) -> MagicMock:
+    """A schedd w/ the TMS's jobs, plus others' (which aren't idle)."""
+
+    def query(constraint: str, opts: htcondor.QueryOpts) -> list[dict]:
+        assert opts == htcondor.QueryOpts.SummaryOnly
+        n_all = n_jobs + (0 if getpass.getuser() in constraint else n_others_jobs)
+        return [
+            {
+                "MyType": "Summary",
+                "Jobs": n_all,
+                "Idle": n_idle,
+                "Running": n_all - n_idle,
+                "Held": 0,
+            }
+        ]
+
+    schedd_obj = MagicMock()
+    schedd_obj.query.side_effect = query
+    return schedd_obj
+
+
+@patch(
+    "htcondor.param",
+    new=dict(
+        FULL_HOSTNAME=os.environ["_TEST_SCHEDD"],
+        MAX_JOBS_SUBMITTED="1000",
+        MAX_JOBS_PER_OWNER="2000",
+    ),
+)
+def test_000_defer_near_job_limit() -> None:
+    """Test that submissions are deferred near the schedd's job limit."""
+    schedd_obj = _schedd_mock(n_jobs=800, n_idle=10)
+    thr = throttle.SubmitThrottle(schedd_obj)
+
+    assert not thr.should_defer()
+    assert not thr.should_defer(100)  # 900 == 0.9 * min(1000, 2000)
+    assert thr.should_defer(101)
+    assert thr.state.is_deferring
+    assert thr.state.max_jobs == 900
+    assert thr.state.n_deferrals == 1
+
+    # totals are cached -- only one round of queries (all owners', then the TMS's)
+    assert schedd_obj.query.call_count == 2
+
+    # submissions are accounted for until the next query
+    thr.record_submission(100)
+    assert not thr.should_defer()
+    assert thr.should_defer(1)
+
+
+@patch(
+    "htcondor.param",
+    new=dict(FULL_HOSTNAME=os.environ["_TEST_SCHEDD"]),
+)
+def test_010_defer_on_idle_watermark() -> None:
+    """Test that submissions are deferred when there are too many idle jobs."""
+    thr = throttle.SubmitThrottle(
+        _schedd_mock(
+            n_jobs=config.ENV.TMS_SUBMIT_THROTTLE_IDLE_WATERMARK,
+            n_idle=config.ENV.TMS_SUBMIT_THROTTLE_IDLE_WATERMARK,
+        )
+    )
+
+    assert thr.should_defer()
+    assert thr.state.max_jobs is None  # no job limits configured
+    assert "idle" in thr.state.reason
+
+
+@patch(
+    "htcondor.param",
+    new=dict(FULL_HOSTNAME=os.environ["_TEST_SCHEDD"], MAX_JOBS_SUBMITTED="1000"),
+)
+def test_020_larger_than_limit() -> None:
+    """Test that a submission that can never fit doesn't wait forever."""
+    busy = throttle.SubmitThrottle(_schedd_mock(n_jobs=1, n_idle=1))
+    assert busy.should_defer(950)  # 950 > 900 -- waits for an empty schedd
+    assert not busy.is_too_large(950)
+    assert busy.is_too_large(1001)  # the schedd would never accept it
+
+    empty = throttle.SubmitThrottle(_schedd_mock(n_jobs=0, n_idle=0))
+    assert not empty.should_defer(950)
+
+
+def test_030_limits_are_cached() -> None:
+    """The schedd's job limits aren't re-read on every check."""
+    params = MagicMock(return_value={"MAX_JOBS_SUBMITTED": "1000"})
+    with patch.object(throttle, "get_schedd_params", params):
+        thr = throttle.SubmitThrottle(_schedd_mock(n_jobs=0, n_idle=0))
+        for _ in range(3):
+            assert not thr.is_too_large(10)
+            assert not thr.should_defer(10)
+    assert thr.state.job_limit == 1000
+    params.assert_called_once()
+
+
+def test_040_per_owner_limit_on_shared_ap() -> None:
+    """Others' jobs count toward 'MAX_JOBS_SUBMITTED', not 'MAX_JOBS_PER_OWNER'."""
+    params = {"MAX_JOBS_SUBMITTED": "10000", "MAX_JOBS_PER_OWNER": "1000"}
+    with patch.object(throttle, "get_schedd_params", return_value=params):
+        thr = throttle.SubmitThrottle(_schedd_mock(n_jobs=100, n_idle=0, n_others_jobs=5000))
+        assert not thr.should_defer(700)  # 800 <= 900
+        assert thr.should_defer(801)  # 901 > 900
+        assert "per-owner" in thr.state.reason
+
+        thr = throttle.SubmitThrottle(_schedd_mock(n_jobs=100, n_idle=0, n_others_jobs=8900))
+        assert thr.should_defer(1)  # 9001 > 9000
+        assert "per-owner" not in thr.state.reason
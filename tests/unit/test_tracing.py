@@ -0,0 +1,133 @@
+"""Unit tests for the tracing spans."""
+
+import dataclasses as dc
+import logging
+from functools import partial
+from pathlib import Path
+from typing import Iterator
+from unittest.mock import AsyncMock, MagicMock, patch
+
+import pytest
+from opentelemetry import trace
+from opentelemetry.sdk.trace import TracerProvider
+from opentelemetry.sdk.trace.export import SimpleSpanProcessor
+from opentelemetry.sdk.trace.export.in_memory_span_exporter import InMemorySpanExporter
+import wipac_telemetry.tracing_tools as wtt
+from rest_tools.client import ClientCredentialsAuth
+
+from tms import tracing
+from tms.ewms_client import EWMSClient
+from tms.scalar import stopper
+
+LOGGER = logging.getLogger(__name__)
+
+EXPORTER = InMemorySpanExporter()
+
+
+@pytest.fixture(autouse=True)
+def exporter() -> Iterator[InMemorySpanExporter]:
+    """Collect finished spans in memory (w/ every trace sampled, unless patched)."""
+    provider = trace.get_tracer_provider()
+    assert isinstance(provider, TracerProvider)  # (set up by wipac-telemetry)
+    if not getattr(provider, "_tms_test_exporter", False):
+        provider.add_span_processor(SimpleSpanProcessor(EXPORTER))
+        provider._tms_test_exporter = True  # type: ignore[attr-defined]
+
+    EXPORTER.clear()
+    with patch.object(tracing, "ENV", dc.replace(tracing.ENV, TMS_TRACE_SAMPLE_RATIO=1.0)):
+        yield EXPORTER
+
+
+def test_000_nested_spans(exporter: InMemorySpanExporter) -> None:
+    """A span w/o an active parent starts a trace, nested spans join it."""
+    with tracing.span("outer", taskforce_uuid="TF-1", path=Path("/a/b"), none=None):
+        with tracing.span("inner") as inner:
+            tracing.set_attributes(inner, bytes=123)
+
+    inner_s, outer_s = exporter.get_finished_spans()
+    assert outer_s.name == "outer" and outer_s.parent is None
+    assert inner_s.parent.span_id == outer_s.context.span_id  # type: ignore[union-attr]
+    assert dict(outer_s.attributes) == {"tms.taskforce_uuid": "TF-1", "tms.path": "/a/b"}  # type: ignore[arg-type]
+    assert dict(inner_s.attributes) == {"tms.bytes": 123}  # type: ignore[arg-type]
+
+
+async def test_010_unsampled_trace(exporter: InMemorySpanExporter) -> None:
+    """An unsampled trace exports nothing, incl. nested rest-tools' spans."""
+
+    @wtt.spanned()
+    async def rest_tools_request() -> None:
+        pass
+
+    with patch.object(tracing, "ENV", dc.replace(tracing.ENV, TMS_TRACE_SAMPLE_RATIO=0.0)):
+        with tracing.span("outer") as outer:
+            assert not outer.is_recording()
+            with tracing.span("inner") as inner:
+                assert not inner.is_recording()
+                tracing.set_attributes(inner, bytes=123)  # no error
+            await rest_tools_request()  # (wipac-telemetry can't take a non-recording span)
+
+    assert not exporter.get_finished_spans()
+
+    # outside of a trace, rest-tools' spans are their own
+    await rest_tools_request()
+    (theirs,) = exporter.get_finished_spans()
+    assert theirs.name.endswith("rest_tools_request") and theirs.parent is None
+
+
+async def test_020_ewms_request_span(exporter: InMemorySpanExporter) -> None:
+    """Each EWMS request gets a client span w/ its taskforce & outcome."""
+    rc = EWMSClient.__new__(EWMSClient)  # (don't connect to a token service)
+
+    with patch.object(ClientCredentialsAuth, "request", AsyncMock(return_value={})):
+        await rc.request("POST", "/v1/tms/condor-submit/taskforces/TF-9", {"cluster_id": 456})
+    with patch.object(ClientCredentialsAuth, "request", AsyncMock(side_effect=ValueError)):
+        with pytest.raises(ValueError):
+            await rc.request("GET", "/v1/tms/pending-starter/taskforces")
+
+    ok, err = exporter.get_finished_spans()
+    assert ok.name == "ewms.request" and ok.kind == trace.SpanKind.CLIENT
+    assert ok.attributes["tms.taskforce_uuid"] == "TF-9"  # type: ignore[index]
+    assert ok.attributes["tms.cluster_id"] == 456  # type: ignore[index]
+    assert ok.attributes["tms.endpoint"] == "/v1/tms/condor-submit/taskforces/{uuid}"  # type: ignore[index]
+    assert ok.attributes["tms.outcome"] == "ok"  # type: ignore[index]
+    assert err.attributes["tms.outcome"] == "error"  # type: ignore[index]
+    assert "tms.taskforce_uuid" not in err.attributes  # type: ignore[operator]
+    assert err.events[0].name == "exception"
+
+
+@patch("htcondor.param", new={"FULL_HOSTNAME": "foo.bar.schedd"})
+def test_030_schedd_act_span(exporter: InMemorySpanExporter) -> None:
+    """condor_rm's get a span w/ the cluster id & the number removed."""
+    schedd_obj = MagicMock()
+    schedd_obj.act.return_value = {"TotalSuccess": 3}
+    stopper.stop(schedd_obj, 123)
+
+    (s,) = exporter.get_finished_spans()
+    assert s.name == "schedd.act"
+    assert dict(s.attributes) == {  # type: ignore[arg-type]
+        "tms.action": "remove",
+        "tms.cluster_id": 123,
+        "tms.n_removed": 3,
+    }
+
+
+async def test_040_file_manager_action_span(
+    exporter: InMemorySpanExporter, tmp_path: Path
+) -> None:
+    """File-manager actions get a span w/ the path & bytes."""
+    from tms.file_manager import codecs, file_manager as fm
+
+    f = tmp_path / "x.tms.jel"
+    f.write_bytes(b"x" * 1000)
+    mgr = fm.FileManager(
+        str(tmp_path / "*.tms.jel"),
+        action=partial(fm.action_compress, codec=codecs.GzipCodec(threads=1)),
+        age_threshold=0,
+    )
+    assert await mgr.act(f)
+
+    (s,) = exporter.get_finished_spans()
+    assert s.name == "file_manager.action"
+    assert s.attributes["tms.action"] == "action_compress"  # type: ignore[index]
+    assert s.attributes["tms.path"] == str(f)  # type: ignore[index]
+    assert s.attributes["tms.bytes"] == 1000  # type: ignore[index]
@@ -12,6 +12,7 @@ import htcondor  # type: ignore[import-untyped]
 import pytest
 
 from tms import config, utils  # noqa: F401  # import in order to set up env vars
+from tms.taskforce_cache import get_taskforce_cache
 from tms.watcher import watcher
 
 htcondor.enable_debug()
@@ -73,6 +74,12 @@ class JobEventLogFileWrapper:
             livef.write("".join(more_lines))
 
 
+@pytest.fixture(autouse=True)
+def fresh_taskforce_cache() -> None:
+    """Each test looks up its taskforces on (mocked) EWMS."""
+    get_taskforce_cache.cache_clear()
+
+
 @pytest.fixture
 def jel_file_wrapper() -> JobEventLogFileWrapper:
     """JEL file."""
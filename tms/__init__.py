@@ -2,3 +2,5 @@
 
 # NOTE: `__version__` is not defined because this package is built using 'setuptools-scm' --
 #   use `importlib.metadata.version(...)` if you need to access version info at runtime.
+
+from . import startup  # noqa: F401  # first, so its clock includes the other imports
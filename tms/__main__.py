@@ -3,13 +3,19 @@
 import asyncio
 import logging
 
-import htcondor  # type: ignore[import-untyped]
-from rest_tools.client import ClientCredentialsAuth
-
-from .condor_tools import get_schedd
+from . import loop_monitor, metrics, profiler, startup
+from .condor_tools import (
+    configure_htcondor,
+    get_schedd,
+    get_schedds,
+    schedd_context,
+    task_name,
+)
 from .config import ENV, config_logging
+from .ewms_client import EWMSClient, subsystem_context
 from .file_manager import file_manager
 from .scalar import scalar
+from .utils import PathGuard
 from .watcher import watcher_loop
 
 LOGGER = logging.getLogger(__package__)  # not name b/c that's __main__
@@ -17,40 +23,76 @@ LOGGER = logging.getLogger(__package__)  # not name b/c that's __main__
 
 async def main() -> None:
     """explain."""
+    startup.record("imports", startup.elapsed() - startup.PHASES.get("config", 0.0))
     LOGGER.info("TMS Activated.")
 
-    htcondor.set_subsystem("TOOL")
-    htcondor.param["TOOL_DEBUG"] = "D_FULLDEBUG"
-    # htcondor.param["TOOL_LOG"] = "log.txt"
-    # htcondor.enable_log()
-    htcondor.enable_debug()
-    LOGGER.info(f"htcondor schedd: {get_schedd()}")
+    with startup.phase("htcondor"):
+        configure_htcondor()
+    LOGGER.info(f"htcondor schedd(s): {ENV.TMS_SCHEDDS or [get_schedd()]}")
+
+    # multi-process mode -- each subsystem in its own process, w/ its own EWMS client
+    if ENV.TMS_MULTIPROCESS:
+        from . import supervisor  # (lazy -- only needed in this mode)
+
+        LOGGER.info("Running subsystems as supervised processes...")
+        await supervisor.run()
+        return
+
+    with startup.phase("metrics"):
+        metrics.start_server()
 
     LOGGER.info("Connecting to EWMS...")
-    ewms_rc = ClientCredentialsAuth(
-        ENV.EWMS_ADDRESS,
-        ENV.EWMS_TOKEN_URL,
-        ENV.EWMS_CLIENT_ID,
-        ENV.EWMS_CLIENT_SECRET,
-    )
-
-    # run one-time file manager so other tasks don't touch to-be-deleted files
-    LOGGER.info("Starting one-time file manager before other tasks...")
-    await file_manager.run_once(ewms_rc)
-
-    LOGGER.info("Starting tasks...")
+    with startup.phase("ewms client"):
+        ewms_rc = EWMSClient(
+            ENV.EWMS_ADDRESS,
+            ENV.EWMS_TOKEN_URL,
+            ENV.EWMS_CLIENT_ID,
+            ENV.EWMS_CLIENT_SECRET,
+        )
+
+    # https://docs.python.org/3/library/asyncio-task.html#asyncio.TaskGroup
     async with asyncio.TaskGroup() as tg:
-        # scalar
-        LOGGER.info("Firing off scalar...")
-        tg.create_task(scalar.run(ewms_rc))
+        # event-loop monitor -- first, so it also covers startup
+        LOGGER.info("Firing off event-loop monitor...")
+        tg.create_task(loop_monitor.run(), name="loop_monitor")
+
+        # on-demand profiler
+        LOGGER.info("Firing off profiler trigger...")
+        tg.create_task(profiler.run(), name="profiler")
+
+        LOGGER.info("Starting tasks...")
+
+        # each schedd gets its own subsystems -- all share the EWMS client
+        for schedd in get_schedds():
+            # the file manager's first pass runs alongside the others -- it only holds
+            #   back the paths it may act on (so, watchers don't read to-be-archived JELs)
+            startup_guard = PathGuard()
+
+            # scalar
+            LOGGER.info(f"Firing off scalar ({schedd or 'local schedd'})...")
+            tg.create_task(
+                scalar.run(ewms_rc),
+                name=task_name("scalar", schedd),
+                context=schedd_context(schedd, subsystem_context("scalar")),
+            )
+
+            # watcher
+            LOGGER.info(f"Firing off watcher loop ({schedd or 'local schedd'})...")
+            tg.create_task(
+                watcher_loop.run(ewms_rc, startup_guard),
+                name=task_name("watcher_loop", schedd),
+                context=schedd_context(schedd, subsystem_context("watcher")),
+            )
 
-        # watcher
-        LOGGER.info("Firing off watcher loop...")
-        tg.create_task(watcher_loop.run(ewms_rc))
+            # file manager
+            LOGGER.info(f"Firing off file manager ({schedd or 'local schedd'})...")
+            tg.create_task(
+                file_manager.run(ewms_rc, startup_guard),
+                name=task_name("file_manager", schedd),
+                context=schedd_context(schedd, subsystem_context("file_manager")),
+            )
 
-        # file manager
-        LOGGER.info("Firing off file manager...")
-        tg.create_task(file_manager.run(ewms_rc))
+        startup.log_report()
 
 
 if __name__ == "__main__":
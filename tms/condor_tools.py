@@ -1,17 +1,103 @@
 """Util functions wrapping common htcondor actions."""
 
+import contextvars
 import logging
-from typing import TypedDict
+import time
+from pathlib import Path
+from typing import Any, Mapping, TypedDict
 
 import htcondor  # type: ignore[import-untyped]
 from typing_extensions import Required  # Required new to py3.11
 
+from .config import ENV
+
 LOGGER = logging.getLogger(__name__)
 
+# the schedd a task works for (set per task, see `schedd_context()`) -- None -> the local one
+SCHEDD: contextvars.ContextVar[str | None] = contextvars.ContextVar(
+    "tms_schedd", default=None
+)
+
+
+def configure_htcondor() -> None:
+    """Set up htcondor's python bindings for this process."""
+    htcondor.set_subsystem("TOOL")
+    htcondor.param["TOOL_DEBUG"] = "D_FULLDEBUG"
+    # htcondor.param["TOOL_LOG"] = "log.txt"
+    # htcondor.enable_log()
+    htcondor.enable_debug()
+
+
+def get_schedds() -> list[str | None]:
+    """Get the schedds to serve ('TMS_SCHEDDS', or else just the local one)."""
+    return list(ENV.TMS_SCHEDDS) or [None]
+
+
+def schedd_context(
+    name: str | None,
+    ctx: contextvars.Context | None = None,
+) -> contextvars.Context:
+    """Get a copy of the (current) context, for a task working for the schedd.
+
+    ex: tg.create_task(scalar.run(rc), context=schedd_context(name, subsystem_context("scalar")))
+    """
+    if ctx is None:
+        ctx = contextvars.copy_context()
+    ctx.run(SCHEDD.set, name)
+    return ctx
+
+
+def task_name(name: str, schedd: str | None) -> str:
+    """Get the name for a schedd's task.
+
+    ex: 'scalar' -- or, w/ 'TMS_SCHEDDS', 'scalar:ap1.icecube.wisc.edu'
+    """
+    return f"{name}:{schedd}" if schedd else name
+
 
 def get_schedd() -> str:
     """Get schedd dns."""
-    return str(htcondor.param["FULL_HOSTNAME"])
+    return SCHEDD.get() or str(htcondor.param["FULL_HOSTNAME"])
+
+
+def get_jel_dir() -> Path:
+    """Get the schedd's JEL dir (its taskforce dirs & shared files go here too)."""
+    if name := SCHEDD.get():
+        return ENV.JOB_EVENT_LOG_DIR / name
+    return ENV.JOB_EVENT_LOG_DIR
+
+
+# schedd name -> (when it was located, its location ad)
+_LOCATED: dict[str, tuple[float, Any]] = {}
+
+
+def _locate(name: str) -> Any:
+    """Locate the schedd via the collector.
+
+    The ad is reused for 'TMS_SCHEDD_LOAD_QUERY_INTERVAL' seconds, so each
+    connection isn't another (blocking) collector round trip.
+    """
+    if (located := _LOCATED.get(name)) and (
+        time.monotonic() - located[0] < ENV.TMS_SCHEDD_LOAD_QUERY_INTERVAL
+    ):
+        return located[1]
+    ad = htcondor.Collector().locate(htcondor.DaemonTypes.Schedd, name)
+    _LOCATED[name] = (time.monotonic(), ad)
+    return ad
+
+
+def get_schedd_obj() -> htcondor.Schedd:
+    """Connect to the schedd."""
+    if name := SCHEDD.get():
+        return htcondor.Schedd(_locate(name))  # (auth is per the condor config)
+    return htcondor.Schedd()  # no auth need b/c we're on AP
+
+
+def get_schedd_params() -> Mapping[str, str]:
+    """Get the schedd's condor config."""
+    if name := SCHEDD.get():
+        return htcondor.RemoteParam(_locate(name))  # type: ignore[no-any-return]
+    return htcondor.param  # type: ignore[no-any-return]
 
 
 # from https://github.com/htcondor/htcondor/blob/main/src/condor_scripts/condor_watch_q#L1179
@@ -2,11 +2,14 @@
 
 import dataclasses as dc
 import logging
+import os
 from pathlib import Path
-from typing import Dict
+from typing import Dict, List
 
 from wipac_dev_tools import from_environment_as_dataclass, logging_tools
 
+from . import startup
+
 LOGGER = logging.getLogger(__name__)
 
 WATCHER_N_TOP_TASK_ERRORS = 10
@@ -82,7 +85,45 @@ class EnvConfig:
 
     TMS_OUTER_LOOP_WAIT: int = 60
     TMS_WATCHER_INTERVAL: int = 60 * 3
-    TMS_FILE_MANAGER_INTERVAL: int = 60 * 60 * 1  # 1 hour
+    TMS_WATCHER_READ_ON_START: bool = True  # read a JEL (& update EWMS) right away -- False -> after an interval
+    TMS_FILE_MANAGER_INTERVAL: int = 60 * 60 * 1  # 1 hour -- full rescan & retry interval (actions are run when due)
+    TMS_FILE_MANAGER_WORKERS: int = 2  # max concurrent file-manager actions (threads)
+    TMS_FILE_MANAGER_IO_BYTES_PER_SEC: int = 0  # disk i/o budget shared by all actions -- 0 -> unlimited
+    TMS_FILE_MANAGER_IDLE_IO_PRIORITY: bool = False  # run actions in the 'idle' i/o class (linux)
+    TMS_ARCHIVE_CODEC: str = "gzip"  # for JEL & taskforce dir archives: gzip, zstd, or none
+    TMS_ARCHIVE_LEVEL: int | None = None  # compression level -- None -> codec's default
+    TMS_ARCHIVE_THREADS: int = dc.field(  # compression threads shared by all archive actions
+        default_factory=lambda: min(4, os.cpu_count() or 1)  # 1 -> single-threaded
+    )
+    TMS_DISK_USAGE_HIGH_WATERMARK: float = 0.90  # is (0,1] -- at/above, archive/delete early...
+    TMS_DISK_USAGE_LOW_WATERMARK: float = 0.80  # ...until at/below this
+    TMS_DISK_PRESSURE_RETRY_WAIT: int = 5 * 60  # if early actions couldn't relieve, wait before retrying
+    # how long a JEL's taskforce-usage lookup is reused -- w/ 'TMS_MULTIPROCESS', <= the phase TTL
+    TMS_JEL_USAGE_CACHE_TTL: int = 10 * 60
+    TMS_TASKFORCE_CACHE_TTL: int = 60 * 60  # how long a taskforce's ids (& final phase) are cached...
+    TMS_TASKFORCE_PHASE_CACHE_TTL: float = 10  # ...and its other phases -- 0 -> always ask EWMS
+    TMS_EWMS_TIMEOUT: float = 60  # secs per attempt, for endpoints w/o their own timeout
+    # NOTE: the EWMS limits below are per-process -- w/ 'TMS_MULTIPROCESS', each worker has its own
+    TMS_EWMS_MAX_CONCURRENCY: int = 8  # max in-flight EWMS requests (& pooled connections)...
+    TMS_EWMS_RESERVED_CRITICAL: int = 2  # ...of which, this many are only for critical ones (starts/stops)
+    # ex: "watcher=4 file_manager=2" -- unlisted subsystems only have the global limit
+    TMS_EWMS_SUBSYSTEM_CONCURRENCY: Dict[str, int] = dc.field(
+        default_factory=lambda: {"watcher": 4, "file_manager": 2}
+    )
+    TMS_EWMS_SHED_WAIT: float = 30  # how long a sheddable request (status update) waits for a slot
+    TMS_EWMS_MAX_RETRIES: int = 10  # per (non-critical) request...
+    TMS_EWMS_RETRY_BUDGET_RATIO: float = 0.2  # ...and, overall, retries are limited to ~this fraction of requests
+    TMS_EWMS_RETRY_BUDGET_MAX: float = 20  # (w/ this many saved up, for bursts)
+    TMS_EWMS_BREAKER_THRESHOLD: int = 5  # consecutive failures to open the circuit breaker...
+    TMS_EWMS_BREAKER_COOLDOWN: float = 30  # ...for this many secs, then probe
+    TMS_METRICS_PORT: int = 0  # serve prometheus metrics on this port -- 0 -> off
+    TMS_METRICS_ADDR: str = "127.0.0.1"
+    TMS_TRACE_SAMPLE_RATIO: float = 0.1  # is [0,1] -- fraction of traces (ex: watcher passes) recorded
+    TMS_LOOP_MONITOR_INTERVAL: float = 0.25  # how often the event loop's lag is measured
+    TMS_LOOP_STALL_THRESHOLD: float = 1.0  # log the blocking stack after this many secs -- 0 -> off
+    TMS_PROFILE_DIR: Path = Path("/tmp/tms-profiles")  # on-demand profiles (& their trigger file) go here -- made 0700
+    TMS_PROFILE_DURATION: float = 30  # default secs per on-demand profile
+    TMS_PROFILE_SAMPLE_INTERVAL: float = 0.01  # secs between stack samples
     TMS_MAX_LOGGING_INTERVAL: int = (  # something will be logged at least this often
         5 * 60
     )
@@ -90,6 +131,22 @@ class EnvConfig:
         # how much time to wait after an error, with the intention that the error may be transient
         10
     )
+    # ex: "ap1.icecube.wisc.edu ap2.icecube.wisc.edu" -- each gets its own starter/stopper,
+    # watchers & file manager, and its JELs go in 'JOB_EVENT_LOG_DIR/<schedd>' (a filesystem
+    # shared w/ its AP, at the same path) -- empty -> just the local schedd, w/ 'JOB_EVENT_LOG_DIR'
+    TMS_SCHEDDS: List[str] = dc.field(default_factory=list)
+    TMS_MULTIPROCESS: bool = False  # run each subsystem in its own supervised process...
+    TMS_WATCHER_PROCESS_PER_JEL: bool = False  # ...and each JEL's watcher in its own (w/ 'TMS_MULTIPROCESS')
+
+    # submission throttling -- defer starting taskforces when the schedd is loaded
+    TMS_SCHEDD_LOAD_QUERY_INTERVAL: int = 60  # how often to re-query the schedd's totals & limits (& re-locate it)
+    TMS_SUBMIT_THROTTLE_IDLE_WATERMARK: int = 50_000  # 0 -> no idle-job limit
+    TMS_SUBMIT_THROTTLE_JOBS_WATERMARK: float = (  # is (0,1] -- fraction of schedd's job limit
+        0.9
+    )
+    TMS_SCHEDD_INDEX_REFRESH_INTERVAL: int = (  # how often to re-query the schedd's ewms clusters
+        10 * 60
+    )
 
     CVMFS_PILOT_PATH: str = (
         "/cvmfs/icecube.opensciencegrid.org/containers/ewms/observation-management-service/ewms-pilot"
@@ -103,6 +160,53 @@ class EnvConfig:
     LOG_LEVEL_REST_TOOLS: logging_tools.LoggerLevel = "INFO"
 
     def __post_init__(self):
+        if self.TMS_FILE_MANAGER_WORKERS < 1:
+            raise ValueError("'TMS_FILE_MANAGER_WORKERS' must be >= 1")
+
+        if not 0 <= self.TMS_EWMS_RESERVED_CRITICAL < self.TMS_EWMS_MAX_CONCURRENCY:
+            raise ValueError(
+                "must be: 0 <= 'TMS_EWMS_RESERVED_CRITICAL' < 'TMS_EWMS_MAX_CONCURRENCY'"
+            )
+
+        if self.TMS_TASKFORCE_CACHE_TTL < 0 or self.TMS_TASKFORCE_PHASE_CACHE_TTL < 0:
+            raise ValueError(
+                "'TMS_TASKFORCE_CACHE_TTL' and 'TMS_TASKFORCE_PHASE_CACHE_TTL' must be >= 0"
+            )
+
+        if self.TMS_ARCHIVE_THREADS < 1:
+            raise ValueError("'TMS_ARCHIVE_THREADS' must be >= 1")
+
+        if not 0 <= self.TMS_TRACE_SAMPLE_RATIO <= 1:
+            raise ValueError("'TMS_TRACE_SAMPLE_RATIO' must be in [0,1]")
+
+        if self.TMS_LOOP_MONITOR_INTERVAL <= 0 or self.TMS_LOOP_STALL_THRESHOLD < 0:
+            raise ValueError(
+                "'TMS_LOOP_MONITOR_INTERVAL' must be > 0 and 'TMS_LOOP_STALL_THRESHOLD' >= 0"
+            )
+
+        if self.TMS_PROFILE_DURATION <= 0 or self.TMS_PROFILE_SAMPLE_INTERVAL <= 0:
+            raise ValueError(
+                "'TMS_PROFILE_DURATION' and 'TMS_PROFILE_SAMPLE_INTERVAL' must be > 0"
+            )
+
+        if self.TMS_FILE_MANAGER_IO_BYTES_PER_SEC < 0:
+            raise ValueError("'TMS_FILE_MANAGER_IO_BYTES_PER_SEC' must be >= 0")
+
+        if not (
+            0 < self.TMS_DISK_USAGE_LOW_WATERMARK
+            < self.TMS_DISK_USAGE_HIGH_WATERMARK
+            <= 1
+        ):
+            raise ValueError(
+                "must be: 0 < 'TMS_DISK_USAGE_LOW_WATERMARK' < 'TMS_DISK_USAGE_HIGH_WATERMARK' <= 1"
+            )
+
+        if self.TMS_ARCHIVE_CODEC.lower() not in ["gzip", "zstd", "none"]:
+            raise ValueError("'TMS_ARCHIVE_CODEC' must be one of: gzip, zstd, none")
+
+        if not 0 < self.TMS_SUBMIT_THROTTLE_JOBS_WATERMARK <= 1:
+            raise ValueError("'TMS_SUBMIT_THROTTLE_JOBS_WATERMARK' must be in (0,1]")
+
         if (
             self.JOB_EVENT_LOG_MODIFICATION_EXPIRY_LONG
             < self.JOB_EVENT_LOG_MODIFICATION_EXPIRY_SHORT
@@ -112,12 +216,25 @@ class EnvConfig:
                 "'JOB_EVENT_LOG_MODIFICATION_EXPIRY_SHORT'"
             )
 
-        if not self.JOB_EVENT_LOG_DIR.exists():
-            LOGGER.warning(f"JOB_EVENT_LOG_DIR: mkdir -p {self.JOB_EVENT_LOG_DIR}")
-            self.JOB_EVENT_LOG_DIR.mkdir(parents=True, exist_ok=True)
+        self._setup_jel_dirs()
+
+    def _setup_jel_dirs(self) -> None:
+        """Validate 'TMS_SCHEDDS', then make the JEL dir (& each schedd's subdir)."""
+        if len(set(self.TMS_SCHEDDS)) != len(self.TMS_SCHEDDS) or any(
+            not s or "/" in s for s in self.TMS_SCHEDDS
+        ):
+            raise ValueError("'TMS_SCHEDDS' must be unique schedd names (w/o '/')")
+
+        for dpath in [self.JOB_EVENT_LOG_DIR] + [
+            self.JOB_EVENT_LOG_DIR / s for s in self.TMS_SCHEDDS
+        ]:
+            if not dpath.exists():
+                LOGGER.warning(f"JOB_EVENT_LOG_DIR: mkdir -p {dpath}")
+                dpath.mkdir(parents=True, exist_ok=True)
 
 
-ENV = from_environment_as_dataclass(EnvConfig)
+with startup.phase("config"):
+    ENV = from_environment_as_dataclass(EnvConfig)
 
 
 def config_logging() -> None:
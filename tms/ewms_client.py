@@ -0,0 +1,446 @@
+"""The REST client for EWMS.
+
+Every subsystem shares one client, so it protects EWMS (and itself) from
+piling up requests when EWMS slows down:
+    - keep-alive connection pool, sized to the concurrency limit
+    - global concurrency limit, w/ slots reserved for critical requests
+      (starts/stops), plus optional per-subsystem limits
+    - per-endpoint timeouts
+    - retries w/ backoff, drawn from a shared retry budget -- except for
+      critical requests, which keep retrying (paced by the breaker)
+    - circuit breaker -- while open, sheddable requests are dropped &
+      others wait for it to close
+
+Sheddable requests (status updates -- the next one supersedes it) are shed
+first: when the breaker is open, or when no slot frees up in time. The
+caller gets `EWMSRequestShed`.
+"""
+
+import asyncio
+import contextvars
+import dataclasses as dc
+import enum
+import logging
+import re
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from functools import cache
+from typing import Any
+
+import requests
+from opentelemetry import trace
+from requests.adapters import HTTPAdapter
+from rest_tools.client import ClientCredentialsAuth
+
+from . import metrics, tracing
+from .config import ENV
+
+LOGGER = logging.getLogger(__name__)
+
+RETRIABLE_STATUS_CODES = (408, 429, 500, 502, 503, 504)
+BACKOFF_FACTOR = 0.5  # secs -- 0.5, 1, 2, 4, ... (max: BACKOFF_MAX)
+BACKOFF_MAX = 30
+
+_TASKFORCE_UUID_RE = re.compile(r"/taskforces/([^/]+)")
+
+
+class EWMSRequestShed(Exception):
+    """Raised when a sheddable request is dropped (EWMS is overloaded/down)."""
+
+
+# -----------------------------------------------------------------------------
+# request policies
+# -----------------------------------------------------------------------------
+
+
+class Priority(enum.IntEnum):
+    """How important a request is, when EWMS is struggling."""
+
+    SHEDDABLE = 0  # dropped first (a later request supersedes it)
+    NORMAL = 1
+    CRITICAL = 2  # may use the reserved slots
+
+
+@dc.dataclass(frozen=True)
+class EndpointPolicy:
+    """How to send a request to an endpoint."""
+
+    timeout: float  # secs, per attempt
+    priority: Priority
+
+
+# first match wins -- (method or None for any, regex on the path)
+ENDPOINT_POLICIES: list[tuple[str | None, re.Pattern, EndpointPolicy]] = [
+    (
+        "POST",
+        re.compile(r"/tms/statuses/taskforces$"),
+        EndpointPolicy(timeout=30, priority=Priority.SHEDDABLE),
+    ),
+    (
+        None,
+        re.compile(
+            r"/tms/(pending-starter|pending-stopper|condor-submit|condor-rm|condor-complete)/taskforces"
+        ),
+        EndpointPolicy(timeout=60, priority=Priority.CRITICAL),
+    ),
+    (
+        None,
+        re.compile(r"/query/"),
+        EndpointPolicy(timeout=30, priority=Priority.NORMAL),
+    ),
+]
+
+# requests from these subsystems are always critical
+CRITICAL_SUBSYSTEMS = {"scalar"}
+
+# the subsystem making the request (set per task, see `subsystem_context()`)
+SUBSYSTEM: contextvars.ContextVar[str] = contextvars.ContextVar(
+    "tms_ewms_subsystem", default="other"
+)
+
+# the current attempt's timeout (read in `EWMSClient._prepare()`)
+_TIMEOUT: contextvars.ContextVar[float | None] = contextvars.ContextVar(
+    "tms_ewms_timeout", default=None
+)
+
+
+def subsystem_context(name: str) -> contextvars.Context:
+    """Get a copy of the current context, for a subsystem's task.
+
+    ex: tg.create_task(scalar.run(rc), context=subsystem_context("scalar"))
+    """
+    ctx = contextvars.copy_context()
+    ctx.run(SUBSYSTEM.set, name)
+    return ctx
+
+
+def get_policy(method: str, path: str, subsystem: str) -> EndpointPolicy:
+    """Get the policy for the request."""
+    for m, regex, policy in ENDPOINT_POLICIES:
+        if (m is None or m == method) and regex.search(path):
+            break
+    else:
+        policy = EndpointPolicy(ENV.TMS_EWMS_TIMEOUT, Priority.NORMAL)
+
+    if subsystem in CRITICAL_SUBSYSTEMS:
+        policy = dc.replace(policy, priority=Priority.CRITICAL)
+    return policy
+
+
+# -----------------------------------------------------------------------------
+# limiter, retry budget, circuit breaker
+# -----------------------------------------------------------------------------
+
+
+class ConcurrencyLimiter:
+    """Limit in-flight requests globally & per subsystem.
+
+    Non-critical requests can't use the last `reserved` slots.
+    """
+
+    def __init__(self, limit: int, reserved: int, subsystem_limits: dict[str, int]) -> None:
+        self.limit = limit
+        self.reserved = reserved
+        self.subsystem_limits = subsystem_limits
+        self.in_flight = 0
+        self.in_flight_per_subsystem: Counter[str] = Counter()
+        self._waiters: list[asyncio.Future] = []
+
+    def _can_run(self, priority: Priority, subsystem: str) -> bool:
+        limit = self.limit if priority >= Priority.CRITICAL else self.limit - self.reserved
+        sub_limit = self.subsystem_limits.get(subsystem)
+        return self.in_flight < limit and (
+            sub_limit is None or self.in_flight_per_subsystem[subsystem] < sub_limit
+        )
+
+    async def acquire(self, priority: Priority, subsystem: str, max_wait: float | None) -> None:
+        """Wait for a slot.
+
+        Raises:
+            `TimeoutError` -- if none freed up within `max_wait` secs
+        """
+        deadline = None if max_wait is None else time.monotonic() + max_wait
+        while not self._can_run(priority, subsystem):
+            waiter = asyncio.get_running_loop().create_future()
+            self._waiters.append(waiter)
+            try:
+                await asyncio.wait_for(
+                    waiter,
+                    None if deadline is None else max(0.0, deadline - time.monotonic()),
+                )
+            finally:
+                self._waiters.remove(waiter)
+        self.in_flight += 1
+        self.in_flight_per_subsystem[subsystem] += 1
+        metrics.EWMS_IN_FLIGHT.labels(subsystem).inc()
+
+    def release(self, subsystem: str) -> None:
+        """Free the slot, and wake the waiters (to re-check)."""
+        self.in_flight -= 1
+        self.in_flight_per_subsystem[subsystem] -= 1
+        metrics.EWMS_IN_FLIGHT.labels(subsystem).dec()
+        for waiter in self._waiters:
+            if not waiter.done():
+                waiter.set_result(None)
+
+
+class RetryBudget:
+    """Limit retries to a fraction of requests, so retries can't snowball.
+
+    Each request deposits `ratio` tokens (up to `max_tokens`); each retry
+    costs one.
+    """
+
+    def __init__(self, ratio: float, max_tokens: float) -> None:
+        self.ratio = ratio
+        self.max_tokens = max_tokens
+        self.tokens = max_tokens
+
+    def deposit(self) -> None:
+        self.tokens = min(self.max_tokens, self.tokens + self.ratio)
+
+    def withdraw(self) -> bool:
+        """Take a token for a retry -- False if the budget's spent."""
+        if self.tokens < 1:
+            return False
+        self.tokens -= 1
+        return True
+
+
+class BreakerState(enum.IntEnum):
+    CLOSED = 0
+    HALF_OPEN = 1
+    OPEN = 2
+
+
+class CircuitBreaker:
+    """Stop sending requests after consecutive failures, then probe w/ one.
+
+    closed --(N failures)--> open --(cool-down)--> half-open
+    half-open --(probe ok)--> closed
+    half-open --(probe fails)--> open
+    """
+
+    def __init__(self, failure_threshold: int, cooldown: float) -> None:
+        self.failure_threshold = failure_threshold
+        self.cooldown = cooldown
+        self.failures = 0
+        self._opened_at: float | None = None
+        self._probing = False
+
+    @property
+    def state(self) -> BreakerState:
+        if self._opened_at is None:
+            return BreakerState.CLOSED
+        if time.monotonic() - self._opened_at < self.cooldown:
+            return BreakerState.OPEN
+        return BreakerState.HALF_OPEN
+
+    def allow(self) -> bool:
+        """Can a request be sent now? (in half-open, only the one probe)"""
+        match self.state:
+            case BreakerState.CLOSED:
+                return True
+            case BreakerState.HALF_OPEN if not self._probing:
+                self._probing = True
+                return True
+        return False
+
+    def record_success(self) -> None:
+        if self._opened_at is not None:
+            LOGGER.info("EWMS circuit breaker: closed")
+        self.failures = 0
+        self._opened_at = None
+        self._probing = False
+        metrics.EWMS_BREAKER_STATE.set(BreakerState.CLOSED)
+
+    def abandon_probe(self) -> None:
+        """Let another request probe (ex: this one was cancelled)."""
+        self._probing = False
+
+    def record_failure(self) -> None:
+        self.failures += 1
+        if self._probing or self.failures >= self.failure_threshold:
+            if self._opened_at is None or self._probing:
+                LOGGER.warning(
+                    f"EWMS circuit breaker: open for {self.cooldown}s "
+                    f"({self.failures} consecutive failures)"
+                )
+            self._opened_at = time.monotonic()
+            self._probing = False
+            metrics.EWMS_BREAKER_STATE.set(BreakerState.OPEN)
+
+
+@cache
+def get_limiter() -> ConcurrencyLimiter:
+    """Get the limiter shared by all EWMS requests."""
+    return ConcurrencyLimiter(
+        ENV.TMS_EWMS_MAX_CONCURRENCY,
+        ENV.TMS_EWMS_RESERVED_CRITICAL,
+        ENV.TMS_EWMS_SUBSYSTEM_CONCURRENCY,
+    )
+
+
+@cache
+def get_retry_budget() -> RetryBudget:
+    """Get the retry budget shared by all EWMS requests."""
+    return RetryBudget(ENV.TMS_EWMS_RETRY_BUDGET_RATIO, ENV.TMS_EWMS_RETRY_BUDGET_MAX)
+
+
+@cache
+def get_breaker() -> CircuitBreaker:
+    """Get the circuit breaker shared by all EWMS requests."""
+    return CircuitBreaker(ENV.TMS_EWMS_BREAKER_THRESHOLD, ENV.TMS_EWMS_BREAKER_COOLDOWN)
+
+
+def is_retriable(exc: BaseException) -> bool:
+    """Is this a transient error (ex: EWMS is down/overloaded, not a bad request)?"""
+    if isinstance(exc, requests.HTTPError):
+        return exc.response is not None and exc.response.status_code in RETRIABLE_STATUS_CODES
+    return isinstance(exc, (requests.ConnectionError, requests.Timeout))
+
+
+# -----------------------------------------------------------------------------
+# client
+# -----------------------------------------------------------------------------
+
+
+class EWMSClient(ClientCredentialsAuth):
+    """A `ClientCredentialsAuth` w/ the limits above, metrics & tracing spans.
+
+    Retries are done here (not by urllib3), so they count against the budget.
+    """
+
+    def __init__(
+        self,
+        address: str,
+        token_url: str,
+        client_id: str,
+        client_secret: str,
+        **kwargs: Any,
+    ) -> None:
+        kwargs.setdefault("timeout", ENV.TMS_EWMS_TIMEOUT)
+        super().__init__(address, token_url, client_id, client_secret, retries=0, **kwargs)
+
+    def open(self, sync: bool = False) -> requests.Session:
+        """Open the http session, w/ a keep-alive pool sized to the concurrency limit."""
+        session = super().open(sync)
+        adapter = HTTPAdapter(
+            pool_connections=1,  # (one host)
+            pool_maxsize=ENV.TMS_EWMS_MAX_CONCURRENCY,
+            max_retries=0,
+        )
+        session.mount("http://", adapter)
+        session.mount("https://", adapter)
+        if not sync:  # one thread per in-flight request
+            session.executor.shutdown(wait=False)  # type: ignore[attr-defined]
+            session.executor = ThreadPoolExecutor(  # type: ignore[attr-defined]
+                max_workers=ENV.TMS_EWMS_MAX_CONCURRENCY,
+                thread_name_prefix="tms-ewms",
+            )
+        return session
+
+    def _prepare(self, *args: Any, **kwargs: Any) -> tuple[str, dict[str, Any]]:
+        url, req_kwargs = super()._prepare(*args, **kwargs)
+        if (timeout := _TIMEOUT.get()) is not None:
+            req_kwargs["timeout"] = timeout
+        return url, req_kwargs
+
+    async def request(
+        self,
+        method: str,
+        path: str,
+        args: dict[str, Any] | None = None,
+        headers: dict[str, str] | None = None,
+    ) -> Any:
+        endpoint = metrics.normalize_endpoint(path)
+        subsystem = SUBSYSTEM.get()
+        policy = get_policy(method, path, subsystem)
+        start = time.perf_counter()
+        outcome = "error"
+        with tracing.span(
+            "ewms.request",
+            kind=trace.SpanKind.CLIENT,
+            method=method,
+            endpoint=endpoint,
+            taskforce_uuid=(m.group(1) if (m := _TASKFORCE_UUID_RE.search(path)) else None),
+            cluster_id=(args or {}).get("cluster_id"),
+            subsystem=subsystem,
+            priority=policy.priority.name,
+        ) as span:
+            try:
+                ret = await self._request_w_policy(method, path, args, headers, policy, subsystem)
+                outcome = "ok"
+                return ret
+            except EWMSRequestShed:
+                outcome = "shed"
+                raise
+            finally:
+                tracing.set_attributes(span, outcome=outcome)
+                metrics.EWMS_REQUEST_DURATION.labels(
+                    method, endpoint, outcome
+                ).observe(time.perf_counter() - start)
+
+    async def _request_w_policy(
+        self,
+        method: str,
+        path: str,
+        args: dict[str, Any] | None,
+        headers: dict[str, str] | None,
+        policy: EndpointPolicy,
+        subsystem: str,
+    ) -> Any:
+        limiter, budget, breaker = get_limiter(), get_retry_budget(), get_breaker()
+        sheddable = policy.priority == Priority.SHEDDABLE
+        critical = policy.priority >= Priority.CRITICAL
+        budget.deposit()
+
+        attempt = 0
+        while True:
+            # circuit breaker -- shed, or wait for it to (half-)close
+            while not breaker.allow():
+                if sheddable:
+                    raise EWMSRequestShed(f"EWMS circuit breaker is open ({method} {path})")
+                await asyncio.sleep(1)
+
+            # get a slot -- sheddable requests only wait so long
+            try:
+                await limiter.acquire(
+                    policy.priority,
+                    subsystem,
+                    ENV.TMS_EWMS_SHED_WAIT if sheddable else None,
+                )
+            except TimeoutError:
+                breaker.abandon_probe()  # (if this was to be the probe, let another be)
+                raise EWMSRequestShed(f"no EWMS request slot freed up ({method} {path})") from None
+            except BaseException:  # ex: cancelled
+                breaker.abandon_probe()
+                raise
+
+            try:
+                _TIMEOUT.set(policy.timeout)
+                ret = await super().request(method, path, args, headers)
+            except asyncio.CancelledError:
+                breaker.abandon_probe()
+                raise
+            except Exception as e:
+                if not is_retriable(e):
+                    breaker.record_success()  # (EWMS answered)
+                    raise
+                breaker.record_failure()
+                # starts/stops must go out once EWMS recovers -- so, no limit
+                if not critical and (
+                    attempt >= ENV.TMS_EWMS_MAX_RETRIES or not budget.withdraw()
+                ):
+                    raise
+                LOGGER.warning(f"retrying EWMS request ({method} {path}) after: {e!r}")
+                metrics.EWMS_RETRIES.labels(metrics.normalize_endpoint(path)).inc()
+            else:
+                breaker.record_success()
+                return ret
+            finally:
+                limiter.release(subsystem)
+
+            await asyncio.sleep(min(BACKOFF_MAX, BACKOFF_FACTOR * 2 ** min(attempt, 16)))
+            attempt += 1
@@ -0,0 +1,230 @@
+"""Compression codecs for file-manager archives (JELs and taskforce dirs)."""
+
+import gzip
+import logging
+from abc import ABC, abstractmethod
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from functools import cache
+from pathlib import Path
+from typing import Any, BinaryIO
+
+from ..config import ENV, abbrev_dunder_name
+
+LOGGER = logging.getLogger(abbrev_dunder_name(__name__))
+
+
+class Codec(ABC):
+    """A compression codec.
+
+    Subclasses define how to open a compressed stream for writing/reading,
+    and the suffixes used for archived files and tarballs.
+    """
+
+    name = ""
+    file_suffix = ""  # ex: 2025-8-26.tms.jel -> 2025-8-26.tms.jel<file_suffix>
+    tar_suffix = ""  # ex: ewms-taskforce-XYZ -> ewms-taskforce-XYZ<tar_suffix>
+
+    def __init__(self, level: int | None = None, threads: int | None = None) -> None:
+        self.level = level  # None -> codec's default
+        # None -> 'TMS_ARCHIVE_THREADS'
+        self.threads = threads if threads is not None else ENV.TMS_ARCHIVE_THREADS
+
+    def __repr__(self) -> str:
+        return f"{self.__class__.__name__}(level={self.level}, threads={self.threads})"
+
+    @abstractmethod
+    def open_writer(self, fpath: Path) -> BinaryIO:
+        """Open a stream that compresses everything written to it into `fpath`."""
+
+    @abstractmethod
+    def open_reader(self, fpath: Path) -> BinaryIO:
+        """Open a stream that decompresses `fpath`."""
+
+    @abstractmethod
+    def compress_frame(self, data: bytes) -> bytes:
+        """Compress the data as an independent frame.
+
+        Concatenated frames make a valid stream for the codec (readable by `open_reader`).
+        """
+
+    @abstractmethod
+    def decompress_frame(self, data: bytes) -> bytes:
+        """Decompress a frame made by `compress_frame`."""
+
+
+@cache
+def get_compress_pool(threads: int) -> ThreadPoolExecutor:
+    """Get the pool that blocks are compressed in -- shared by all archive actions."""
+    return ThreadPoolExecutor(max_workers=threads, thread_name_prefix="tms-compress")
+
+
+class ParallelGzipWriter:
+    """Compress fixed-size blocks in a thread pool, writing each as a gzip member.
+
+    zlib releases the GIL, so blocks are compressed on multiple cores. The
+    output is a concatenation of gzip members, which is a valid gzip stream
+    (gunzip, zcat, python's gzip, etc. read it as one). Each block is
+    compressed independently, so the ratio is slightly lower than a single
+    stream's.
+    """
+
+    BLOCK_SIZE = 4 * 1024 * 1024
+
+    def __init__(self, fpath: Path, level: int, threads: int) -> None:
+        self._out = open(fpath, "wb")
+        self._level = level
+        self._pool = get_compress_pool(threads)
+        self._max_pending = 2 * threads  # bounds memory, keeps the pool busy
+        self._pending: deque[Future[bytes]] = deque()
+        self._buf = bytearray()
+        self._n_members = 0
+        self.closed = False
+
+    def write(self, data: bytes) -> int:
+        self._buf += data
+        while len(self._buf) >= self.BLOCK_SIZE:
+            block = bytes(self._buf[: self.BLOCK_SIZE])
+            del self._buf[: self.BLOCK_SIZE]
+            self._submit(block)
+        return len(data)
+
+    def _submit(self, block: bytes) -> None:
+        self._pending.append(
+            self._pool.submit(gzip.compress, block, self._level, mtime=0)
+        )
+        self._n_members += 1
+        while len(self._pending) > self._max_pending:
+            self._out.write(self._pending.popleft().result())  # in order
+
+    def flush(self) -> None:
+        pass  # (blocks are written as they're done)
+
+    def close(self) -> None:
+        if self.closed:
+            return
+        self.closed = True
+        try:
+            if self._buf or not self._n_members:  # (empty input -> one empty member)
+                self._submit(bytes(self._buf))
+                self._buf.clear()
+            while self._pending:
+                self._out.write(self._pending.popleft().result())
+        finally:
+            self._out.close()
+
+    def __enter__(self) -> "ParallelGzipWriter":
+        return self
+
+    def __exit__(self, exc_type: Any, *_: Any) -> None:
+        if exc_type is not None:
+            # abandon -- the (partial) file is discarded by the caller
+            self.closed = True
+            for fut in self._pending:
+                fut.cancel()
+            self._out.close()
+        else:
+            self.close()
+
+
+class GzipCodec(Codec):
+    """gzip (zlib) -- readable everywhere.
+
+    With multiple threads, a multi-member stream is written (see `ParallelGzipWriter`).
+    """
+
+    name = "gzip"
+    file_suffix = ".gz"
+    tar_suffix = ".tar.gz"
+
+    def open_writer(self, fpath: Path) -> BinaryIO:
+        level = 9 if self.level is None else self.level
+        if self.threads > 1:
+            return ParallelGzipWriter(fpath, level, self.threads)  # type: ignore[return-value]
+        return gzip.open(fpath, "wb", compresslevel=level)  # type: ignore[return-value]
+
+    def open_reader(self, fpath: Path) -> BinaryIO:
+        return gzip.open(fpath, "rb")  # type: ignore[return-value]
+
+    def compress_frame(self, data: bytes) -> bytes:
+        return gzip.compress(data, 9 if self.level is None else self.level, mtime=0)
+
+    def decompress_frame(self, data: bytes) -> bytes:
+        return gzip.decompress(data)
+
+
+class ZstdCodec(Codec):
+    """zstd -- faster and smaller than gzip (requires the 'zstd' extra)."""
+
+    name = "zstd"
+    file_suffix = ".zst"
+    tar_suffix = ".tar.zst"
+
+    def __init__(self, level: int | None = None, threads: int | None = None) -> None:
+        super().__init__(level, threads)
+        try:
+            import zstandard  # type: ignore[import-not-found,unused-ignore]
+        except ImportError as e:
+            raise RuntimeError(
+                "the 'zstd' codec requires the 'zstandard' package: pip install tms[zstd]"
+            ) from e
+        self._zstd = zstandard
+
+    def open_writer(self, fpath: Path) -> BinaryIO:
+        return self._zstd.ZstdCompressor(  # type: ignore[no-any-return]
+            level=3 if self.level is None else self.level,
+            threads=self.threads if self.threads > 1 else 0,  # (zstd's own workers)
+        ).stream_writer(open(fpath, "wb"), closefd=True)
+
+    def open_reader(self, fpath: Path) -> BinaryIO:
+        return self._zstd.ZstdDecompressor().stream_reader(  # type: ignore[no-any-return]
+            open(fpath, "rb"), closefd=True, read_across_frames=True
+        )
+
+    def compress_frame(self, data: bytes) -> bytes:
+        return self._zstd.ZstdCompressor(  # type: ignore[no-any-return]
+            level=3 if self.level is None else self.level,
+        ).compress(data)
+
+    def decompress_frame(self, data: bytes) -> bytes:
+        return self._zstd.ZstdDecompressor().decompress(data)  # type: ignore[no-any-return]
+
+
+class NoneCodec(Codec):
+    """No compression -- JELs are moved aside as-is, dirs are plain tarballs."""
+
+    name = "none"
+    file_suffix = ".raw"
+    tar_suffix = ".tar"
+
+    def open_writer(self, fpath: Path) -> BinaryIO:
+        return open(fpath, "wb")
+
+    def open_reader(self, fpath: Path) -> BinaryIO:
+        return open(fpath, "rb")
+
+    def compress_frame(self, data: bytes) -> bytes:
+        return data
+
+    def decompress_frame(self, data: bytes) -> bytes:
+        return data
+
+
+CODECS: dict[str, type[Codec]] = {
+    GzipCodec.name: GzipCodec,
+    ZstdCodec.name: ZstdCodec,
+    NoneCodec.name: NoneCodec,
+}
+
+
+def get_codec(name: str, level: int | None = None, threads: int | None = None) -> Codec:
+    """Get the codec instance by name."""
+    try:
+        return CODECS[name.lower()](level, threads)
+    except KeyError:
+        raise ValueError(f"unknown codec '{name}' (choose from: {list(CODECS)})")
+
+
+def get_configured_codec() -> Codec:
+    """Get the codec configured for new archives."""
+    return get_codec(ENV.TMS_ARCHIVE_CODEC, ENV.TMS_ARCHIVE_LEVEL)
@@ -1,27 +1,38 @@
-"""Monitor and process files according to specified actions every 60 seconds."""
+"""Monitor and process files according to specified actions, when each is due."""
 
 import asyncio
-import glob
-import gzip
+import dataclasses as dc
+import fnmatch
+import heapq
+import itertools
 import logging
 import os
 import shutil
+import stat
 import tarfile
 import time
-from functools import partial
+from concurrent.futures import ThreadPoolExecutor
+from functools import cache, partial
 from pathlib import Path
-from typing import Awaitable, Callable
+from typing import Awaitable, Callable, Literal
 
 from rest_tools.client import RestClient
 
+from . import jel_archive
+from .codecs import CODECS, Codec, GzipCodec, get_configured_codec
+from .io_throttle import PacedWriter, paced_rmtree, set_idle_io_priority
+from .. import metrics, startup, tracing
+from ..condor_tools import SCHEDD, task_name
 from ..config import ENV, abbrev_dunder_name
-from ..utils import JELFileLogic, TaskforceDirLogic
+from ..utils import JELFileLogic, PathGuard, SharedFileLogic, TaskforceDirLogic
 
 LOGGER = logging.getLogger(abbrev_dunder_name(__name__))
 
 
 # -----------------------------------------------------------------------------
 # Action helpers (can be passed directly or via functools.partial/lambda)
+#   - disk i/o is paced by 'TMS_FILE_MANAGER_IO_BYTES_PER_SEC'
+#   - an action may return the number of bytes it processed (for reporting)
 # -----------------------------------------------------------------------------
 
 
@@ -32,7 +43,7 @@ def action_rm(fpath: Path) -> None:
         return
 
     if fpath.is_dir():
-        shutil.rmtree(fpath)
+        paced_rmtree(fpath)
     else:
         os.remove(fpath)
 
@@ -82,48 +93,265 @@ def _atomic_write_then_replace(final: Path, writer: Callable[[Path], None]) -> N
         raise
 
 
-def action_gzip(fpath: Path) -> None:
+def action_compress(fpath: Path, *, codec: Codec) -> int:
     """
-    gzip the file *in the same directory*, then delete the original.
+    Compress the file *in the same directory*, then delete the original.
     Uses atomic temp write + replace.
     """
     if not fpath.is_file():
         raise FileNotFoundError(f"{fpath=} is not a regular file")
 
-    final = fpath.with_suffix(fpath.suffix + ".gz")  # e.g., job.tms.jel.gz
+    final = fpath.with_name(fpath.name + codec.file_suffix)  # e.g., job.tms.jel.gz
+    n_bytes = 0
 
     def _writer(tmp: Path) -> None:
-        with open(fpath, "rb") as src, gzip.open(tmp, "wb") as out:
-            shutil.copyfileobj(src, out)
+        nonlocal n_bytes
+        with open(fpath, "rb") as src, codec.open_writer(tmp) as out:
+            paced = PacedWriter(out)
+            shutil.copyfileobj(src, paced)
+            n_bytes = paced.n_bytes
 
     _atomic_write_then_replace(final, _writer)
 
     # Only remove source after successful finalize
     fpath.unlink()
     LOGGER.info(f"compressed {fpath} → {final}")
+    return n_bytes
 
 
-def action_tar_gz(fpath: Path, *, dest: Path) -> None:
+def action_archive_jel(fpath: Path, *, codec: Codec) -> int:
     """
-    Tar+gzip the directory to `dest/<dirname>.tar.gz` and remove the source dir.
+    Compress the JEL *in the same directory* as indexed frames (see `jel_archive`),
+    then delete the original. Uses atomic temp write + replace.
+    """
+    if not fpath.is_file():
+        raise FileNotFoundError(f"{fpath=} is not a regular file")
+
+    final = fpath.with_name(fpath.name + codec.file_suffix)  # e.g., job.tms.jel.gz
+    frames: list[jel_archive.Frame] = []
+    n_bytes = 0
+
+    def _writer(tmp: Path) -> None:
+        nonlocal frames, n_bytes
+        frames, n_bytes = jel_archive.write(fpath, tmp, codec)
+
+    _atomic_write_then_replace(final, _writer)
+
+    # not fatal -- the archive is still readable whole
+    try:
+        jel_archive.write_index(final, frames, codec)
+    except Exception:
+        LOGGER.exception(f"could not write index for {final}")
+
+    # Only remove source after successful finalize
+    fpath.unlink()
+    LOGGER.info(f"compressed {fpath} → {final} ({len(frames)} indexed frames)")
+    return n_bytes
+
+
+def action_rm_archive(fpath: Path) -> None:
+    """rm the archive, and its index (if any)."""
+    action_rm(fpath)
+    jel_archive.index_path(fpath).unlink(missing_ok=True)
+
+
+def action_gzip(fpath: Path) -> int:
+    """
+    gzip the file *in the same directory*, then delete the original.
+    Uses atomic temp write + replace.
+    """
+    return action_compress(fpath, codec=GzipCodec())
+
+
+def action_tar(fpath: Path, *, dest: Path, codec: Codec) -> int:
+    """
+    Tar+compress the directory to `dest/<dirname><codec.tar_suffix>` and remove the source dir.
     Uses atomic temp write + replace.
     """
     if not dest:
-        raise RuntimeError(f"destination not given for 'tar_gz' on {fpath=}")
+        raise RuntimeError(f"destination not given for 'tar' on {fpath=}")
     if not fpath.is_dir():
         raise NotADirectoryError(f"{fpath=}")
 
-    final = dest / f"{fpath.name}.tar.gz"
+    final = dest / f"{fpath.name}{codec.tar_suffix}"
+    n_bytes = 0
 
     def _writer(tmp: Path) -> None:
-        with tarfile.open(tmp, "w:gz") as tar:
-            tar.add(fpath, arcname=fpath.name)  # preserve top-level dir
+        nonlocal n_bytes
+        # stream mode ('w|') -- compression is done by the codec's stream
+        with codec.open_writer(tmp) as out:
+            paced = PacedWriter(out)
+            with tarfile.open(fileobj=paced, mode="w|") as tar:  # type: ignore[call-overload]
+                tar.add(fpath, arcname=fpath.name)  # preserve top-level dir
+            n_bytes = paced.n_bytes
 
     _atomic_write_then_replace(final, _writer)
 
     # Only remove source after successful finalize
-    shutil.rmtree(fpath)
-    LOGGER.info(f"done: tar.gz {fpath} → {final} + rm {fpath}")
+    paced_rmtree(fpath)
+    LOGGER.info(f"done: {codec.tar_suffix.lstrip('.')} {fpath} → {final} + rm {fpath}")
+    return n_bytes
+
+
+def action_tar_gz(fpath: Path, *, dest: Path) -> int:
+    """
+    Tar+gzip the directory to `dest/<dirname>.tar.gz` and remove the source dir.
+    Uses atomic temp write + replace.
+    """
+    if not dest:
+        raise RuntimeError(f"destination not given for 'tar_gz' on {fpath=}")
+    return action_tar(fpath, dest=dest, codec=GzipCodec())
+
+
+# -----------------------------------------------------------------------------
+# Worker pool -- actions are blocking (compression, tarring, rm -r), so keep
+#                them off the event loop that the watchers and scalar share
+# -----------------------------------------------------------------------------
+
+
+@cache
+def _get_executor() -> ThreadPoolExecutor:
+    """Get the (bounded) pool that actions are run in.
+
+    Threads are used since zlib and file i/o release the GIL.
+    """
+    return ThreadPoolExecutor(
+        max_workers=ENV.TMS_FILE_MANAGER_WORKERS,
+        thread_name_prefix="tms-file-manager",
+        initializer=(
+            set_idle_io_priority if ENV.TMS_FILE_MANAGER_IDLE_IO_PRIORITY else None
+        ),
+    )
+
+
+# -----------------------------------------------------------------------------
+# Directory scan -- one listing per directory per pass, shared by all managers
+# -----------------------------------------------------------------------------
+
+
+@dc.dataclass(frozen=True)
+class ScannedEntry:
+    """A directory entry, with its stat info cached for the duration of a pass."""
+
+    path: Path
+    is_dir: bool
+    mtime: float
+    size: int
+
+    @staticmethod
+    def from_stat(path: Path, st: os.stat_result) -> "ScannedEntry":
+        """Make from a stat result."""
+        return ScannedEntry(
+            path=path,
+            is_dir=stat.S_ISDIR(st.st_mode),
+            mtime=st.st_mtime,
+            size=st.st_size,
+        )
+
+    @staticmethod
+    def from_path(path: Path) -> "ScannedEntry | None":
+        """Stat the path, or None if it's gone."""
+        try:
+            return ScannedEntry.from_stat(path, path.stat())
+        except FileNotFoundError:
+            return None
+
+
+def scan_dir(dpath: Path) -> list[ScannedEntry]:
+    """List the directory once, stat'ing each entry once.
+
+    Like glob, hidden entries (ex: in-progress ".*.tmp" archives) are skipped.
+    """
+    entries = []
+    try:
+        with os.scandir(dpath) as it:
+            for de in it:
+                if de.name.startswith("."):
+                    continue
+                try:
+                    st = de.stat()  # follows symlinks, like glob + Path.stat()
+                except FileNotFoundError:
+                    continue  # removed mid-scan
+                entries.append(ScannedEntry.from_stat(Path(de.path), st))
+    except FileNotFoundError:
+        LOGGER.debug(f"directory does not exist (yet): {dpath}")
+    return entries
+
+
+class DirAgeCache:
+    """Find whether a dir tree holds any file newer than a time, w/o rewalking it.
+
+    Each walked dir's newest file mtime (in its subtree) is cached along with
+    the dir's own mtime. A dir's mtime changes when entries are added/removed,
+    *NOT* when an existing file is written to -- so the cached value is only
+    a lower bound on the subtree's newest mtime. That is enough to answer
+    "is anything newer than T?" with "yes" while the lower bound is > T.
+    Otherwise, the dir is walked again (files may have been written since).
+
+    So, a dir that is still in use (ex: a taskforce's procs writing .out/.err
+    files) is not rewalked every pass -- only once it may have aged out.
+    """
+
+    def __init__(self) -> None:
+        # top dir -> {dir in its tree -> (dir's st_mtime_ns, newest file mtime lower bound)}
+        self._trees: dict[str, dict[str, tuple[int, float]]] = {}
+
+    def has_file_newer_than(self, dpath: Path, threshold_time: float) -> bool:
+        """Is there any file (recursively) in the dir with mtime > threshold_time?"""
+        tree = self._trees.setdefault(str(dpath), {})
+        return self._newest_mtime(tree, str(dpath), threshold_time) > threshold_time
+
+    def _newest_mtime(
+        self,
+        tree: dict[str, tuple[int, float]],
+        dpath: str,
+        threshold_time: float,
+    ) -> float:
+        """Get the newest file mtime in the subtree.
+
+        Short-circuits (returning a lower bound) as soon as a file newer than
+        `threshold_time` is found.
+        """
+        try:
+            dir_mtime_ns = os.stat(dpath).st_mtime_ns
+        except FileNotFoundError:
+            tree.pop(dpath, None)
+            return 0.0
+
+        # unchanged dir & already known to hold something newer -> no walk
+        if (cached := tree.get(dpath)) and cached[0] == dir_mtime_ns:
+            if cached[1] > threshold_time:
+                return cached[1]
+
+        newest = 0.0
+        try:
+            with os.scandir(dpath) as it:
+                for de in it:
+                    try:
+                        # don't recurse into symlinked dirs (like rglob)
+                        if de.is_dir(follow_symlinks=False):
+                            newest = max(
+                                newest,
+                                self._newest_mtime(tree, de.path, threshold_time),
+                            )
+                        elif de.is_file():  # (follows symlinks)
+                            newest = max(newest, de.stat().st_mtime)
+                    except FileNotFoundError:
+                        continue  # removed mid-walk
+                    if newest > threshold_time:
+                        break  # short circuit (don't traverse more than needed)
+        except FileNotFoundError:
+            tree.pop(dpath, None)
+            return 0.0
+
+        tree[dpath] = (dir_mtime_ns, newest)
+        return newest
+
+    def retain(self, dpaths: set[Path]) -> None:
+        """Forget every tree but these (ex: the others were tarred/removed)."""
+        keep = {str(d) for d in dpaths}
+        for top in [t for t in self._trees if t not in keep]:
+            del self._trees[top]
 
 
 # -----------------------------------------------------------------------------
@@ -137,34 +365,71 @@ class FileManager:
     def __init__(
         self,
         fpattern: str,
-        action: Callable[[Path], None],
+        action: Callable[[Path], int | None],
         age_threshold: int,
         precheck_async: Callable[[Path], Awaitable[bool]] | None = None,
+        entry_type: Literal["file", "dir"] | None = None,
+        precheck_prefetch_async: Callable[[list[Path]], Awaitable[None]] | None = None,
+        allow_early: bool = False,
+        early_precheck_async: Callable[[Path], Awaitable[bool]] | None = None,
+        early_candidate: Callable[["ScannedEntry"], bool] | None = None,
     ):
         self.fpattern = fpattern
         self.action = action
         self.age_threshold = age_threshold  # Only act if file is older than this
         self.precheck_async = precheck_async
+        # given all of a pass's old-enough paths, warms up whatever 'precheck_async' uses
+        self.precheck_prefetch_async = precheck_prefetch_async
+        # under disk pressure, may act before 'age_threshold'? -- if so, both
+        #   'early_precheck_async' and 'precheck_async' must pass
+        self.allow_early = allow_early
+        self.early_precheck_async = early_precheck_async
+        # which scanned paths may be acted on early at all (None -> any)
+        self.early_candidate = early_candidate
+        self.entry_type = entry_type  # None -> either
+
+        # the pattern is matched against names in a single dir
+        self.dpath = Path(os.path.dirname(fpattern) or ".")
+        self.name_pattern = os.path.basename(fpattern)
+
+        self.dir_age_cache = DirAgeCache()
+
+    def matches(self, entry: ScannedEntry) -> bool:
+        """Does the scanned entry match this manager's pattern (and type)?"""
+        if self.entry_type == "dir" and not entry.is_dir:
+            return False
+        if self.entry_type == "file" and entry.is_dir:
+            return False
+        return fnmatch.fnmatchcase(entry.path.name, self.name_pattern)
+
+    def may_act_early(self, entry: ScannedEntry) -> bool:
+        """Under disk pressure, may the scanned path be acted on before it's old enough?"""
+        return self.allow_early and (
+            self.early_candidate is None or self.early_candidate(entry)
+        )
+
+    def is_old_enough(self, fpath: Path, entry: ScannedEntry | None = None) -> bool:
+        """Is the file/dir older than the age_threshold?
 
-    def is_old_enough(self, fpath: Path) -> bool:
-        """Is the file/dir older than the age_threshold?"""
+        If given, `entry`'s cached stat info is used instead of re-stat'ing `fpath`.
+        """
         threshold_time = time.time() - self.age_threshold
 
-        if fpath.is_dir():
+        if entry is not None and not entry.is_dir:
+            return entry.mtime <= threshold_time
 
-            # Walk through files; if any are newer than threshold -> not old enough
-            for p in fpath.rglob("*"):
-                # short circuit logic (don't traverse more than needed)
-                try:
-                    if p.is_file() and p.stat().st_mtime > threshold_time:
-                        return False
-                except FileNotFoundError:
-                    continue
+        if entry.is_dir if entry is not None else fpath.is_dir():
+
+            # if any file (recursively) is newer than threshold -> not old enough
+            if self.dir_age_cache.has_file_newer_than(fpath, threshold_time):
+                return False
 
             # Notes:
             #   - If the dir had no files *OR* had only old files, check dir's mtime.
             #   - A dir's mtime updates when its entries change (create/rm/mv files or subdirs),
             #       *NOT* when the contents of its descendants change.
+            if entry is not None:
+                return entry.mtime <= threshold_time
             try:
                 return fpath.stat().st_mtime <= threshold_time
             except FileNotFoundError:
@@ -177,14 +442,36 @@ class FileManager:
             except FileNotFoundError:
                 return False
 
-    async def act(self, fpath: Path) -> bool:
-        """Perform action on filepath, if the file is old enough."""
-        if not fpath.exists():
+    async def act(
+        self,
+        fpath: Path,
+        entry: ScannedEntry | None = None,
+        early: bool = False,
+    ) -> bool:
+        """Perform action on filepath, if the file is old enough.
+
+        If given, `entry` is the filepath's info from this pass's scan.
+
+        If `early`, the age check is replaced by 'early_precheck_async'
+        (see `relieve_disk_pressure()`).
+        """
+        # (a scanned entry was there moments ago -- a race is handled by the action)
+        if entry is None and not fpath.exists():
             LOGGER.info(f"ok: file deleted/moved before action ({self.action})")
             return False
 
+        if early:
+            if not self.allow_early:
+                raise RuntimeError(f"early action not allowed for {self.fpattern}")
+            if entry is not None and not self.may_act_early(entry):
+                LOGGER.debug(f"no early action -- not a candidate {fpath=}")
+                return False
+            if self.early_precheck_async is not None:
+                if not await self.early_precheck_async(fpath):
+                    LOGGER.debug(f"early precheck returned 'False' for {fpath=}")
+                    return False
         # age check
-        if not self.is_old_enough(fpath):
+        elif not self.is_old_enough(fpath, entry):
             LOGGER.debug(
                 f"no action -- filepath not older than {self.age_threshold} seconds {fpath=}"
             )
@@ -196,9 +483,31 @@ class FileManager:
                 LOGGER.debug(f"precheck returned 'False' for {fpath=}")
                 return False
 
-        # act
+        # act -- in the worker pool, so the event loop is not blocked
         LOGGER.info(f"performing action {self.action} on {fpath}")
-        self.action(fpath)
+        action_name = metrics.get_action_name(self.action)
+        start = time.monotonic()
+        with (
+            metrics.timed(metrics.FILE_MANAGER_ACTION_DURATION.labels(action_name)),
+            tracing.span(
+                "file_manager.action", action=action_name, path=fpath, early=early
+            ) as span,
+        ):
+            n_bytes = await asyncio.get_running_loop().run_in_executor(
+                _get_executor(), self.action, fpath
+            )
+            tracing.set_attributes(span, bytes=n_bytes)
+        if n_bytes is not None:
+            metrics.FILE_MANAGER_ACTION_BYTES.labels(action_name).inc(n_bytes)
+            elapsed = time.monotonic() - start
+            import humanfriendly  # type: ignore[import-untyped]  # (lazy -- not needed at startup)
+
+            LOGGER.info(
+                f"throughput: {humanfriendly.format_size(n_bytes, binary=True)} "
+                f"in {elapsed:.1f}s "
+                f"({humanfriendly.format_size(n_bytes / max(elapsed, 1e-6), binary=True)}/s) "
+                f"for {fpath}"
+            )
         return True
 
 
@@ -207,8 +516,28 @@ class FileManager:
 # -----------------------------------------------------------------------------
 
 
+def is_early_jel_candidate(entry: ScannedEntry) -> bool:
+    """May the JEL be archived early (under disk pressure)?
+
+    Never today's JEL -- EWMS reports it unused between a submit and its
+    confirmation, and the next submit would recreate it (so its archive
+    would be in the way). Nor one modified within
+    'JOB_EVENT_LOG_MODIFICATION_EXPIRY_SHORT'.
+    """
+    if entry.path == JELFileLogic.get_todays_path():
+        return False
+    return time.time() - entry.mtime >= ENV.JOB_EVENT_LOG_MODIFICATION_EXPIRY_SHORT
+
+
 def build_file_managers(ewms_rc: RestClient) -> list[FileManager]:
-    """Build the list of file managers."""
+    """Build the list of file managers.
+
+    New archives use the configured codec ('TMS_ARCHIVE_CODEC'), but archives
+    of every known codec are recognized for retention (in case it was changed).
+    """
+    codec = get_configured_codec()
+    LOGGER.info(f"archiving with {codec}")
+
     return [
         # =========================================================================
         # JEL FILES: compress first, delete much later
@@ -216,48 +545,85 @@ def build_file_managers(ewms_rc: RestClient) -> list[FileManager]:
         #
         # ex: 2025-8-26.tms.jel
         # -> does check if no noncompleted taskforces
-        #    (When quiet and unused: gzip in-place; the original .tms.jel is removed)
+        #    (When quiet and unused: compress in-place; the original .tms.jel is removed)
         FileManager(
             str(JELFileLogic.parent / f"*{JELFileLogic.extension}"),
-            action=action_gzip,  # compress to *.tms.jel.gz atomically, then remove source
+            action=partial(action_archive_jel, codec=codec),  # compress to indexed *.tms.jel.gz (etc.) atomically, then remove source
             age_threshold=ENV.JOB_EVENT_LOG_MODIFICATION_EXPIRY_SHORT,
             precheck_async=partial(
                 JELFileLogic.has_no_noncompleted_taskforces, ewms_rc
             ),
+            entry_type="file",
+            # one EWMS request for all of the pass's candidate JELs
+            precheck_prefetch_async=partial(JELFileLogic.prefetch_usage, ewms_rc),
+            # early (disk pressure) only for a JEL that's quiet & *currently* unused
+            #   -- see `is_early_jel_candidate()`
+            allow_early=True,
+            early_candidate=is_early_jel_candidate,
+            early_precheck_async=partial(
+                JELFileLogic.has_no_noncompleted_taskforces, ewms_rc, fresh=True
+            ),
         ),
         #
         # ex: 2025-8-26.tms.jel
         # -> does *NOT* check if no noncompleted taskforces
-        #    (Absolute quiet-age: gzip even if TF view is uncertain)
+        #    (Absolute quiet-age: compress even if TF view is uncertain)
+        #    -- so, never early (disk pressure)
         FileManager(
             str(JELFileLogic.parent / f"*{JELFileLogic.extension}"),
-            action=action_gzip,  # compress to *.tms.jel.gz atomically, then remove source
+            action=partial(action_archive_jel, codec=codec),  # compress to indexed *.tms.jel.gz (etc.) atomically, then remove source
             age_threshold=ENV.JOB_EVENT_LOG_MODIFICATION_EXPIRY_LONG,
+            entry_type="file",
         ),
         #
-        # ex: 2025-8-26.tms.jel.gz
-        # -> delete archived gzip after long retention
-        FileManager(
-            str(JELFileLogic.parent / f"*{JELFileLogic.extension}.gz"),
-            action=action_rm,
-            age_threshold=ENV.JOB_EVENT_LOG_ARCHIVE_DELETE_EXPIRY,  # retention for gzipped JELs
-        ),
+        # ex: 2025-8-26.tms.jel.gz, 2025-8-26.tms.jel.zst, ...
+        # -> delete archived JEL after long retention
+        *[
+            FileManager(
+                str(JELFileLogic.parent / f"*{JELFileLogic.extension}{c.file_suffix}"),
+                action=action_rm_archive,  # (+ its index)
+                age_threshold=ENV.JOB_EVENT_LOG_ARCHIVE_DELETE_EXPIRY,  # retention for archived JELs
+                allow_early=True,
+            )
+            for c in CODECS.values()  # classes -- only the suffixes are needed
+        ],
         # =========================================================================
-        # TASKFORCE DIRECTORIES: tar.gz then delete old archives
+        # TASKFORCE DIRECTORIES: tar then delete old archives
         # =========================================================================
         #
         # ex: ewms-taskforce-TF-685e6219-e85461b3-f8dc0d3c-6e4a5d72
+        # -> dirs only, the pattern also matches this manager's own tarballs
         FileManager(
             str(TaskforceDirLogic.parent / f"{TaskforceDirLogic.prefix}*"),
-            action=partial(action_tar_gz, dest=ENV.JOB_EVENT_LOG_DIR),
+            action=partial(action_tar, dest=TaskforceDirLogic.parent, codec=codec),
             age_threshold=ENV.TASKFORCE_DIRS_EXPIRY,
+            entry_type="dir",
+            # early (disk pressure) only if the taskforce is done -- its jobs write here
+            allow_early=True,
+            early_precheck_async=partial(TaskforceDirLogic.is_not_in_use, ewms_rc),
         ),
         #
-        # ex: ewms-taskforce-TF-685e6219-e85461b3-f8dc0d3c-6e4a5d72.tar.gz
+        # ex: ewms-taskforce-TF-685e6219-e85461b3-f8dc0d3c-6e4a5d72.tar.gz, ....tar.zst, ...
+        *[
+            FileManager(
+                str(TaskforceDirLogic.parent / f"{TaskforceDirLogic.prefix}*{c.tar_suffix}"),
+                action=action_rm,
+                age_threshold=ENV.TASKFORCE_DIRS_TAR_EXPIRY,
+                allow_early=True,
+            )
+            for c in CODECS.values()  # classes -- only the suffixes are needed
+        ],
+        # =========================================================================
+        # SHARED FILES: delete once no taskforce dir links to them
+        # =========================================================================
+        #
+        # ex: ewms-shared-files/5d41402abc4b2a76b9719d911017c592...
         FileManager(
-            str(TaskforceDirLogic.parent / f"{TaskforceDirLogic.prefix}*.tar.gz"),
+            str(SharedFileLogic.parent / "*"),
             action=action_rm,
-            age_threshold=ENV.TASKFORCE_DIRS_TAR_EXPIRY,
+            age_threshold=ENV.TASKFORCE_DIRS_EXPIRY,
+            precheck_async=SharedFileLogic.is_unreferenced,
+            allow_early=True,  # (the precheck still applies)
         ),
     ]
 
@@ -267,13 +633,79 @@ def build_file_managers(ewms_rc: RestClient) -> list[FileManager]:
 # -----------------------------------------------------------------------------
 
 
+async def _act_on_entries(
+    fm: FileManager,
+    entries: list[ScannedEntry],
+    consumed: set[Path],
+) -> list[bool]:
+    """Act on each entry (concurrently, bounded), after bulk-resolving prechecks.
+
+    Paths acted on (or that failed mid-action) are added to `consumed`.
+
+    Returns:
+        list[bool]: whether each entry was acted on
+    """
+    # bulk-resolve the prechecks of the candidates (those old enough)
+    if fm.precheck_prefetch_async is not None:
+        if candidates := [e.path for e in entries if fm.is_old_enough(e.path, e)]:
+            try:
+                await fm.precheck_prefetch_async(candidates)
+            except Exception:
+                # not fatal -- each precheck falls back to looking itself up
+                LOGGER.exception(f"precheck prefetch failed for {fm.fpattern}")
+
+    # limit concurrent actions -- these run in the worker pool
+    semaphore = asyncio.Semaphore(ENV.TMS_FILE_MANAGER_WORKERS)
+
+    async def _act(entry: ScannedEntry) -> bool:
+        async with semaphore:
+            LOGGER.debug(f"looking at {entry.path}")
+            try:
+                acted = await fm.act(entry.path, entry)
+            except Exception:
+                LOGGER.exception(f"action failed for {entry.path}")
+                # it may be partially processed -- don't let another manager touch it
+                consumed.add(entry.path)
+                return False
+            if acted:
+                consumed.add(entry.path)
+            return acted
+
+    return await asyncio.gather(*(_act(e) for e in entries))
+
+
+def _scan_and_match(
+    file_managers: list[FileManager],
+) -> tuple[dict[Path, list[ScannedEntry]], list[list[ScannedEntry]]]:
+    """List each distinct dir once, then classify its entries for every manager.
+
+    Returns:
+        the entries per dir, and the matched entries per manager (parallel to `file_managers`)
+    """
+    scanned: dict[Path, list[ScannedEntry]] = {}
+    matched: list[list[ScannedEntry]] = []
+    for fm in file_managers:
+        if fm.dpath not in scanned:
+            scanned[fm.dpath] = scan_dir(fm.dpath)
+        matched.append([e for e in scanned[fm.dpath] if fm.matches(e)])
+        fm.dir_age_cache.retain({e.path for e in matched[-1] if e.is_dir})
+    LOGGER.debug(
+        f"scanned {sum(len(v) for v in scanned.values())} entries in {len(scanned)} dir(s)"
+    )
+    return scanned, matched
+
+
 async def run_once(
     ewms_rc: RestClient,
     file_managers: list[FileManager] | None = None,
+    guard: PathGuard | None = None,
 ) -> int:
     """
     Execute a single inspection pass over all file managers.
 
+    If given, `guard` holds the paths that this pass may act on, until it's
+    done w/ each -- so others (ex: watchers) can run during the pass.
+
     Returns:
         int: number of actions performed in this pass.
     """
@@ -283,34 +715,297 @@ async def run_once(
     LOGGER.info("inspecting filepaths...")
     n_actions = 0
 
-    for fm in file_managers:
-        LOGGER.debug(f"searching filepath pattern: {fm.fpattern}")
+    _, matched = _scan_and_match(file_managers)
+    is_pressure_high = DiskPressure().is_high()
+
+    # hold each path until the last manager that may act on it is done
+    last_manager: dict[Path, int] = {}
+    if guard:
+        for i, (fm, entries) in enumerate(zip(file_managers, matched)):
+            for e in entries:
+                # (under disk pressure, some act early -- regardless of age)
+                if (is_pressure_high and fm.may_act_early(e)) or fm.is_old_enough(e.path, e):
+                    last_manager[e.path] = i
+        guard.hold(last_manager)
+
+    # paths acted on this pass -- these are stale for the remaining managers
+    consumed: set[Path] = set()
+
+    try:
+        # one manager at a time, since managers may share a pattern -- ex: once a
+        #   JEL is compressed by one manager, the next must not see it.
+        #   (new files made by an action are picked up on the next pass)
+        for i, (fm, entries) in enumerate(zip(file_managers, matched)):
+            LOGGER.debug(f"filepath pattern: {fm.fpattern}")
+            results = await _act_on_entries(
+                fm, [e for e in entries if e.path not in consumed], consumed
+            )
+            n_actions += sum(results)
+            if guard and not is_pressure_high:
+                guard.release(p for p, last in last_manager.items() if last == i)
+
+        if is_pressure_high:
+            n_actions += await relieve_disk_pressure(file_managers)
+    finally:
+        if guard:
+            guard.release_all()
+
+    LOGGER.info(f"done inspecting filepaths -- performed {n_actions} actions")
+    return n_actions
+
+
+# -----------------------------------------------------------------------------
+# Disk pressure -- act early (ignoring age) when the filesystem is filling up
+# -----------------------------------------------------------------------------
+
+
+class DiskPressure:
+    """Usage of the filesystem holding the schedd's JEL dir."""
 
-        for p in glob.iglob(fm.fpattern):  # streaming
-            fpath = Path(p)
-            LOGGER.debug(f"looking at {fpath=}")
+    def __init__(self, dpath: Path | None = None) -> None:
+        self.dpath = dpath or JELFileLogic.parent
+
+    def get_usage(self) -> float:
+        """Get the fraction of the filesystem that's used (like 'df')."""
+        usage = shutil.disk_usage(self.dpath)
+        # 'free' excludes root-reserved blocks, so use used+free (not 'total')
+        return usage.used / (usage.used + usage.free)
+
+    def is_high(self) -> bool:
+        """Is the usage at/above the high watermark?"""
+        return self.get_usage() >= ENV.TMS_DISK_USAGE_HIGH_WATERMARK
+
+    def is_relieved(self) -> bool:
+        """Is the usage at/below the low watermark?"""
+        return self.get_usage() <= ENV.TMS_DISK_USAGE_LOW_WATERMARK
+
+
+async def relieve_disk_pressure(
+    file_managers: list[FileManager],
+    pressure: DiskPressure | None = None,
+) -> int:
+    """Act on paths oldest-first, ignoring age, until usage is at the low watermark.
+
+    Only managers with 'allow_early' take part, and their prechecks still
+    apply -- ex: a JEL with non-completed taskforces is never touched.
+
+    Returns:
+        int: number of actions performed
+    """
+    pressure = pressure or DiskPressure()
+    LOGGER.warning(
+        f"disk usage is high ({pressure.get_usage():.1%} >= "
+        f"{ENV.TMS_DISK_USAGE_HIGH_WATERMARK:.0%}) -- "
+        f"acting early until {ENV.TMS_DISK_USAGE_LOW_WATERMARK:.0%}"
+    )
+
+    _, matched = _scan_and_match(file_managers)
+    candidates: list[tuple[float, int, ScannedEntry]] = []  # (mtime, manager index, entry)
+    for i, (fm, all_entries) in enumerate(zip(file_managers, matched)):
+        if not (entries := [e for e in all_entries if fm.may_act_early(e)]):
+            continue
+        if fm.precheck_prefetch_async is not None:
             try:
-                n_actions += int(await fm.act(fpath))  # bool -> 1/0
+                await fm.precheck_prefetch_async([e.path for e in entries])
             except Exception:
-                LOGGER.exception(f"action failed for {fpath=}")
-                continue
-            else:
-                # let the TMS do other scheduled things
-                await asyncio.sleep(0)
+                LOGGER.exception(f"precheck prefetch failed for {fm.fpattern}")
+        candidates.extend((e.mtime, i, e) for e in entries)
+    candidates.sort(key=lambda c: (c[0], c[1]))
 
-    LOGGER.info(f"done inspecting filepaths -- performed {n_actions} actions")
+    n_actions = 0
+    consumed: set[Path] = set()
+    # one at a time -- re-check usage after each
+    for _, i, entry in candidates:
+        if pressure.is_relieved():
+            break
+        if entry.path in consumed:
+            continue
+        try:
+            acted = await file_managers[i].act(entry.path, entry, early=True)
+        except Exception:
+            LOGGER.exception(f"early action failed for {entry.path}")
+            acted = False
+        consumed.add(entry.path)
+        n_actions += acted
+
+    if pressure.is_relieved():
+        LOGGER.info(f"disk usage relieved ({pressure.get_usage():.1%}) -- {n_actions} actions")
+    else:
+        LOGGER.warning(
+            f"disk usage still high ({pressure.get_usage():.1%}) after {n_actions} "
+            f"early actions -- nothing else can be cleaned up yet"
+        )
     return n_actions
 
 
-async def run(ewms_rc: RestClient) -> None:
+# -----------------------------------------------------------------------------
+# Scheduler
+# -----------------------------------------------------------------------------
+
+
+class DueScheduler:
+    """Schedule each (path, manager) for when its action will be due.
+
+    A path's due time is its mtime + the manager's age threshold. For dirs,
+    that's the earliest it could be due (its contents may be newer), so the
+    full age check is still done then.
+
+    The schedule is rebuilt (w/ a fresh scan) when a scanned dir's mtime
+    changes (entries added/removed), and at least every
+    'TMS_FILE_MANAGER_INTERVAL' seconds (files written in place don't
+    change their dir's mtime).
+    """
+
+    def __init__(self, file_managers: list[FileManager]) -> None:
+        self.file_managers = file_managers
+
+        # (due time, tiebreaker, manager index, path)
+        self._heap: list[tuple[float, int, int, Path]] = []
+        self._seq = itertools.count()
+
+        self._dir_mtimes: dict[Path, int | None] = {}
+        self._built_at = float("-inf")
+
+        # paths acted on since the last rebuild
+        self.consumed: set[Path] = set()
+        # (manager index, path) -> not before -- survives rebuilds (ex: precheck said no)
+        self._deferred: dict[tuple[int, Path], float] = {}
+
+    @staticmethod
+    def _get_dir_mtime(dpath: Path) -> int | None:
+        try:
+            return dpath.stat().st_mtime_ns
+        except FileNotFoundError:
+            return None
+
+    def needs_rebuild(self) -> bool:
+        """Has a dir changed, or has it been too long since the last rebuild?"""
+        if time.time() - self._built_at >= ENV.TMS_FILE_MANAGER_INTERVAL:
+            return True
+        return any(
+            self._get_dir_mtime(d) != mtime for d, mtime in self._dir_mtimes.items()
+        )
+
+    def rebuild(self) -> None:
+        """Rescan the dirs and reschedule everything."""
+        now = time.time()
+        # get dir mtimes *before* the scan, so a change mid-scan triggers another
+        self._dir_mtimes = {
+            fm.dpath: self._get_dir_mtime(fm.dpath) for fm in self.file_managers
+        }
+        _, matched = _scan_and_match(self.file_managers)
+
+        self._heap = []
+        self.consumed = set()
+        deferred = {}
+        for i, (fm, entries) in enumerate(zip(self.file_managers, matched)):
+            for e in entries:
+                due = e.mtime + fm.age_threshold
+                if (not_before := self._deferred.get((i, e.path))) and not_before > now:
+                    due = max(due, not_before)
+                    deferred[(i, e.path)] = not_before
+                self._heap.append((due, next(self._seq), i, e.path))
+        heapq.heapify(self._heap)
+        self._deferred = deferred  # (drop those for paths that are gone)
+
+        self._built_at = now
+        LOGGER.info(f"scheduled {len(self._heap)} filepath(s)")
+        if self._heap:
+            LOGGER.debug(f"next due at {self._heap[0][0]} ({self._heap[0][3]})")
+
+    def schedule(self, due: float, i: int, path: Path) -> None:
+        """Schedule the path for the manager (index)."""
+        heapq.heappush(self._heap, (due, next(self._seq), i, path))
+
+    def defer(self, i: int, entry: ScannedEntry) -> None:
+        """Reschedule the entry, which was due but not acted on."""
+        fm = self.file_managers[i]
+        due = entry.mtime + fm.age_threshold
+        if due <= time.time():
+            # old enough, but not acted on (ex: precheck said no, dir has new
+            #   contents, or the action failed) -- look again later
+            due = time.time() + ENV.TMS_FILE_MANAGER_INTERVAL
+            self._deferred[(i, entry.path)] = due
+        self.schedule(due, i, entry.path)
+
+    def next_due(self) -> float | None:
+        """Get the time the next entry is due, if any."""
+        return self._heap[0][0] if self._heap else None
+
+    def pop_due(self) -> dict[int, list[Path]]:
+        """Pop all entries due now, grouped by manager index."""
+        now = time.time()
+        due: dict[int, list[Path]] = {}
+        while self._heap and self._heap[0][0] <= now:
+            _, _, i, path = heapq.heappop(self._heap)
+            if path not in self.consumed:
+                due.setdefault(i, []).append(path)
+        return due
+
+
+async def run_due(scheduler: DueScheduler) -> int:
+    """Act on the entries that are due.
+
+    Returns:
+        int: number of actions performed.
+    """
+    n_actions = 0
+
+    # one manager at a time, in order -- like 'run_once()'
+    for i, paths in sorted(scheduler.pop_due().items()):
+        fm = scheduler.file_managers[i]
+        entries = [
+            e
+            for p in dict.fromkeys(paths)  # (dedup, keep order)
+            if p not in scheduler.consumed and (e := ScannedEntry.from_path(p))
+        ]
+        LOGGER.debug(f"{len(entries)} due for {fm.fpattern}")
+
+        results = await _act_on_entries(fm, entries, scheduler.consumed)
+        n_actions += sum(results)
+        for e, acted in zip(entries, results):
+            if not acted:  # (incl. failed -- held back until its deferral passes)
+                scheduler.defer(i, e)
+
+    if n_actions:
+        LOGGER.info(f"performed {n_actions} due actions")
+    return n_actions
+
+
+async def run(ewms_rc: RestClient, startup_guard: PathGuard | None = None) -> None:
     """Run the file manager loop.
 
-    NOTE - waits 'TMS_FILE_MANAGER_INTERVAL' seconds at top
+    Instead of re-inspecting every path periodically, each path is acted on
+    when it's due (see `DueScheduler`). Dirs are checked for changes (and
+    disk usage for pressure) every 'TMS_OUTER_LOOP_WAIT' seconds, at most.
+
+    If given a `startup_guard`, a full pass is done first (see `run_once()`).
     """
     LOGGER.info("Activated.")
     file_managers = build_file_managers(ewms_rc)
 
+    if startup_guard:
+        await run_once(ewms_rc, file_managers, startup_guard)
+        startup.milestone(task_name("startup file-manager pass done", SCHEDD.get()))
+    scheduler = DueScheduler(file_managers)
+    pressure = DiskPressure()
+    relieve_not_before = 0.0
+
     while True:
-        LOGGER.info(f"next round in {ENV.TMS_FILE_MANAGER_INTERVAL}s")
-        await asyncio.sleep(ENV.TMS_FILE_MANAGER_INTERVAL)  # O(hours)
-        await run_once(ewms_rc, file_managers)
+        if scheduler.needs_rebuild():
+            scheduler.rebuild()
+
+        await run_due(scheduler)
+
+        if time.time() >= relieve_not_before and pressure.is_high():
+            await relieve_disk_pressure(file_managers, pressure)
+            if not pressure.is_relieved():
+                # don't re-query/rescan everything every loop, nothing may have changed
+                relieve_not_before = time.time() + ENV.TMS_DISK_PRESSURE_RETRY_WAIT
+
+        # sleep until the next entry is due (or it's time to look for changes)
+        wait = float(ENV.TMS_OUTER_LOOP_WAIT)
+        if (next_due := scheduler.next_due()) is not None:
+            wait = max(0.0, min(wait, next_due - time.time()))
+        LOGGER.debug(f"file manager sleeping {wait:.1f}s")
+        await asyncio.sleep(wait)
@@ -0,0 +1,138 @@
+"""Pace file-manager disk i/o, so archival doesn't starve the schedd's own i/o."""
+
+import ctypes
+import logging
+import os
+import platform
+import threading
+import time
+from functools import cache
+from pathlib import Path
+from typing import BinaryIO
+
+from ..config import ENV, abbrev_dunder_name
+
+LOGGER = logging.getLogger(abbrev_dunder_name(__name__))
+
+# removing an entry is mostly metadata (journal) i/o, regardless of the file's size
+RM_COST_PER_ENTRY = 64 * 1024  # bytes
+
+
+class TokenBucket:
+    """A thread-safe token bucket, refilled at `rate` bytes/sec.
+
+    A caller may take more than is available -- the bucket goes into debt,
+    and the caller sleeps until it's paid off. So, concurrent callers
+    share the rate.
+    """
+
+    def __init__(self, rate: int, burst: int | None = None) -> None:
+        self.rate = rate
+        self.burst = burst if burst is not None else rate  # 1 sec's worth
+        self._tokens = float(self.burst)
+        self._last = time.monotonic()
+        self._lock = threading.Lock()
+
+    def consume(self, n: int) -> None:
+        """Take `n` tokens, sleeping if the bucket is (or goes) into debt."""
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(
+                float(self.burst), self._tokens + (now - self._last) * self.rate
+            )
+            self._last = now
+            self._tokens -= n
+            wait = -self._tokens / self.rate if self._tokens < 0 else 0.0
+        if wait:
+            time.sleep(wait)
+
+
+@cache
+def get_bucket() -> TokenBucket | None:
+    """Get the bucket shared by all file-manager actions, or None if unlimited."""
+    if not ENV.TMS_FILE_MANAGER_IO_BYTES_PER_SEC:
+        return None
+    return TokenBucket(ENV.TMS_FILE_MANAGER_IO_BYTES_PER_SEC)
+
+
+class PacedWriter:
+    """Wrap a binary stream, pacing (and counting) the bytes written to it."""
+
+    def __init__(self, stream: BinaryIO) -> None:
+        self._stream = stream
+        self._bucket = get_bucket()
+        self.n_bytes = 0
+
+    def write(self, data: bytes) -> int:
+        if self._bucket:
+            self._bucket.consume(len(data))
+        self.n_bytes += len(data)
+        return self._stream.write(data)
+
+    def flush(self) -> None:
+        self._stream.flush()
+
+
+def paced_rmtree(dpath: Path) -> int:
+    """rm -r the dir, pacing each removal.
+
+    Returns:
+        int: number of entries removed
+    """
+    bucket = get_bucket()
+    n_entries = 0
+
+    def _rm(func, path):  # type: ignore[no-untyped-def]
+        nonlocal n_entries
+        if bucket:
+            bucket.consume(RM_COST_PER_ENTRY)
+        try:
+            func(path)
+        except FileNotFoundError:
+            return
+        n_entries += 1
+
+    for root, dirs, files in os.walk(dpath, topdown=False):
+        for name in files:
+            _rm(os.remove, os.path.join(root, name))
+        for name in dirs:
+            fpath = os.path.join(root, name)
+            # (os.walk doesn't follow symlinked dirs, so rm the link itself)
+            _rm(os.remove if os.path.islink(fpath) else os.rmdir, fpath)
+    _rm(os.rmdir, dpath)
+
+    return n_entries
+
+
+# -----------------------------------------------------------------------------
+# idle i/o priority (linux only)
+# -----------------------------------------------------------------------------
+
+_SYS_IOPRIO_SET = {"x86_64": 251, "aarch64": 30}
+_IOPRIO_WHO_PROCESS = 1  # w/ a thread id -> just that thread
+_IOPRIO_CLASS_IDLE = 3
+_IOPRIO_CLASS_SHIFT = 13
+
+
+def set_idle_io_priority() -> None:
+    """Put the calling thread in the 'idle' i/o scheduling class (best effort).
+
+    The thread then only gets disk time when no one else needs it.
+    """
+    if not (nr := _SYS_IOPRIO_SET.get(platform.machine())):
+        LOGGER.warning(f"idle i/o priority not supported on {platform.machine()}")
+        return
+
+    libc = ctypes.CDLL(None, use_errno=True)
+    ret = libc.syscall(
+        nr,
+        _IOPRIO_WHO_PROCESS,
+        threading.get_native_id(),
+        _IOPRIO_CLASS_IDLE << _IOPRIO_CLASS_SHIFT,
+    )
+    if ret != 0:
+        LOGGER.warning(
+            f"could not set idle i/o priority: {os.strerror(ctypes.get_errno())}"
+        )
+    else:
+        LOGGER.debug(f"set idle i/o priority for thread {threading.get_native_id()}")
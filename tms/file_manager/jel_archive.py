@@ -0,0 +1,246 @@
+"""Seekable, indexed JEL archives.
+
+A JEL is archived as independently compressed frames (each holding whole
+events), plus a sidecar index ("<archive>.idx.json") mapping each frame's
+byte range to the cluster ids and time range of its events. So, looking up
+one cluster (or time window) only decompresses the frames that have it.
+
+The concatenated frames are a valid stream for the codec -- the archive can
+still be read whole with gunzip, zstd, etc.
+
+Usage:
+    python -m tms.file_manager.jel_archive ARCHIVE [--cluster ID] [--since T] [--until T]
+"""
+
+import argparse
+import dataclasses as dc
+import json
+import logging
+import os
+import re
+import sys
+from collections import deque
+from concurrent.futures import Future
+from pathlib import Path
+from typing import Iterator
+
+from .codecs import Codec, get_compress_pool, get_codec
+from .io_throttle import get_bucket
+from ..config import abbrev_dunder_name
+
+LOGGER = logging.getLogger(abbrev_dunder_name(__name__))
+
+INDEX_SUFFIX = ".idx.json"
+INDEX_VERSION = 1
+
+FRAME_SIZE = 1024 * 1024  # uncompressed bytes, rounded up to the next event boundary
+
+EVENT_END = b"...\n"
+# ex: "005 (104501503.000.000) 2024-01-05 11:57:11 Job terminated."
+#   (or w/ ISO 8601 dates: "... 2024-01-05T11:57:11 ...")
+_HEADER_RE = re.compile(rb"^\d{3} \((\d+)\.\d+\.\d+\) (\d{4}-\d{2}-\d{2})[ T](\d{2}:\d{2}:\d{2})")
+
+
+def index_path(archive: Path) -> Path:
+    """Get the sidecar index's path for the archive."""
+    return archive.with_name(archive.name + INDEX_SUFFIX)
+
+
+def _parse_header(event: bytes) -> tuple[int, str] | tuple[None, None]:
+    """Get the event's cluster id and timestamp ("YYYY-MM-DD HH:MM:SS")."""
+    if m := _HEADER_RE.match(event):
+        return int(m.group(1)), f"{m.group(2).decode()} {m.group(3).decode()}"
+    return None, None
+
+
+def _iter_events(stream: Iterator[bytes]) -> Iterator[bytes]:
+    """Group the lines into events (each ends with its '...' line)."""
+    event: list[bytes] = []
+    for line in stream:
+        event.append(line)
+        if line == EVENT_END:
+            yield b"".join(event)
+            event = []
+    if event:  # incomplete last event (ex: the schedd was mid-write)
+        yield b"".join(event)
+
+
+@dc.dataclass
+class Frame:
+    """An independently compressed chunk of the archive."""
+
+    offset: int = 0  # in the archive (compressed)
+    length: int = 0  # compressed
+    raw_length: int = 0
+    clusters: set[int] = dc.field(default_factory=set)
+    t_min: str | None = None
+    t_max: str | None = None
+
+    def add(self, event: bytes) -> None:
+        self.raw_length += len(event)
+        cluster_id, ts = _parse_header(event)
+        if cluster_id is not None:
+            self.clusters.add(cluster_id)
+        if ts is not None:
+            self.t_min = min(self.t_min or ts, ts)
+            self.t_max = max(self.t_max or ts, ts)
+
+    def to_json(self) -> dict:
+        return {**dc.asdict(self), "clusters": sorted(self.clusters)}
+
+    @staticmethod
+    def from_json(dicto: dict) -> "Frame":
+        return Frame(**{**dicto, "clusters": set(dicto["clusters"])})
+
+    def may_have(
+        self,
+        cluster_id: int | None = None,
+        since: str | None = None,
+        until: str | None = None,
+    ) -> bool:
+        """Could this frame have events matching all the criteria?"""
+        if cluster_id is not None and cluster_id not in self.clusters:
+            return False
+        if self.t_min is None:  # no parsable timestamps -- can't rule out
+            return True
+        if since is not None and self.t_max and self.t_max < since:
+            return False
+        if until is not None and self.t_min[: len(until)] > until:
+            return False
+        return True
+
+
+# -----------------------------------------------------------------------------
+# writing
+# -----------------------------------------------------------------------------
+
+
+def write(src: Path, dest: Path, codec: Codec) -> tuple[list[Frame], int]:
+    """Write the JEL as an archive of independently compressed frames.
+
+    With multiple codec threads, frames are compressed in parallel.
+
+    Returns:
+        the frames (for the index), and the total uncompressed bytes
+    """
+    bucket = get_bucket()
+    pool = get_compress_pool(codec.threads) if codec.threads > 1 else None
+    pending: deque[tuple[Frame, Future[bytes]]] = deque()
+    frames: list[Frame] = []
+
+    with open(src, "rb") as f_in, open(dest, "wb") as f_out:
+
+        def _write(frame: Frame, data: bytes) -> None:
+            frame.offset, frame.length = f_out.tell(), len(data)
+            f_out.write(data)
+            frames.append(frame)
+
+        def _submit(frame: Frame, raw: bytes) -> None:
+            if bucket:
+                bucket.consume(len(raw))
+            if not pool:
+                _write(frame, codec.compress_frame(raw))
+                return
+            pending.append((frame, pool.submit(codec.compress_frame, raw)))
+            while len(pending) > 2 * codec.threads:  # bounds memory
+                _write(pending[0][0], pending.popleft()[1].result())  # in order
+
+        frame, chunks = Frame(), []
+        for event in _iter_events(f_in):
+            frame.add(event)
+            chunks.append(event)
+            if frame.raw_length >= FRAME_SIZE:
+                _submit(frame, b"".join(chunks))
+                frame, chunks = Frame(), []
+        if chunks or not (frames or pending):  # (empty input -> one empty frame)
+            _submit(frame, b"".join(chunks))
+
+        while pending:
+            _write(pending[0][0], pending.popleft()[1].result())
+
+    return frames, sum(fr.raw_length for fr in frames)
+
+
+def write_index(archive: Path, frames: list[Frame], codec: Codec) -> None:
+    """Write the sidecar index for the archive (atomically)."""
+    final = index_path(archive)
+    tmp = final.with_name(f".{final.name}.tmp")
+    try:
+        with open(tmp, "w") as f:
+            json.dump(
+                {
+                    "version": INDEX_VERSION,
+                    "codec": codec.name,
+                    "frames": [fr.to_json() for fr in frames],
+                },
+                f,
+            )
+        os.replace(tmp, final)
+    finally:
+        tmp.unlink(missing_ok=True)
+
+
+# -----------------------------------------------------------------------------
+# reading
+# -----------------------------------------------------------------------------
+
+
+def read_index(archive: Path) -> tuple[Codec, list[Frame]]:
+    """Read the archive's sidecar index."""
+    with open(index_path(archive)) as f:
+        index = json.load(f)
+    if index["version"] != INDEX_VERSION:
+        raise ValueError(f"unsupported index version: {index['version']}")
+    return get_codec(index["codec"], threads=1), [Frame.from_json(d) for d in index["frames"]]
+
+
+def read_events(
+    archive: Path,
+    cluster_id: int | None = None,
+    since: str | None = None,
+    until: str | None = None,
+) -> Iterator[str]:
+    """Get the events matching all the criteria, only decompressing the frames needed.
+
+    `since` and `until` are inclusive, formatted like "YYYY-MM-DD[ HH:MM:SS]".
+    """
+    codec, frames = read_index(archive)
+    selected = [fr for fr in frames if fr.may_have(cluster_id, since, until)]
+    LOGGER.debug(f"reading {len(selected)}/{len(frames)} frames of {archive}")
+
+    with open(archive, "rb") as f:
+        for frame in selected:
+            f.seek(frame.offset)
+            raw = codec.decompress_frame(f.read(frame.length))
+            for event in _iter_events(iter(raw.splitlines(keepends=True))):
+                event_cluster_id, ts = _parse_header(event)
+                if cluster_id is not None and event_cluster_id != cluster_id:
+                    continue
+                if ts is not None:
+                    if since is not None and ts < since:
+                        continue
+                    if until is not None and ts[: len(until)] > until:
+                        continue
+                yield event.decode(errors="replace")
+
+
+def main() -> None:
+    """Print the matching events of an indexed JEL archive."""
+    parser = argparse.ArgumentParser(
+        description="Print events from an indexed JEL archive (only decompressing what's needed)",
+    )
+    parser.add_argument("archive", type=Path, help="ex: 2025-08-26.tms.jel.gz")
+    parser.add_argument("--cluster", type=int, default=None, help="only this cluster id")
+    parser.add_argument("--since", default=None, help="ex: '2025-08-26 13:00:00'")
+    parser.add_argument("--until", default=None, help="ex: '2025-08-26 14:00:00'")
+    args = parser.parse_args()
+
+    if not index_path(args.archive).exists():
+        sys.exit(f"no index for {args.archive} (expected {index_path(args.archive)})")
+
+    for event in read_events(args.archive, args.cluster, args.since, args.until):
+        sys.stdout.write(event)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,137 @@
+"""Monitor the asyncio event loop's lag, and attribute stalls to code paths.
+
+Every subsystem (scalar, watchers, file manager) shares one event loop, so
+one blocking call (htcondor iteration, a schedd submit, gzip, ...) delays
+all the others. A ticker task measures the loop's scheduling delay, and a
+watchdog thread -- which keeps running while the loop is blocked -- grabs
+the loop thread's stack once a stall passes the threshold, then attributes
+it to a TMS subsystem.
+"""
+
+import asyncio
+import dataclasses as dc
+import logging
+import sys
+import threading
+import time
+import traceback
+from collections import deque
+from types import FrameType
+
+from . import metrics
+from .config import ENV
+
+LOGGER = logging.getLogger(__name__)
+
+STACK_DEPTH = 25  # innermost frames kept for a stall
+
+# module prefix -> subsystem name (first match wins)
+_SUBSYSTEM_MODULES = [
+    ("tms.scalar", "scalar"),
+    ("tms.watcher", "watcher"),
+    ("tms.file_manager", "file_manager"),
+]
+
+
+@dc.dataclass
+class Stall:
+    """A stall of the event loop, as seen by the watchdog."""
+
+    subsystem: str
+    task_name: str | None
+    blocked: float  # seconds, when the stack was captured
+    stack: list[str]
+
+
+def get_subsystem(frame: FrameType | None, task_name: str | None) -> str:
+    """Get the TMS subsystem responsible for the (blocking) frame.
+
+    The innermost TMS module on the stack decides. Otherwise, (ex: the
+    code is third-party & called via a helper task), fall back to the
+    running task's name (ex: 'watcher:foo.tms.jel' -> 'watcher').
+    """
+    while frame:
+        module = frame.f_globals.get("__name__", "")
+        for prefix, subsystem in _SUBSYSTEM_MODULES:
+            if module == prefix or module.startswith(prefix + "."):
+                return subsystem
+        frame = frame.f_back
+    if task_name:
+        return task_name.split(":", maxsplit=1)[0]
+    return "unknown"
+
+
+class LoopMonitor:
+    """Measure the event loop's lag, and catch whoever blocks it."""
+
+    def __init__(self, interval: float, threshold: float) -> None:
+        self.interval = interval
+        self.threshold = threshold
+        self.recent_stalls: deque[Stall] = deque(maxlen=10)
+
+        self._loop: asyncio.AbstractEventLoop | None = None
+        self._loop_thread_id: int | None = None
+        self._due = time.monotonic()  # when the ticker should next wake up
+        self._reported_due: float | None = None  # so, one report per stall
+        self._stop = threading.Event()
+
+    async def run(self) -> None:
+        """Tick forever, recording the loop's lag (and watch it from a thread)."""
+        self._loop = asyncio.get_running_loop()
+        self._loop_thread_id = threading.get_ident()
+        watchdog = threading.Thread(
+            target=self._watchdog, name="tms-loop-watchdog", daemon=True
+        )
+        watchdog.start()
+
+        try:
+            while True:
+                self._due = time.monotonic() + self.interval
+                await asyncio.sleep(self.interval)
+                lag = max(0.0, time.monotonic() - self._due)
+                metrics.LOOP_LAG.observe(lag)
+                if lag >= self.threshold:
+                    LOGGER.warning(f"event loop was blocked for {lag:.2f}s")
+        finally:
+            self._stop.set()
+
+    def _watchdog(self) -> None:
+        """Check the ticker (from another thread) -- capture the stack if it's late."""
+        while not self._stop.wait(min(self.interval, self.threshold / 2)):
+            due = self._due
+            blocked = time.monotonic() - due
+            if blocked >= self.threshold and self._reported_due != due:
+                self._reported_due = due
+                self._record(self.capture(blocked))
+
+    def capture(self, blocked: float) -> Stall:
+        """Capture what the loop's thread is running right now."""
+        frame = sys._current_frames().get(self._loop_thread_id)  # type: ignore[arg-type]
+        task = asyncio.current_task(self._loop) if self._loop else None
+        task_name = task.get_name() if task else None
+        return Stall(
+            subsystem=get_subsystem(frame, task_name),
+            task_name=task_name,
+            blocked=blocked,
+            stack=traceback.format_stack(frame)[-STACK_DEPTH:] if frame else [],
+        )
+
+    def _record(self, stall: Stall) -> None:
+        self.recent_stalls.append(stall)
+        metrics.LOOP_STALLS.labels(stall.subsystem).inc()
+        LOGGER.warning(
+            f"event loop blocked for {stall.blocked:.2f}s+ by {stall.subsystem} "
+            f"(task={stall.task_name}) at:\n{''.join(stall.stack)}"
+        )
+
+
+async def run() -> None:
+    """Monitor the running event loop, if configured."""
+    if not ENV.TMS_LOOP_STALL_THRESHOLD:
+        LOGGER.info("event-loop monitor is disabled ('TMS_LOOP_STALL_THRESHOLD' is 0)")
+        return
+    LOGGER.info("Activated.")
+    await LoopMonitor(
+        ENV.TMS_LOOP_MONITOR_INTERVAL,
+        ENV.TMS_LOOP_STALL_THRESHOLD,
+    ).run()
@@ -0,0 +1,209 @@
+"""Prometheus metrics for TMS's hot paths.
+
+Served at 'http://<host>:TMS_METRICS_PORT/metrics' (0 -> not served). Metrics
+are in-memory counters/histograms updated in-line, so they're cheap to
+always keep on. Label cardinality is kept low: per JEL (O(1) per day),
+per EWMS endpoint (uuids are normalized away), and per action name.
+
+W/ 'TMS_MULTIPROCESS', each worker process writes its metrics to the
+shared 'PROMETHEUS_MULTIPROC_DIR', and the supervisor serves them all
+(gauges are summed or maxed across live workers, per their
+'multiprocess_mode').
+"""
+
+import logging
+import re
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Callable, Iterator
+
+import prometheus_client
+from prometheus_client import multiprocess
+
+from .config import ENV
+
+LOGGER = logging.getLogger(__name__)
+
+# buckets for durations from 'fast network call' to 'gzip a huge JEL'
+_DURATION_BUCKETS = (
+    0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 300, 1800, 3600
+)
+
+# -----------------------------------------------------------------------------
+# watcher
+# -----------------------------------------------------------------------------
+
+JEL_EVENTS = prometheus_client.Counter(
+    "tms_jel_events",
+    "Job events read from the JEL (rate() for events/sec)",
+    ["jel"],
+)
+JEL_READ_LAG = prometheus_client.Gauge(
+    "tms_jel_read_lag_seconds",
+    "Wall clock minus the timestamp of the newest event read from the JEL",
+    ["jel"],
+    multiprocess_mode="livemax",
+)
+SNAPSHOT_DURATION = prometheus_client.Histogram(
+    "tms_watcher_snapshot_seconds",
+    "Time to snapshot the JEL's clusters for an EWMS update",
+    ["jel"],
+    buckets=_DURATION_BUCKETS,
+)
+TRACKED_CLUSTERS = prometheus_client.Gauge(
+    "tms_tracked_clusters",
+    "Condor clusters tracked by the JEL's watcher",
+    ["jel"],
+    multiprocess_mode="livesum",
+)
+TRACKED_PROCS = prometheus_client.Gauge(
+    "tms_tracked_procs",
+    "Condor procs (jobs) tracked by the JEL's watcher",
+    ["jel"],
+    multiprocess_mode="livesum",
+)
+
+# -----------------------------------------------------------------------------
+# ewms
+# -----------------------------------------------------------------------------
+
+EWMS_REQUEST_DURATION = prometheus_client.Histogram(
+    "tms_ewms_request_seconds",
+    "EWMS request latency (including rest-tools' retries)",
+    ["method", "endpoint", "outcome"],  # outcome: ok, error, shed
+    buckets=_DURATION_BUCKETS,
+)
+EWMS_RETRIES = prometheus_client.Counter(
+    "tms_ewms_retries",
+    "EWMS request retries (drawn from the retry budget)",
+    ["endpoint"],
+)
+EWMS_IN_FLIGHT = prometheus_client.Gauge(
+    "tms_ewms_in_flight_requests",
+    "EWMS requests in flight, by the subsystem making them",
+    ["subsystem"],
+    multiprocess_mode="livesum",
+)
+EWMS_BREAKER_STATE = prometheus_client.Gauge(
+    "tms_ewms_circuit_breaker_state",
+    "EWMS circuit breaker: 0=closed, 1=half-open, 2=open",
+    multiprocess_mode="livemax",  # (each worker has its own breaker -- report the worst)
+)
+TASKFORCE_CACHE_LOOKUPS = prometheus_client.Counter(
+    "tms_taskforce_cache_lookups",
+    "Taskforce cache lookups (a hit saves an EWMS request)",
+    ["kind", "result"],  # kind: uuid, phase, jel_usage -- result: hit, miss
+)
+
+# -----------------------------------------------------------------------------
+# schedd
+# -----------------------------------------------------------------------------
+
+SCHEDD_SUBMIT_DURATION = prometheus_client.Histogram(
+    "tms_schedd_submit_seconds",
+    "Duration of schedd submits (one per taskforce)",
+    buckets=_DURATION_BUCKETS,
+)
+SCHEDD_ACT_DURATION = prometheus_client.Histogram(
+    "tms_schedd_act_seconds",
+    "Duration of schedd acts (ex: condor_rm)",
+    ["action"],
+    buckets=_DURATION_BUCKETS,
+)
+
+# -----------------------------------------------------------------------------
+# file manager
+# -----------------------------------------------------------------------------
+
+FILE_MANAGER_ACTION_DURATION = prometheus_client.Histogram(
+    "tms_file_manager_action_seconds",
+    "Duration of file-manager actions",
+    ["action"],
+    buckets=_DURATION_BUCKETS,
+)
+FILE_MANAGER_ACTION_BYTES = prometheus_client.Counter(
+    "tms_file_manager_action_bytes",
+    "Bytes processed by file-manager actions",
+    ["action"],
+)
+
+# -----------------------------------------------------------------------------
+# event loop
+# -----------------------------------------------------------------------------
+
+LOOP_LAG = prometheus_client.Histogram(
+    "tms_event_loop_lag_seconds",
+    "Event-loop scheduling delay (how late a timer fires)",
+    buckets=_DURATION_BUCKETS,
+)
+LOOP_STALLS = prometheus_client.Counter(
+    "tms_event_loop_stalls",
+    "Event-loop stalls over the threshold, by the subsystem blocking it",
+    ["subsystem"],
+)
+
+
+# -----------------------------------------------------------------------------
+# helpers
+# -----------------------------------------------------------------------------
+
+
+@contextmanager
+def timed(histogram: Any) -> Iterator[None]:
+    """Observe the duration of the block, even if it raises."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        histogram.observe(time.perf_counter() - start)
+
+
+_UUID_SEGMENT_RE = re.compile(r"/taskforces/[^/]+")
+
+
+def normalize_endpoint(path: str) -> str:
+    """Make the path into a low-cardinality label.
+
+    ex: '/v1/tms/condor-submit/taskforces/TF-1234/failed'
+         -> '/v1/tms/condor-submit/taskforces/{uuid}/failed'
+    """
+    return _UUID_SEGMENT_RE.sub("/taskforces/{uuid}", path)
+
+
+def get_action_name(action: Callable[..., Any]) -> str:
+    """Get the name of the action (w/o functools.partial's args), for a label."""
+    return getattr(getattr(action, "func", action), "__name__", "unknown")
+
+
+def forget_jel(jel: str) -> None:
+    """Remove the JEL's labeled metrics (ex: its watcher is done)."""
+    for metric in [JEL_EVENTS, JEL_READ_LAG, SNAPSHOT_DURATION, TRACKED_CLUSTERS, TRACKED_PROCS]:
+        try:
+            metric.remove(jel)
+        except KeyError:
+            pass
+
+
+def start_server(multiprocess_dir: Path | None = None) -> None:
+    """Serve the metrics (in a daemon thread), if configured.
+
+    If 'multiprocess_dir' is given, serve the metrics written there by
+    the worker processes, instead of this process's.
+    """
+    if not ENV.TMS_METRICS_PORT:
+        LOGGER.info("metrics endpoint is disabled ('TMS_METRICS_PORT' is 0)")
+        return
+    registry = prometheus_client.REGISTRY
+    if multiprocess_dir:
+        registry = prometheus_client.CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry, path=str(multiprocess_dir))
+    prometheus_client.start_http_server(
+        ENV.TMS_METRICS_PORT, addr=ENV.TMS_METRICS_ADDR, registry=registry
+    )
+    LOGGER.info(f"serving metrics at http://{ENV.TMS_METRICS_ADDR}:{ENV.TMS_METRICS_PORT}/metrics")
+
+
+def mark_process_dead(pid: int, multiprocess_dir: Path) -> None:
+    """Drop the (exited) worker's live gauges from the served metrics."""
+    multiprocess.mark_process_dead(pid, path=str(multiprocess_dir))
@@ -0,0 +1,184 @@
+"""On-demand profiling of the running TMS (no restart, so no lost watcher state).
+
+Trigger a profile by either:
+    kill -USR2 <pid>
+    echo [SECONDS] > $TMS_PROFILE_DIR/trigger
+
+For the duration, a sampling thread records every thread's stack, and
+cProfile traces the event loop's thread. Then, two files are written to
+TMS_PROFILE_DIR:
+    tms-profile-<timestamp>-<pid>.collapsed  -- collapsed stacks ('flamegraph.pl', speedscope, etc.)
+    tms-profile-<timestamp>-<pid>.pstats     -- 'python -m pstats FILE', snakeviz, etc.
+
+When not profiling, nothing is hooked -- the only cost is a periodic stat()
+of the trigger file.
+
+TMS_PROFILE_DIR is made private (0700); the trigger file is ignored if the
+dir is not owned by the TMS's user or is writable by others -- so, no other
+local user can start a profile.
+"""
+
+import asyncio
+import cProfile
+import logging
+import os
+import signal
+import stat
+import sys
+import threading
+import time
+from collections import Counter
+from datetime import datetime, timezone
+from pathlib import Path
+from types import FrameType
+
+from .config import ENV
+
+LOGGER = logging.getLogger(__name__)
+
+TRIGGER_FILENAME = "trigger"
+TRIGGER_POLL_WAIT = 5  # seconds
+
+
+def _collapse(frame: FrameType | None, thread_name: str) -> str:
+    """Get the stack as a collapsed line (root first), ex: 'main;foo (a.py:1);bar (b.py:2)'."""
+    names = []
+    while frame:
+        code = frame.f_code
+        names.append(f"{code.co_name} ({Path(code.co_filename).name}:{frame.f_lineno})")
+        frame = frame.f_back
+    return ";".join([thread_name] + names[::-1])
+
+
+class Profiler:
+    """Profile the process for a while -- one profile at a time."""
+
+    def __init__(self, outdir: Path, duration: float, sample_interval: float) -> None:
+        self.outdir = outdir
+        self.duration = duration
+        self.sample_interval = sample_interval
+        self.is_running = False
+
+    def start(self, duration: float | None = None) -> bool:
+        """Start a profile, from the event loop's thread.
+
+        Returns False if one is already running.
+        """
+        if self.is_running:
+            LOGGER.warning("a profile is already running -- ignoring trigger")
+            return False
+        self.is_running = True
+        duration = duration or self.duration
+
+        make_private_dir(self.outdir)
+        stem = datetime.now(timezone.utc).strftime("tms-profile-%Y%m%dT%H%M%SZ") + f"-{os.getpid()}"
+        LOGGER.info(f"profiling for {duration}s -> {self.outdir / stem}.*")
+
+        # sample all threads (incl. file-manager actions, compression, etc.)
+        sampler = threading.Thread(
+            target=self._sample,
+            args=(duration, self.outdir / f"{stem}.collapsed"),
+            name="tms-profiler",
+            daemon=True,
+        )
+        sampler.start()
+
+        # trace the event loop's thread
+        cprof = cProfile.Profile()
+        cprof.enable()
+        asyncio.get_running_loop().call_later(
+            duration, self._finish, cprof, sampler, self.outdir / f"{stem}.pstats"
+        )
+        return True
+
+    def _sample(self, duration: float, fpath: Path) -> None:
+        """Sample every other thread's stack until the duration's up."""
+        stacks: Counter[str] = Counter()
+        names: dict[int | None, str] = {}
+        me = threading.get_ident()
+        end = time.monotonic() + duration
+        while time.monotonic() < end:
+            for ident, frame in sys._current_frames().items():
+                if ident == me:
+                    continue
+                if ident not in names:
+                    names = {t.ident: t.name for t in threading.enumerate()}
+                stacks[_collapse(frame, names.get(ident, str(ident)))] += 1
+            time.sleep(self.sample_interval)
+
+        with open(fpath, "w") as f:
+            for stack, count in stacks.most_common():
+                f.write(f"{stack} {count}\n")
+        LOGGER.info(f"wrote {sum(stacks.values())} samples to {fpath}")
+
+    def _finish(self, cprof: cProfile.Profile, sampler: threading.Thread, fpath: Path) -> None:
+        cprof.disable()
+        cprof.dump_stats(fpath)
+        LOGGER.info(f"wrote cProfile stats to {fpath}")
+        # it's done sampling by now (or very soon), but it still writes its file
+        #   -- so, don't block the event loop on it
+        asyncio.get_running_loop().run_in_executor(None, sampler.join).add_done_callback(
+            self._done
+        )
+
+    def _done(self, _: asyncio.Future[None]) -> None:
+        self.is_running = False
+
+
+def make_private_dir(dpath: Path) -> None:
+    """Make the dir (if needed), accessible only by this user."""
+    dpath.parent.mkdir(parents=True, exist_ok=True)
+    dpath.mkdir(mode=0o700, exist_ok=True)
+
+
+def is_private_dir(dpath: Path) -> bool:
+    """Is the dir owned by this user, and not writable by anyone else?"""
+    st = dpath.stat()
+    return st.st_uid == os.geteuid() and not st.st_mode & (stat.S_IWGRP | stat.S_IWOTH)
+
+
+def check_trigger_file(profiler: Profiler) -> None:
+    """Start a profile if the trigger file exists (its content: optional duration)."""
+    trigger = profiler.outdir / TRIGGER_FILENAME
+    if not trigger.exists():
+        return
+    if not is_private_dir(profiler.outdir):
+        LOGGER.warning(
+            f"ignoring {trigger} -- {profiler.outdir} must be owned by this user "
+            f"and not writable by others (ex: chmod 700)"
+        )
+        return
+    try:
+        content = trigger.read_text().strip()
+    except FileNotFoundError:
+        return
+    trigger.unlink(missing_ok=True)
+    try:
+        duration = float(content) if content else None
+    except ValueError:
+        LOGGER.warning(f"invalid duration in {trigger}: {content!r} -- using default")
+        duration = None
+    profiler.start(duration)
+
+
+async def run() -> None:
+    """Wait for profile triggers (signal or file)."""
+    LOGGER.info("Activated.")
+    profiler = Profiler(
+        ENV.TMS_PROFILE_DIR,
+        ENV.TMS_PROFILE_DURATION,
+        ENV.TMS_PROFILE_SAMPLE_INTERVAL,
+    )
+
+    make_private_dir(profiler.outdir)  # (now -- before anyone else can make it)
+    if not is_private_dir(profiler.outdir):
+        LOGGER.warning(f"{profiler.outdir} is not private -- its trigger file is ignored")
+
+    asyncio.get_running_loop().add_signal_handler(signal.SIGUSR2, profiler.start)
+    LOGGER.info(
+        f"to profile: 'kill -USR2 <pid>' or write to {profiler.outdir / TRIGGER_FILENAME}"
+    )
+
+    while True:
+        check_trigger_file(profiler)
+        await asyncio.sleep(TRIGGER_POLL_WAIT)
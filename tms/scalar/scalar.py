@@ -10,8 +10,12 @@ from rest_tools.client import RestClient
 from wipac_dev_tools.timing_tools import IntervalTimer
 
 from . import starter, stopper
-from ..condor_tools import get_schedd
+from .submit_template import InvalidCondorRequirements
+from .throttle import SubmitThrottle
+from .. import tracing
+from ..condor_tools import get_schedd, get_schedd_obj
 from ..config import ENV, WMS_URL_V_PREFIX
+from ..taskforce_cache import get_taskforce_cache
 
 LOGGER = logging.getLogger(__name__)
 
@@ -128,6 +132,9 @@ class EWMSCaller:
             f"/{WMS_URL_V_PREFIX}/tms/condor-submit/taskforces/{taskforce_uuid}",
             body,
         )
+        tf_cache = get_taskforce_cache()
+        tf_cache.invalidate(taskforce_uuid, body["job_event_log_fpath"])
+        tf_cache.put(taskforce_uuid, body["cluster_id"], body["job_event_log_fpath"])
         LOGGER.info("CONFIRMED TASKFORCE START -- sent taskforce info to EWMS")
 
     @staticmethod
@@ -142,6 +149,7 @@ class EWMSCaller:
             f"/{WMS_URL_V_PREFIX}/tms/condor-submit/taskforces/{taskforce_uuid}/failed",
             {"error": error},
         )
+        get_taskforce_cache().invalidate(taskforce_uuid)
         LOGGER.info(f"NOTIFIED EWMS THAT TASKFORCE FAILED TO START -- {error}")
 
     @staticmethod
@@ -154,6 +162,7 @@ class EWMSCaller:
             "POST",
             f"/{WMS_URL_V_PREFIX}/tms/condor-rm/taskforces/{taskforce_uuid}",
         )
+        get_taskforce_cache().invalidate(taskforce_uuid)
         LOGGER.info("CONFIRMED TASKFORCE STOPPED")
 
     @staticmethod
@@ -167,6 +176,7 @@ class EWMSCaller:
             "POST",
             f"/{WMS_URL_V_PREFIX}/tms/condor-rm/taskforces/{taskforce_uuid}/failed",
         )
+        get_taskforce_cache().invalidate(taskforce_uuid)
         LOGGER.info(f"NOTIFIED EWMS THAT TASKFORCE FAILED TO STOP -- {error}")
 
 
@@ -179,8 +189,10 @@ async def run(ewms_rc: RestClient) -> None:
     LOGGER.info("Activated.")
 
     # make connections -- do now so we don't have any surprises downstream
-    LOGGER.info("Connecting to HTCondor...")
-    schedd_obj = htcondor.Schedd()  # no auth need b/c we're on AP
+    LOGGER.info(f"Connecting to HTCondor ({get_schedd()})...")
+    schedd_obj = get_schedd_obj()
+    throttle = SubmitThrottle(schedd_obj)
+    cluster_index = starter.SubmittedClusterIndex(schedd_obj)
 
     timer = IntervalTimer(ENV.TMS_OUTER_LOOP_WAIT, f"{LOGGER.name}.timer")
 
@@ -188,7 +200,7 @@ async def run(ewms_rc: RestClient) -> None:
     while True:
         # START(S)
         LOGGER.debug("Activating starter...")
-        await start_all(schedd_obj, ewms_rc)
+        await start_all(schedd_obj, ewms_rc, throttle, cluster_index)
         LOGGER.debug("De-activated starter.")
 
         # STOP(S)
@@ -203,39 +215,91 @@ async def run(ewms_rc: RestClient) -> None:
 async def start_all(
     schedd_obj: htcondor.Schedd,
     ewms_rc: RestClient,
+    throttle: SubmitThrottle | None = None,
+    cluster_index: starter.SubmittedClusterIndex | None = None,
 ) -> None:
-    """Invoke the starter on every designated taskforce."""
-    while ewms_pending_starter_attrs := await EWMSCaller.get_next_to_start(ewms_rc):
-        try:
-            ewms_condor_submit_attrs = await starter.start(
-                schedd_obj,
-                ewms_rc,
-                #
-                ewms_pending_starter_attrs["taskforce_uuid"],
-                ewms_pending_starter_attrs["n_workers"],
-                #
-                ewms_pending_starter_attrs["pilot_config"],
-                #
-                ewms_pending_starter_attrs["worker_config"],
+    """Invoke the starter on every designated taskforce.
+
+    If the schedd is too loaded, the remaining taskforces are left
+    pending-starter in EWMS, to be started on a later pass.
+    """
+    while True:
+        # is the schedd already too loaded? -- then don't bother asking ewms
+        if throttle and throttle.should_defer():
+            LOGGER.info(f"Deferring taskforce starts: {throttle.state.reason}")
+            return
+
+        ewms_pending_starter_attrs = await EWMSCaller.get_next_to_start(ewms_rc)
+        if not ewms_pending_starter_attrs:
+            return
+
+        n_jobs = starter.get_n_jobs_queued_at_submit(
+            ewms_pending_starter_attrs["n_workers"],
+            ewms_pending_starter_attrs["worker_config"],
+        )
+
+        # would this taskforce never fit? -- then deferring it would block the rest
+        if throttle and throttle.is_too_large(n_jobs):
+            error = (
+                f"taskforce has more jobs than the schedd allows "
+                f"({n_jobs} > {throttle.state.job_limit})"
             )
-        except starter.TaskforceNotToBeStarted:
-            continue  # do not sleep, ask for next TF
-        except htcondor.HTCondorInternalError as e:
-            LOGGER.error(e)
+            LOGGER.error(error)
             await EWMSCaller.notify_failed_condor_submit(
                 ewms_rc,
                 ewms_pending_starter_attrs["taskforce_uuid"],
-                str(e),
+                error,
             )
-            await asyncio.sleep(ENV.TMS_ERROR_WAIT)
             continue  # ask for next TF
-        else:
-            # confirm start (otherwise tms will pull this one again -- good for statelessness)
-            await EWMSCaller.confirm_condor_submit(
-                ewms_rc,
-                ewms_pending_starter_attrs["taskforce_uuid"],
-                ewms_condor_submit_attrs,
+
+        # would this taskforce put the schedd over its limit?
+        if throttle and throttle.should_defer(n_jobs):
+            LOGGER.info(
+                f"Deferring taskforce start "
+                f"({ewms_pending_starter_attrs['taskforce_uuid']}): {throttle.state.reason}"
             )
+            return  # not confirmed -> stays pending-starter in ewms
+
+        # one trace per taskforce
+        with tracing.span(
+            "scalar.start_taskforce",
+            taskforce_uuid=ewms_pending_starter_attrs["taskforce_uuid"],
+            n_workers=ewms_pending_starter_attrs["n_workers"],
+        ):
+            try:
+                ewms_condor_submit_attrs = await starter.start(
+                    schedd_obj,
+                    ewms_rc,
+                    #
+                    ewms_pending_starter_attrs["taskforce_uuid"],
+                    ewms_pending_starter_attrs["n_workers"],
+                    #
+                    ewms_pending_starter_attrs["pilot_config"],
+                    #
+                    ewms_pending_starter_attrs["worker_config"],
+                    #
+                    cluster_index,
+                )
+            except starter.TaskforceNotToBeStarted:
+                continue  # do not sleep, ask for next TF
+            except (htcondor.HTCondorInternalError, InvalidCondorRequirements) as e:
+                LOGGER.error(e)
+                await EWMSCaller.notify_failed_condor_submit(
+                    ewms_rc,
+                    ewms_pending_starter_attrs["taskforce_uuid"],
+                    str(e),
+                )
+                await asyncio.sleep(ENV.TMS_ERROR_WAIT)
+                continue  # ask for next TF
+            else:
+                # confirm start (otherwise tms will pull this one again -- good for statelessness)
+                await EWMSCaller.confirm_condor_submit(
+                    ewms_rc,
+                    ewms_pending_starter_attrs["taskforce_uuid"],
+                    ewms_condor_submit_attrs,
+                )
+                if throttle:
+                    throttle.record_submission(n_jobs)
 
 
 async def stop_all(
@@ -244,23 +308,29 @@ async def stop_all(
 ) -> None:
     """Invoke the stopper on every designated taskforce."""
     while ewms_pending_stopper_attrs := await EWMSCaller.get_next_to_stop(ewms_rc):
-        try:
-            stopper.stop(
-                schedd_obj,
-                ewms_pending_stopper_attrs["cluster_id"],
-            )
-        except htcondor.HTCondorInternalError as e:
-            LOGGER.error(e)
-            await EWMSCaller.notify_failed_condor_rm(
-                ewms_rc,
-                ewms_pending_stopper_attrs["taskforce_uuid"],
-                str(e),
-            )
-            await asyncio.sleep(ENV.TMS_ERROR_WAIT)
-            continue  # ask for next TF
-        else:
-            # confirm stop (otherwise ewms will request this one again -- good for statelessness)
-            await EWMSCaller.confirm_condor_rm(
-                ewms_rc,
-                ewms_pending_stopper_attrs["taskforce_uuid"],
-            )
+        # one trace per taskforce
+        with tracing.span(
+            "scalar.stop_taskforce",
+            taskforce_uuid=ewms_pending_stopper_attrs["taskforce_uuid"],
+            cluster_id=ewms_pending_stopper_attrs["cluster_id"],
+        ):
+            try:
+                stopper.stop(
+                    schedd_obj,
+                    ewms_pending_stopper_attrs["cluster_id"],
+                )
+            except htcondor.HTCondorInternalError as e:
+                LOGGER.error(e)
+                await EWMSCaller.notify_failed_condor_rm(
+                    ewms_rc,
+                    ewms_pending_stopper_attrs["taskforce_uuid"],
+                    str(e),
+                )
+                await asyncio.sleep(ENV.TMS_ERROR_WAIT)
+                continue  # ask for next TF
+            else:
+                # confirm stop (otherwise ewms will request this one again -- good for statelessness)
+                await EWMSCaller.confirm_condor_rm(
+                    ewms_rc,
+                    ewms_pending_stopper_attrs["taskforce_uuid"],
+                )
@@ -1,22 +1,26 @@
 """For starting EWMS taskforce workers on an HTCondor cluster."""
 
+import collections
+import dataclasses as dc
 import logging
 import shlex
+import time
 from pathlib import Path
 from typing import Any
 
 import htcondor  # type: ignore[import-untyped]
-import humanfriendly  # type: ignore[import-untyped]
 from rest_tools.client import RestClient
 
+from . import submit_template
+from .. import metrics, tracing
 from ..condor_tools import get_schedd
 from ..config import (
-    DEFAULT_CONDOR_REQUIREMENTS,
     ENV,
     PRIORITY_MAX_DEDUCTION_FACTOR,
     WMS_URL_V_PREFIX,
 )
-from ..utils import JELFileLogic, TaskforceDirLogic
+from ..taskforce_cache import get_taskforce_cache
+from ..utils import JELFileLogic, SharedFileLogic, TaskforceDirLogic
 
 LOGGER = logging.getLogger(__name__)
 
@@ -29,20 +33,134 @@ class TaskforceNotToBeStarted(Exception):
     """Raise when the taskforce is no longer intended to start as previously expected."""
 
 
+# 'worker_config' keys that opt a taskforce into HTCondor late materialization
+#   -> proc ads are created by the schedd's job factory as needed, instead of all at submit
+#   https://htcondor.readthedocs.io/en/latest/users-manual/submitting-a-job.html#submitting-lots-of-jobs
+LATE_MATERIALIZATION_KEYS = ("max_idle", "max_materialize")
+
+
+def uses_late_materialization(worker_config: dict) -> bool:
+    """Return whether the taskforce opted into late materialization."""
+    return any(worker_config.get(k) for k in LATE_MATERIALIZATION_KEYS)
+
+
+def get_n_jobs_queued_at_submit(n_workers: int, worker_config: dict) -> int:
+    """Get the number of jobs that will be added to the schedd's queue at submit.
+
+    With late materialization, the schedd's job factory only materializes up to
+    its limit (and it also respects the schedd's job limits on its own).
+    """
+    if not uses_late_materialization(worker_config):
+        return n_workers
+    return min(
+        [n_workers]
+        + [int(worker_config[k]) for k in LATE_MATERIALIZATION_KEYS if worker_config.get(k)]
+    )
+
+
+@dc.dataclass(frozen=True)
+class SubmittedCluster:
+    """A cluster already on the schedd for a taskforce."""
+
+    cluster_id: int
+    n_procs: int
+    job_event_log_fpath: str
+
+
+class SubmittedClusterIndex:
+    """An index of the schedd's EWMS clusters, keyed by taskforce uuid.
+
+    This guards against submitting a taskforce twice, which can happen if
+    the TMS stopped between submitting and confirming the submit with EWMS.
+    The index is built from one projected query, which is only repeated every
+    'TMS_SCHEDD_INDEX_REFRESH_INTERVAL' seconds; in between, this TMS's own
+    submissions are added as they happen.
+    """
+
+    def __init__(self, schedd_obj: htcondor.Schedd) -> None:
+        self.schedd_obj = schedd_obj
+        self._index: dict[str, SubmittedCluster] = {}
+        self._refreshed_at = float("-inf")
+
+    def _refresh(self) -> None:
+        LOGGER.debug("Querying schedd for existing EWMS clusters...")
+        tf_uuids: dict[int, str] = {}  # by cluster id
+        n_job_ads: collections.Counter[int] = collections.Counter()
+        n_removed: collections.Counter[int] = collections.Counter()
+        n_total_procs: dict[int, int] = {}  # from the cluster ad
+        jel_fpaths: dict[int, str] = {}
+
+        for ad in self.schedd_obj.query(
+            constraint="EWMSTaskforceUUID =!= undefined",
+            projection=[
+                "ClusterId",
+                "ProcId",
+                "JobStatus",
+                "EWMSTaskforceUUID",
+                "UserLog",
+                "TotalSubmitProcs",
+            ],
+            # include cluster ads -- late-materialization clusters may not have jobs yet
+            opts=htcondor.QueryOpts.IncludeClusterAd,
+        ):
+            cid = int(ad["ClusterId"])
+            tf_uuids[cid] = str(ad["EWMSTaskforceUUID"])
+            if "TotalSubmitProcs" in ad:
+                n_total_procs[cid] = int(ad["TotalSubmitProcs"])
+            if ad.get("ProcId", -1) >= 0:  # (cluster ads have no proc id nor status)
+                n_job_ads[cid] += 1
+                if ad.get("JobStatus") == 3:
+                    n_removed[cid] += 1
+            if "UserLog" in ad:
+                jel_fpaths[cid] = str(ad["UserLog"])
+
+        self._index = {
+            tf_uuid: SubmittedCluster(
+                cluster_id=cid,
+                # prefer the cluster ad's total, otherwise count the job ads
+                n_procs=n_total_procs.get(cid, n_job_ads[cid]),
+                job_event_log_fpath=jel_fpaths.get(cid, ""),
+            )
+            for cid, tf_uuid in tf_uuids.items()
+            # removed (but still queued) clusters are not included -- those can be resubmitted
+            if not (n_job_ads[cid] and n_removed[cid] == n_job_ads[cid])
+        }
+        self._refreshed_at = time.time()
+        LOGGER.debug(f"Found {len(self._index)} existing EWMS clusters")
+
+    def get(self, taskforce_uuid: str) -> SubmittedCluster | None:
+        """Get the taskforce's cluster, if there is one on the schedd."""
+        if time.time() - self._refreshed_at >= ENV.TMS_SCHEDD_INDEX_REFRESH_INTERVAL:
+            self._refresh()
+        return self._index.get(taskforce_uuid)
+
+    def add(self, taskforce_uuid: str, cluster: SubmittedCluster) -> None:
+        """Add a newly submitted cluster."""
+        self._index[taskforce_uuid] = cluster
+
+
 async def is_taskforce_still_pending_starter(
     ewms_rc: RestClient,
     taskforce_uuid: str,
 ) -> bool:
-    """Return whether the taskforce is still pending-starter."""
+    """Return whether the taskforce is still pending-starter.
+
+    EWMS is always asked (not the cache) -- this guards against EWMS having
+    aborted the taskforce since it was gotten, which the TMS wouldn't know.
+    """
     ret = await ewms_rc.request(
         "GET",
         f"/{WMS_URL_V_PREFIX}/taskforces/{taskforce_uuid}",
     )
-    return ret["phase"] == "pending-starter"  # type: ignore[no-any-return]
+    get_taskforce_cache().put(taskforce_uuid, phase=ret["phase"])
+    return ret["phase"] == "pending-starter"
 
 
 def write_envfile(taskforce_uuid: str, env_vars: dict) -> Path:
-    """Construct the envfile to be transferred."""
+    """Construct the envfile to be transferred.
+
+    Identical envfiles are stored once and hardlinked into each taskforce dir.
+    """
     envfile = (
         Path(TaskforceDirLogic.create(taskforce_uuid)) / "ewms_htcondor_envfile.sh"
     )
@@ -54,30 +172,31 @@ def write_envfile(taskforce_uuid: str, env_vars: dict) -> Path:
         out_val = shlex.quote(out_val)  # escape special chars
         return out_val
 
-    # make file
-    with open(envfile, "w") as f:
-        f.write("#!/bin/bash\n\n")
+    # make file contents
+    lines = ["#!/bin/bash\n\n"]
 
-        # header comment
-        f.write("# Environment setup for HTCondor worker\n")
-        f.write(
-            "# This file is auto-generated and sets necessary environment variables.\n"
-        )
-        f.write("# Sourced automatically by the EWMS Pilot's container entrypoint.\n\n")
-
-        f.write("set -x\n")  # enable command tracing
-        # Write environment variables
-        for key, value in sorted(env_vars.items()):
-            f.write(f"export {key}={to_envval(value)}\n")
-        f.write("set +x\n")  # disable command tracing
-
-        # footer comment
-        f.write("\n# End of environment file\n")
-
-    # make the file executable
-    envfile.chmod(0o755)  # execute permissions
-
-    return envfile
+    # header comment
+    lines.append("# Environment setup for HTCondor worker\n")
+    lines.append(
+        "# This file is auto-generated and sets necessary environment variables.\n"
+    )
+    lines.append("# Sourced automatically by the EWMS Pilot's container entrypoint.\n\n")
+
+    lines.append("set -x\n")  # enable command tracing
+    # Write environment variables
+    for key, value in sorted(env_vars.items()):
+        lines.append(f"export {key}={to_envval(value)}\n")
+    lines.append("set +x\n")  # disable command tracing
+
+    # footer comment
+    lines.append("\n# End of environment file\n")
+
+    # make the (executable) file
+    return SharedFileLogic.link(
+        "".join(lines).encode(),
+        envfile,
+        mode=0o755,  # execute permissions
+    )
 
 
 def assemble_pilot_fully_qualified_image(image_source: str, tag: str) -> str:
@@ -151,6 +270,9 @@ def make_condor_job_description(
     """Make the condor job description (dict).
 
     Return the job description along with the output subdir (or None).
+
+    Raises:
+        `InvalidCondorRequirements` -- if the taskforce's condor requirements cannot be parsed
     """
 
     # NOTE:
@@ -164,6 +286,11 @@ def make_condor_job_description(
     #   entrypoint, and loading the icetray env file
     #   directly from cvmfs messes up the paths" -DS
 
+    # assemble requirements string -- do first, since this can fail on bad user input
+    requirements = submit_template.get_requirements(  # -> InvalidCondorRequirements
+        worker_config["condor_requirements"]
+    )
+
     # update environment
     # order of precedence (descending): WMS's values, runtime-specific, constant
     pilot_envvar_defaults = {
@@ -183,16 +310,9 @@ def make_condor_job_description(
     envfile = write_envfile(taskforce_uuid, pilot_config["environment"])
     pilot_config["input_files"].append(str(envfile))
 
-    # assemble requirements string
-    if worker_config["condor_requirements"].strip():
-        all_reqs_str = f"{DEFAULT_CONDOR_REQUIREMENTS} && ({worker_config['condor_requirements'].strip()})"
-    else:
-        all_reqs_str = DEFAULT_CONDOR_REQUIREMENTS
-
-    # assemble submit dict
+    # assemble submit dict -- start w/ the parts that are the same for every taskforce
     submit_dict = {
-        "universe": "container",
-        "+should_transfer_container": "no",
+        **submit_template.STATIC_SUBMIT_ITEMS,
         "container_image": assemble_pilot_fully_qualified_image(  # not quoted -- otherwise condor assumes relative path
             pilot_config["image_source"],
             pilot_config["tag"],
@@ -201,43 +321,28 @@ def make_condor_job_description(
         # "arguments": "",  # NOTE: args were removed in https://github.com/Observation-Management-Service/ewms-workflow-management-service/pull/38  # pilot_arguments.replace('"', r"\""),  # escape embedded quotes
         # "environment": "",  # NOTE: use envfile instead
         #
-        "Requirements": all_reqs_str,
-        "+FileSystemDomain": '"blah"',  # must be quoted
+        "Requirements": requirements,
         #
         # cluster logs -- shared w/ other clusters
         "log": str(JELFileLogic.create_path()),
         #
         "transfer_input_files": ",".join(pilot_config["input_files"]),
-        "transfer_output_files": "",  # TODO: add ewms-pilot debug directory
-        # https://htcondor.readthedocs.io/en/latest/users-manual/file-transfer.html#specifying-if-and-when-to-transfer-files
-        "should_transfer_files": "YES",
-        "when_to_transfer_output": "ON_EXIT_OR_EVICT",
-        #
-        "transfer_executable": "false",
         #
         "request_cpus": str(worker_config["n_cores"]),
-        # NOTE: condor uses binary sizes but formats like decimal
-        "request_memory": humanfriendly.format_size(
-            # "1073741824" -> 1073741824 -> "1 GiB" -> "1 GB" (or "3 MB" -> 3221225472 -> "3 MB")
-            humanfriendly.parse_size(str(worker_config["worker_memory"]), binary=True),
-            binary=True,
-        ).replace("i", ""),
-        # NOTE: condor uses binary sizes but formats like decimal
-        "request_disk": humanfriendly.format_size(
-            # "1073741824" -> 1073741824 -> "1 GiB" -> "1 GB" (or "3 MB" -> 3221225472 -> "3 MB")
-            humanfriendly.parse_size(str(worker_config["worker_disk"]), binary=True),
-            binary=True,
-        ).replace("i", ""),
+        "request_memory": submit_template.to_condor_size(
+            str(worker_config["worker_memory"])
+        ),
+        "request_disk": submit_template.to_condor_size(
+            str(worker_config["worker_disk"])
+        ),
         #
         "priority": _get_priority_equation(int(worker_config["priority"]), n_workers),
-        "+WantIOProxy": "true",  # for HTChirp
         "+OriginalTime": worker_config[
             # Execution time limit -- 1 hour default on OSG
             "max_worker_runtime"
         ],
         #
         "+EWMSTaskforceUUID": f'"{taskforce_uuid}"',  # must be quoted
-        "job_ad_information_attrs": "EWMSTaskforceUUID",
     }
 
     if worker_config["do_transfer_worker_stdouterr"]:
@@ -254,6 +359,16 @@ def make_condor_job_description(
     else:
         output_subdir = None
 
+    # late materialization? -- only the given keys are set, condor handles the rest
+    if uses_late_materialization(worker_config):
+        submit_dict.update(
+            {
+                k: str(int(worker_config[k]))
+                for k in LATE_MATERIALIZATION_KEYS
+                if worker_config.get(k)
+            }
+        )
+
     LOGGER.debug(submit_dict)
     return submit_dict, output_subdir
 
@@ -263,19 +378,41 @@ def submit(
     n_workers: int,
     submit_dict: dict[str, Any],
 ) -> tuple[int, int]:
-    """Start taskforce on Condor cluster."""
+    """Start taskforce on Condor cluster.
+
+    Returns the cluster id and number of procs. When using late materialization,
+    procs are created over time by the schedd, so the number of procs is the
+    total requested (not the number materialized at submit time).
+    """
     submit_obj = htcondor.Submit(submit_dict)
 
     # submit
     LOGGER.info("Submitting request to condor...")
     LOGGER.info(submit_obj)
-    submit_result_obj = schedd_obj.submit(
-        submit_obj,
-        count=n_workers,  # submit N workers
-    )
-    cluster_id, num_procs = submit_result_obj.cluster(), submit_result_obj.num_procs()
+    with (
+        metrics.timed(metrics.SCHEDD_SUBMIT_DURATION),
+        tracing.span(
+            "schedd.submit",
+            taskforce_uuid=submit_dict.get("+EWMSTaskforceUUID", "").strip('"') or None,
+            n_workers=n_workers,
+        ) as span,
+    ):
+        submit_result_obj = schedd_obj.submit(
+            submit_obj,
+            count=n_workers,  # submit N workers
+        )
+        cluster_id, num_procs = submit_result_obj.cluster(), submit_result_obj.num_procs()
+        tracing.set_attributes(span, cluster_id=cluster_id, n_procs=num_procs)
     LOGGER.info(submit_result_obj)  # includes cluster_id and num_procs
 
+    # late materialization -> factory will materialize the rest of the procs
+    if any(k in submit_dict for k in LATE_MATERIALIZATION_KEYS):
+        LOGGER.info(
+            f"using late materialization: {num_procs} procs materialized at submit, "
+            f"{n_workers} total will be materialized by the schedd"
+        )
+        num_procs = n_workers
+
     return cluster_id, num_procs
 
 
@@ -287,9 +424,14 @@ async def start(
     n_workers: int,
     pilot_config: dict,
     worker_config: dict,
+    #
+    cluster_index: SubmittedClusterIndex | None = None,
 ) -> dict[str, Any]:
     """Start an EWMS taskforce workers on an HTCondor cluster.
 
+    If `cluster_index` is given, an existing cluster for the taskforce is
+    used instead of submitting a new one.
+
     Returns attrs for sending to EWMS.
     """
     LOGGER.info(f"Starting {n_workers} EWMS taskforce workers on {get_schedd()}")
@@ -312,12 +454,27 @@ async def start(
         )
         raise TaskforceNotToBeStarted()
 
+    # was this already submitted? (ex: tms stopped before confirming w/ ewms)
+    if cluster_index and (existing := cluster_index.get(taskforce_uuid)):
+        LOGGER.warning(
+            f"Taskforce {taskforce_uuid} already has a cluster on the schedd "
+            f"({existing.cluster_id}) -- confirming that one instead of resubmitting"
+        )
+        cluster_id, num_procs = existing.cluster_id, existing.n_procs
+        if existing.job_event_log_fpath:
+            submit_dict["log"] = existing.job_event_log_fpath
     # submit
-    cluster_id, num_procs = submit(  # -> htcondor.HTCondorInternalError (let it raise)
-        schedd_obj=schedd_obj,
-        n_workers=n_workers,
-        submit_dict=submit_dict,
-    )
+    else:
+        cluster_id, num_procs = submit(  # -> htcondor.HTCondorInternalError (let it raise)
+            schedd_obj=schedd_obj,
+            n_workers=n_workers,
+            submit_dict=submit_dict,
+        )
+        if cluster_index:
+            cluster_index.add(
+                taskforce_uuid,
+                SubmittedCluster(cluster_id, num_procs, submit_dict["log"]),
+            )
 
     # make output subdir?
     if output_subdir:
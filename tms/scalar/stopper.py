@@ -4,7 +4,7 @@ import logging
 
 import htcondor  # type: ignore[import-untyped]
 
-from .. import types
+from .. import metrics, tracing, types
 from ..condor_tools import get_schedd
 
 LOGGER = logging.getLogger(__name__)
@@ -19,10 +19,15 @@ def stop(
     LOGGER.info(f"Stopping EWMS taskforce workers on {cluster_id} / {get_schedd()}")
 
     # Remove workers -- may not be instantaneous
-    act_obj = schedd_obj.act(
-        htcondor.JobAction.Remove,
-        f"ClusterId == {cluster_id}",
-        reason="Requested by EWMS",
-    )
+    with (
+        metrics.timed(metrics.SCHEDD_ACT_DURATION.labels("remove")),
+        tracing.span("schedd.act", action="remove", cluster_id=cluster_id) as span,
+    ):
+        act_obj = schedd_obj.act(
+            htcondor.JobAction.Remove,
+            f"ClusterId == {cluster_id}",
+            reason="Requested by EWMS",
+        )
+        tracing.set_attributes(span, n_removed=act_obj["TotalSuccess"])
     LOGGER.debug(act_obj)
     LOGGER.info(f"Removed {act_obj['TotalSuccess']} workers")
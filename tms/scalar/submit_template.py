@@ -0,0 +1,79 @@
+"""Precompiled, taskforce-independent parts of the condor submit description."""
+
+import functools
+import logging
+
+from htcondor import classad  # type: ignore[import-untyped]
+
+from ..config import DEFAULT_CONDOR_REQUIREMENTS
+
+LOGGER = logging.getLogger(__name__)
+
+
+class InvalidCondorRequirements(Exception):
+    """Raise when a taskforce's condor requirements are not a valid ClassAd expression."""
+
+
+# these are the same for every taskforce
+STATIC_SUBMIT_ITEMS = {
+    "universe": "container",
+    "+should_transfer_container": "no",
+    #
+    "+FileSystemDomain": '"blah"',  # must be quoted
+    #
+    "transfer_output_files": "",  # TODO: add ewms-pilot debug directory
+    # https://htcondor.readthedocs.io/en/latest/users-manual/file-transfer.html#specifying-if-and-when-to-transfer-files
+    "should_transfer_files": "YES",
+    "when_to_transfer_output": "ON_EXIT_OR_EVICT",
+    #
+    "transfer_executable": "false",
+    #
+    "+WantIOProxy": "true",  # for HTChirp
+    "job_ad_information_attrs": "EWMSTaskforceUUID",
+}
+
+
+def _parse_expr(expr: str) -> classad.ExprTree:
+    """Parse the ClassAd expression, so errors surface before the schedd sees it."""
+    try:
+        return classad.ExprTree(expr)
+    except classad.ClassAdParseError as e:
+        raise InvalidCondorRequirements(f"invalid condor requirements: {expr}") from e
+
+
+# a typo in the defaults should fail loudly at import
+_parse_expr(DEFAULT_CONDOR_REQUIREMENTS)
+
+
+@functools.lru_cache(maxsize=256)
+def get_requirements(user_requirements: str) -> str:
+    """Get the full requirements string, including the default requirements.
+
+    The user's requirements are validated (parsed) once per distinct value.
+    The combined string is what's cached, not a combined `classad.ExprTree`:
+    an unparsed tree isn't the text given (ex: '=?=' -> 'is'), and `ExprTree.and_()`
+    doesn't parenthesize its operands.
+
+    Raises:
+        `InvalidCondorRequirements` -- if the user's requirements cannot be parsed
+    """
+    if not (user_requirements := user_requirements.strip()):
+        return DEFAULT_CONDOR_REQUIREMENTS
+
+    _parse_expr(user_requirements)
+    return f"{DEFAULT_CONDOR_REQUIREMENTS} && ({user_requirements})"
+
+
+@functools.lru_cache(maxsize=256)
+def to_condor_size(size: str) -> str:
+    """Convert a size (ex: "1073741824", "3 GiB") to condor's format.
+
+    NOTE: condor uses binary sizes but formats like decimal
+    """
+    import humanfriendly  # type: ignore[import-untyped]  # (lazy -- not needed at startup)
+
+    # "1073741824" -> 1073741824 -> "1 GiB" -> "1 GB" (or "3 MB" -> 3221225472 -> "3 MB")
+    return humanfriendly.format_size(
+        humanfriendly.parse_size(size, binary=True),
+        binary=True,
+    ).replace("i", "")
@@ -0,0 +1,189 @@
+"""For throttling taskforce submissions based on the schedd's current load."""
+
+import dataclasses as dc
+import getpass
+import logging
+import time
+
+import htcondor  # type: ignore[import-untyped]
+
+from ..condor_tools import get_schedd_params
+from ..config import ENV
+
+LOGGER = logging.getLogger(__name__)
+
+
+@dc.dataclass(frozen=True)
+class ScheddLoad:
+    """Job totals for the schedd, from summary-only queries."""
+
+    n_jobs: int  # all owners'
+    n_idle: int
+    n_running: int
+    n_held: int
+    n_owner_jobs: int  # just the TMS's user's -- for 'MAX_JOBS_PER_OWNER'
+    queried_at: float
+
+
+@dc.dataclass
+class ThrottleState:
+    """The throttle's current state -- intended for monitoring."""
+
+    load: ScheddLoad | None = None
+    job_limit: int | None = None  # the schedd's own (smallest) job limit
+    max_jobs: int | None = None  # the effective 'MAX_JOBS_SUBMITTED' (watermark applied)
+    max_owner_jobs: int | None = None  # the effective 'MAX_JOBS_PER_OWNER' (watermark applied)
+    is_deferring: bool = False
+    reason: str = ""
+    n_deferrals: int = 0  # total since startup
+
+
+def _get_schedd_job_limits() -> tuple[int | None, int | None]:
+    """Get the schedd's 'MAX_JOBS_SUBMITTED' & 'MAX_JOBS_PER_OWNER' (None if not set)."""
+    params = get_schedd_params()  # (for a listed schedd, a round trip)
+    limits: list[int | None] = []
+    for param in ["MAX_JOBS_SUBMITTED", "MAX_JOBS_PER_OWNER"]:
+        try:
+            limits.append(int(val) if (val := params.get(param)) is not None else None)
+        except ValueError:  # not an int
+            limits.append(None)
+    return limits[0], limits[1]
+
+
+def _is_near_limit(n_jobs: int, n_new_jobs: int, max_jobs: int | None) -> bool:
+    """Return whether the new jobs would put the count over the (effective) limit.
+
+    A submission larger than the limit would never fit, so it is let through
+    once the count is zero.
+    """
+    return (
+        max_jobs is not None
+        and n_jobs + n_new_jobs > max_jobs
+        and not (n_jobs == 0 and n_new_jobs > max_jobs)
+    )
+
+
+def _apply_watermark(limit: int | None) -> int | None:
+    if limit is None:
+        return None
+    return int(limit * ENV.TMS_SUBMIT_THROTTLE_JOBS_WATERMARK)
+
+
+class SubmitThrottle:
+    """Defer submissions when the schedd is too loaded.
+
+    The schedd is queried with summary-only queries (no job ads are sent
+    back), and that result is reused for 'TMS_SCHEDD_LOAD_QUERY_INTERVAL' seconds.
+    So are the schedd's job limits (its config). All owners' jobs count against
+    'MAX_JOBS_SUBMITTED', but just the TMS's user's against 'MAX_JOBS_PER_OWNER'
+    -- on a shared AP, others' jobs don't count toward that one.
+    """
+
+    def __init__(self, schedd_obj: htcondor.Schedd) -> None:
+        self.schedd_obj = schedd_obj
+        self.state = ThrottleState()
+        self._limits_read_at: float | None = None
+
+    def _query_summary(self, constraint: str = "true") -> dict:
+        ads = self.schedd_obj.query(constraint=constraint, opts=htcondor.QueryOpts.SummaryOnly)
+        return next(
+            (ad for ad in ads if ad.get("MyType") == "Summary"),
+            ads[-1] if ads else {},
+        )
+
+    def _query_load(self) -> ScheddLoad:
+        """Get the job totals from the schedd."""
+        summary = self._query_summary()
+        owners = self._query_summary(f'Owner == "{getpass.getuser()}"')
+        return ScheddLoad(
+            n_jobs=int(summary.get("Jobs", 0)),
+            n_idle=int(summary.get("Idle", 0)),
+            n_running=int(summary.get("Running", 0)),
+            n_held=int(summary.get("Held", 0)),
+            n_owner_jobs=int(owners.get("Jobs", 0)),
+            queried_at=time.time(),
+        )
+
+    def get_load(self) -> ScheddLoad:
+        """Get the schedd's load, re-querying only if the last query is stale."""
+        if (
+            not self.state.load
+            or time.time() - self.state.load.queried_at
+            >= ENV.TMS_SCHEDD_LOAD_QUERY_INTERVAL
+        ):
+            self.state.load = self._query_load()
+            LOGGER.debug(f"schedd load: {self.state.load}")
+        return self.state.load
+
+    def record_submission(self, n_jobs: int) -> None:
+        """Account for newly submitted jobs until the next query refreshes the totals."""
+        if self.state.load:
+            self.state.load = dc.replace(
+                self.state.load,
+                n_jobs=self.state.load.n_jobs + n_jobs,
+                n_idle=self.state.load.n_idle + n_jobs,
+                n_owner_jobs=self.state.load.n_owner_jobs + n_jobs,
+            )
+
+    def _update_limits(self) -> None:
+        """Re-read the schedd's job limits, if the last read is stale."""
+        if (
+            self._limits_read_at is not None
+            and time.time() - self._limits_read_at < ENV.TMS_SCHEDD_LOAD_QUERY_INTERVAL
+        ):
+            return
+        self._limits_read_at = time.time()
+        max_submitted, max_per_owner = _get_schedd_job_limits()
+        limits = [lim for lim in [max_submitted, max_per_owner] if lim is not None]
+        self.state.job_limit = min(limits) if limits else None
+        self.state.max_jobs = _apply_watermark(max_submitted)
+        self.state.max_owner_jobs = _apply_watermark(max_per_owner)
+
+    def is_too_large(self, n_new_jobs: int) -> bool:
+        """Return whether `n_new_jobs` jobs exceed the schedd's job limit outright.
+
+        Such a submission would never be accepted, so it must not be deferred.
+        """
+        self._update_limits()
+        return self.state.job_limit is not None and n_new_jobs > self.state.job_limit
+
+    def should_defer(self, n_new_jobs: int = 0) -> bool:
+        """Return whether a submission of `n_new_jobs` jobs should be deferred.
+
+        A deferred taskforce is not confirmed, so it stays pending-starter in EWMS.
+        A submission larger than an effective job limit would never fit, so it
+        is let through once there are no jobs (counting toward that limit) --
+        otherwise, it would block every taskforce behind it.
+        """
+        load = self.get_load()
+        self._update_limits()
+
+        if (
+            ENV.TMS_SUBMIT_THROTTLE_IDLE_WATERMARK
+            and load.n_idle >= ENV.TMS_SUBMIT_THROTTLE_IDLE_WATERMARK
+        ):
+            reason = (
+                f"schedd has too many idle jobs "
+                f"({load.n_idle} >= {ENV.TMS_SUBMIT_THROTTLE_IDLE_WATERMARK})"
+            )
+        elif _is_near_limit(load.n_jobs, n_new_jobs, self.state.max_jobs):
+            reason = (
+                f"schedd is near its job limit "
+                f"({load.n_jobs} + {n_new_jobs} > {self.state.max_jobs})"
+            )
+        elif _is_near_limit(load.n_owner_jobs, n_new_jobs, self.state.max_owner_jobs):
+            reason = (
+                f"schedd is near its per-owner job limit "
+                f"({load.n_owner_jobs} + {n_new_jobs} > {self.state.max_owner_jobs})"
+            )
+        else:
+            self.state.is_deferring = False
+            self.state.reason = ""
+            return False
+
+        if not self.state.is_deferring:  # only log on transition
+            LOGGER.warning(f"DEFERRING SUBMISSIONS -- {reason}")
+        self.state.is_deferring = True
+        self.state.reason = reason
+        self.state.n_deferrals += 1
+        return True
@@ -0,0 +1,54 @@
+"""Startup timing -- how long each phase of (re)starting the TMS takes.
+
+The clock starts when the 'tms' package is imported, so the imports (and
+building the config) are counted, but not the interpreter's own startup.
+The sequential setup phases are logged together (`log_report()`); what
+happens later, in the concurrently-started subsystems (ex: the first
+EWMS status update), is logged as it happens (`milestone()`).
+"""
+
+import logging
+import time
+from contextlib import contextmanager
+from typing import Iterator
+
+LOGGER = logging.getLogger(__name__)
+
+_T0 = time.monotonic()
+
+PHASES: dict[str, float] = {}  # name -> duration
+MILESTONES: dict[str, float] = {}  # name -> secs since start
+
+
+def elapsed() -> float:
+    """Get the secs since the start."""
+    return time.monotonic() - _T0
+
+
+def record(name: str, duration: float) -> None:
+    """Record a phase's duration."""
+    PHASES[name] = duration
+
+
+@contextmanager
+def phase(name: str) -> Iterator[None]:
+    """Record the duration of the block, as a phase."""
+    start = time.monotonic()
+    try:
+        yield
+    finally:
+        record(name, time.monotonic() - start)
+
+
+def milestone(name: str) -> None:
+    """Record (& log) when something first happened -- later calls are ignored."""
+    if name in MILESTONES:
+        return
+    MILESTONES[name] = elapsed()
+    LOGGER.info(f"startup: {name} at +{MILESTONES[name]:.2f}s")
+
+
+def log_report() -> None:
+    """Log the phases' durations."""
+    phases = ", ".join(f"{n} {d:.2f}s" for n, d in PHASES.items())
+    LOGGER.info(f"startup: {phases} -- subsystems started at +{elapsed():.2f}s")
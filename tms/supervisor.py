@@ -0,0 +1,289 @@
+"""Run the TMS's subsystems as supervised processes ('TMS_MULTIPROCESS').
+
+Each subsystem -- scalar, watcher loop, file manager -- runs in its own
+process, for each schedd ('TMS_SCHEDDS'). W/ 'TMS_WATCHER_PROCESS_PER_JEL',
+so does each JEL's watcher. So, each gets its own core (& GIL), and a crash in one (ex:
+archiving) doesn't stop the others (ex: status reporting). A worker that
+fails is restarted, w/ backoff; one that finishes (ex: its JEL was
+deleted) is not.
+
+Workers are spawned, not forked, so they read the same config & EWMS
+credentials from the environment. Each has its own EWMS client (& limits),
+event-loop monitor, and profiler ('kill -USR2 <worker pid>'). The
+supervisor serves the metrics of all its workers.
+
+NOTE: the EWMS client's limits -- concurrency, retry budget, circuit
+breaker -- are per-process, so they're not shared by the workers: EWMS may
+see up to N x 'TMS_EWMS_MAX_CONCURRENCY' in-flight requests (N grows w/
+each JEL, w/ 'TMS_WATCHER_PROCESS_PER_JEL'). This is logged at startup.
+"""
+
+import asyncio
+import dataclasses as dc
+import logging
+import multiprocessing
+import os
+import shutil
+import signal
+import tempfile
+import time
+from multiprocessing.process import BaseProcess
+from pathlib import Path
+
+from . import condor_tools, loop_monitor, metrics, profiler
+from .condor_tools import get_schedds, schedd_context, task_name
+from .config import ENV, config_logging
+from .ewms_client import EWMSClient, subsystem_context
+from .file_manager import file_manager
+from .scalar import scalar
+from .utils import JELFileLogic
+from .watcher import watcher, watcher_loop
+
+LOGGER = logging.getLogger(__name__)
+
+POLL_WAIT = 1  # seconds
+RESTART_BACKOFF_MAX = 5 * 60  # seconds
+STABLE_RUNTIME = 10 * 60  # a worker that fails after running this long restarts w/o backoff
+STOP_TIMEOUT = 10  # seconds, for a worker to exit before it's killed
+
+_MP = multiprocessing.get_context("spawn")  # (forking a process w/ threads isn't safe)
+
+
+@dc.dataclass(frozen=True)
+class WorkerSpec:
+    """What a worker process runs."""
+
+    kind: str  # file_manager_once, scalar, watcher_loop, watcher, file_manager
+    jel_fpath: Path | None = None  # (for a 'watcher')
+    schedd: str | None = None  # None -> the local schedd
+
+    @property
+    def name(self) -> str:
+        if self.jel_fpath:
+            if self.schedd:
+                return f"watcher:{self.schedd}/{self.jel_fpath.name}"
+            return f"watcher:{self.jel_fpath.name}"
+        return task_name(self.kind, self.schedd)
+
+    @property
+    def subsystem(self) -> str:
+        """The subsystem, for its EWMS requests' limits & priority."""
+        return {"file_manager_once": "file_manager", "watcher_loop": "watcher"}.get(
+            self.kind, self.kind
+        )
+
+    @property
+    def is_finite(self) -> bool:
+        """Whether the worker is done when it exits OK (otherwise, it's restarted)."""
+        return self.kind in ["file_manager_once", "watcher"]
+
+
+########################################################################################
+# worker process
+
+
+async def _work(spec: WorkerSpec, ewms_rc: EWMSClient) -> None:
+    match spec.kind:
+        case "file_manager_once":
+            await file_manager.run_once(ewms_rc)
+        case "scalar":
+            await scalar.run(ewms_rc)
+        case "watcher_loop":
+            await watcher_loop.run(ewms_rc)
+        case "watcher":
+            assert spec.jel_fpath
+            await watcher.JobEventLogWatcher(spec.jel_fpath, ewms_rc).start()
+        case "file_manager":
+            await file_manager.run(ewms_rc)
+        case _:
+            raise ValueError(f"unknown worker kind: {spec.kind}")
+
+
+async def _exit_if_orphaned(ppid: int) -> None:
+    """Exit if the supervisor is gone (ex: it was killed)."""
+    while os.getppid() == ppid:
+        await asyncio.sleep(POLL_WAIT)
+    LOGGER.critical("supervisor is gone -- exiting")
+    os._exit(1)
+
+
+async def _run_worker(spec: WorkerSpec, ppid: int) -> None:
+    ewms_rc = EWMSClient(
+        ENV.EWMS_ADDRESS,
+        ENV.EWMS_TOKEN_URL,
+        ENV.EWMS_CLIENT_ID,
+        ENV.EWMS_CLIENT_SECRET,
+    )
+    async with asyncio.TaskGroup() as tg:
+        helpers = [
+            tg.create_task(loop_monitor.run(), name="loop_monitor"),
+            tg.create_task(profiler.run(), name="profiler"),
+            tg.create_task(_exit_if_orphaned(ppid), name="orphan_check"),
+        ]
+        await tg.create_task(
+            _work(spec, ewms_rc),
+            name=spec.name,
+            context=schedd_context(spec.schedd, subsystem_context(spec.subsystem)),
+        )
+        for task in helpers:
+            task.cancel()
+
+
+def _worker_main(spec: WorkerSpec, ppid: int) -> None:
+    """A worker process's entrypoint."""
+    config_logging()
+    condor_tools.configure_htcondor()
+    LOGGER.info(f"Worker {spec.name} activated (pid={os.getpid()}).")
+    asyncio.run(_run_worker(spec, ppid))
+    LOGGER.info(f"Worker {spec.name} done.")
+
+
+########################################################################################
+# supervisor
+
+
+@dc.dataclass
+class Worker:
+    """A worker's process & its restart state."""
+
+    spec: WorkerSpec
+    process: BaseProcess | None = None
+    started_at: float = 0.0
+    n_failures: int = 0  # consecutive
+    restart_at: float | None = None
+
+
+class Supervisor:
+    """Start, watch over, and restart the worker processes."""
+
+    def __init__(self, metrics_dir: Path | None = None) -> None:
+        self.metrics_dir = metrics_dir
+        self.workers: dict[str, Worker] = {}
+
+    def add(self, spec: WorkerSpec) -> None:
+        """Add & start a worker (if there isn't one by that name)."""
+        if spec.name not in self.workers:
+            self.workers[spec.name] = worker = Worker(spec)
+            self._start(worker)
+
+    def _start(self, worker: Worker) -> None:
+        worker.process = _MP.Process(
+            target=_worker_main,
+            args=(worker.spec, os.getpid()),
+            name=f"tms-{worker.spec.name}",
+        )
+        worker.process.start()
+        worker.started_at = time.monotonic()
+        worker.restart_at = None
+        LOGGER.info(f"started worker {worker.spec.name} (pid={worker.process.pid})")
+
+    def check(self) -> None:
+        """Restart failed workers (w/ backoff), and forget finished ones."""
+        now = time.monotonic()
+        for name, worker in list(self.workers.items()):
+            assert worker.process
+            if worker.restart_at is not None:
+                if now >= worker.restart_at:
+                    self._start(worker)
+                continue
+            if worker.process.is_alive():
+                continue
+
+            # it exited
+            if self.metrics_dir and worker.process.pid:
+                metrics.mark_process_dead(worker.process.pid, self.metrics_dir)
+            exitcode = worker.process.exitcode
+            if exitcode == 0 and worker.spec.is_finite:
+                LOGGER.info(f"worker {name} is done")
+                del self.workers[name]
+                continue
+
+            if now - worker.started_at >= STABLE_RUNTIME:
+                worker.n_failures = 0
+            worker.n_failures += 1
+            backoff = min(RESTART_BACKOFF_MAX, ENV.TMS_ERROR_WAIT * 2 ** (worker.n_failures - 1))
+            LOGGER.error(
+                f"worker {name} exited ({exitcode=}) -- restarting in {backoff}s "
+                f"(failure #{worker.n_failures})"
+            )
+            worker.restart_at = now + backoff
+
+    def add_jel_watchers(self, schedd: str | None = None) -> None:
+        """Add a watcher worker for each of the schedd's new JELs."""
+        for jel_fpath in schedd_context(schedd).run(JELFileLogic.find_all):
+            self.add(WorkerSpec("watcher", jel_fpath, schedd))
+
+    async def wait_until_done(self, name: str) -> None:
+        """Wait until the (finite) worker is done, restarting it as needed."""
+        while name in self.workers:
+            self.check()
+            await asyncio.sleep(POLL_WAIT)
+
+    def stop_all(self) -> None:
+        """Stop all workers (SIGTERM, then SIGKILL after a timeout)."""
+        procs = [w.process for w in self.workers.values() if w.process and w.process.is_alive()]
+        for proc in procs:
+            proc.terminate()
+        deadline = time.monotonic() + STOP_TIMEOUT
+        for proc in procs:
+            proc.join(max(0.0, deadline - time.monotonic()))
+            if proc.is_alive():
+                LOGGER.warning(f"worker {proc.name} didn't stop -- killing")
+                proc.kill()
+                proc.join()
+
+
+def _warn_per_process_ewms_limits(n_workers: int) -> None:
+    """Warn that each worker has its own EWMS limits, so EWMS sees their sum."""
+    per_jel = " + 1 per JEL" if ENV.TMS_WATCHER_PROCESS_PER_JEL else ""
+    LOGGER.warning(
+        f"each worker ({n_workers}{per_jel}) has its own EWMS client -- its concurrency "
+        f"limit, retry budget & circuit breaker are per-process, so EWMS may see up to "
+        f"{ENV.TMS_EWMS_MAX_CONCURRENCY} x ({n_workers}{per_jel}) in-flight requests"
+    )
+
+
+async def run() -> None:
+    """Run the subsystems as supervised worker processes."""
+    LOGGER.info("Activated.")
+
+    # metrics -- workers write to a shared dir, the supervisor serves them all
+    metrics_dir = None
+    if ENV.TMS_METRICS_PORT:
+        metrics_dir = Path(tempfile.mkdtemp(prefix="tms-metrics-"))
+        os.environ["PROMETHEUS_MULTIPROC_DIR"] = str(metrics_dir)  # (inherited by workers)
+
+    supervisor = Supervisor(metrics_dir)
+    asyncio.get_running_loop().add_signal_handler(
+        signal.SIGTERM, asyncio.current_task().cancel  # type: ignore[union-attr]
+    )
+    try:
+        if metrics_dir:
+            metrics.start_server(metrics_dir)
+
+        # run one-time file manager so other workers don't touch to-be-deleted files
+        for schedd in get_schedds():
+            supervisor.add(WorkerSpec("file_manager_once", schedd=schedd))
+        for schedd in get_schedds():
+            await supervisor.wait_until_done(task_name("file_manager_once", schedd))
+
+        for schedd in get_schedds():
+            supervisor.add(WorkerSpec("scalar", schedd=schedd))
+            if not ENV.TMS_WATCHER_PROCESS_PER_JEL:
+                supervisor.add(WorkerSpec("watcher_loop", schedd=schedd))
+            supervisor.add(WorkerSpec("file_manager", schedd=schedd))
+        _warn_per_process_ewms_limits(len(supervisor.workers))
+
+        jel_scan_at = 0.0
+        while True:
+            if ENV.TMS_WATCHER_PROCESS_PER_JEL and time.monotonic() >= jel_scan_at:
+                for schedd in get_schedds():
+                    supervisor.add_jel_watchers(schedd)
+                jel_scan_at = time.monotonic() + ENV.TMS_OUTER_LOOP_WAIT
+            supervisor.check()
+            await asyncio.sleep(POLL_WAIT)
+    finally:
+        LOGGER.info("Stopping workers...")
+        supervisor.stop_all()
+        if metrics_dir:
+            shutil.rmtree(metrics_dir, ignore_errors=True)
@@ -0,0 +1,158 @@
+"""An in-process cache of EWMS taskforce records, shared by all subsystems.
+
+The watcher, file manager, and scalar all look up the same taskforces on
+EWMS. What doesn't change (a taskforce's cluster id & JEL) is kept for
+TMS_TASKFORCE_CACHE_TTL; what does (its phase, whether a JEL is still
+used) is kept briefly -- except 'condor-complete', which is final.
+
+The TMS's own state-changing calls (condor-submit, condor-rm,
+condor-complete) invalidate what they change, so a subsystem never reads
+back a phase the TMS itself has since changed.
+
+NOTE: w/ 'TMS_MULTIPROCESS', each worker process has its own cache -- so,
+it's only shared by the subsystem(s) in that process, and one process's
+invalidations (ex: the scalar's) don't reach the others (ex: the file
+manager's). There, a JEL's usage is only kept as briefly as a phase.
+"""
+
+import dataclasses as dc
+import logging
+import time
+from functools import cache
+from pathlib import Path
+
+from . import metrics
+from .config import ENV
+from .types import ClusterId
+
+LOGGER = logging.getLogger(__name__)
+
+FINAL_PHASE = "condor-complete"
+PRUNE_INTERVAL = 60  # seconds
+
+
+@dc.dataclass
+class TaskforceRecord:
+    """What's known about a taskforce (None -> unknown)."""
+
+    taskforce_uuid: str
+    cluster_id: ClusterId | None = None
+    job_event_log_fpath: str | None = None
+    phase: str | None = None
+
+    at: float = dc.field(default_factory=time.monotonic)
+    phase_at: float = 0.0
+
+
+class TaskforceCache:
+    """Taskforce records, keyed by uuid and by (JEL, cluster id)."""
+
+    def __init__(self, ttl: float, phase_ttl: float, usage_ttl: float) -> None:
+        self.ttl = ttl
+        self.phase_ttl = phase_ttl
+        self.usage_ttl = usage_ttl
+
+        self._records: dict[str, TaskforceRecord] = {}
+        self._uuids_by_cluster: dict[tuple[str, ClusterId], str] = {}
+        # str(jel) -> (time.monotonic() when looked up, is used by non-completed taskforces)
+        self._jel_usage: dict[str, tuple[float, bool]] = {}
+        self._pruned_at = time.monotonic()
+
+    def _prune(self) -> None:
+        """Drop expired entries (now and then) -- so the cache only holds what's in use."""
+        now = time.monotonic()
+        if now - self._pruned_at < PRUNE_INTERVAL:
+            return
+        self._pruned_at = now
+        for uuid in [u for u, r in self._records.items() if now - r.at > self.ttl]:
+            self._drop(uuid)
+        for jel in [j for j, (at, _) in self._jel_usage.items() if now - at > self.usage_ttl]:
+            del self._jel_usage[jel]
+
+    def _drop(self, taskforce_uuid: str) -> None:
+        record = self._records.pop(taskforce_uuid)
+        if record.job_event_log_fpath and record.cluster_id is not None:
+            self._uuids_by_cluster.pop((record.job_event_log_fpath, record.cluster_id), None)
+
+    def put(
+        self,
+        taskforce_uuid: str,
+        cluster_id: ClusterId | None = None,
+        jel_fpath: Path | str | None = None,
+        phase: str | None = None,
+    ) -> None:
+        """Add/update what's known about the taskforce."""
+        self._prune()
+        record = self._records.setdefault(taskforce_uuid, TaskforceRecord(taskforce_uuid))
+        record.at = time.monotonic()
+        if cluster_id is not None:
+            record.cluster_id = cluster_id
+        if jel_fpath:
+            record.job_event_log_fpath = str(jel_fpath)
+        if phase:
+            record.phase = phase
+            record.phase_at = record.at
+
+        if record.job_event_log_fpath and record.cluster_id is not None:
+            self._uuids_by_cluster[(record.job_event_log_fpath, record.cluster_id)] = (
+                taskforce_uuid
+            )
+
+    def get_uuid(self, jel_fpath: Path | str, cluster_id: ClusterId) -> str | None:
+        """Get the taskforce uuid for the cluster in the JEL, if cached."""
+        uuid = self._uuids_by_cluster.get((str(jel_fpath), cluster_id))
+        if uuid and time.monotonic() - self._records[uuid].at > self.ttl:
+            self._drop(uuid)
+            uuid = None
+        metrics.TASKFORCE_CACHE_LOOKUPS.labels("uuid", "hit" if uuid else "miss").inc()
+        return uuid
+
+    def get_phase(self, taskforce_uuid: str) -> str | None:
+        """Get the taskforce's phase, if cached & still fresh."""
+        phase = None
+        if (record := self._records.get(taskforce_uuid)) and record.phase:
+            ttl = self.ttl if record.phase == FINAL_PHASE else self.phase_ttl
+            if time.monotonic() - record.phase_at <= ttl:
+                phase = record.phase
+        metrics.TASKFORCE_CACHE_LOOKUPS.labels("phase", "hit" if phase else "miss").inc()
+        return phase
+
+    def put_jel_usage(self, jel_fpath: Path | str, is_used: bool) -> None:
+        """Record whether the JEL is used by any non-completed taskforces."""
+        self._prune()
+        self._jel_usage[str(jel_fpath)] = (time.monotonic(), is_used)
+
+    def get_jel_usage(self, jel_fpath: Path | str) -> bool | None:
+        """Get whether the JEL is used by any non-completed taskforces, if cached."""
+        cached = self._jel_usage.get(str(jel_fpath))
+        if cached and time.monotonic() - cached[0] > self.usage_ttl:
+            cached = None
+        metrics.TASKFORCE_CACHE_LOOKUPS.labels("jel_usage", "hit" if cached else "miss").inc()
+        return cached[1] if cached else None
+
+    def invalidate(self, taskforce_uuid: str, jel_fpath: Path | str | None = None) -> None:
+        """Forget what the taskforce's state change may have changed.
+
+        That's its phase and its JEL's usage -- not its ids, which don't change.
+        """
+        if record := self._records.get(taskforce_uuid):
+            record.phase = None
+            jel_fpath = jel_fpath or record.job_event_log_fpath
+        if jel_fpath:
+            self._jel_usage.pop(str(jel_fpath), None)
+        else:  # the JEL's unknown, so any could've changed
+            self._jel_usage.clear()
+        LOGGER.debug(f"invalidated cached state for taskforce {taskforce_uuid}")
+
+
+@cache
+def get_taskforce_cache() -> TaskforceCache:
+    """Get the process-wide taskforce cache."""
+    usage_ttl: float = ENV.TMS_JEL_USAGE_CACHE_TTL
+    if ENV.TMS_MULTIPROCESS:  # other processes' invalidations won't reach this cache
+        usage_ttl = min(usage_ttl, ENV.TMS_TASKFORCE_PHASE_CACHE_TTL)
+    return TaskforceCache(
+        ENV.TMS_TASKFORCE_CACHE_TTL,
+        ENV.TMS_TASKFORCE_PHASE_CACHE_TTL,
+        usage_ttl,
+    )
@@ -0,0 +1,131 @@
+"""Tracing spans for TMS's hot paths (OpenTelemetry).
+
+The tracer provider & exporters are set up by wipac-telemetry (pulled in by
+'wipac-rest-tools[telemetry]'), ex: OTEL_EXPORTER_OTLP_ENDPOINT or
+WIPACTEL_EXPORT_STDOUT. rest-tools' own request spans nest under ours.
+
+Traces are head-sampled at TMS_TRACE_SAMPLE_RATIO: a span started with no
+active parent (ex: a watcher pass) decides for its whole trace. In an
+unsampled trace, the TMS's spans are no-ops, and an unsampled parent is
+made current -- so, rest-tools' spans are dropped too. wipac-telemetry
+can't handle a non-recording span, so those are recorded but never
+exported (see `_RecordUnsampledChildren`).
+"""
+
+import contextvars
+import random
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Iterator, Sequence
+
+import wipac_telemetry.tracing_tools  # noqa: F401  # (sets the tracer provider)
+from opentelemetry import context, trace
+from opentelemetry.sdk.trace import TracerProvider
+from opentelemetry.sdk.trace.sampling import Decision, Sampler, SamplingResult
+from opentelemetry.trace import Link, NonRecordingSpan, SpanContext, TraceFlags
+from opentelemetry.trace.span import TraceState
+from opentelemetry.util.types import Attributes
+
+from .config import ENV
+
+
+class _RecordUnsampledChildren(Sampler):
+    """Parent-based: a child of an unsampled local span is recorded, but not sampled.
+
+    A not-sampled span is never exported (span processors skip it), but,
+    unlike a dropped one, it's a full span -- which wipac-telemetry's
+    '@spanned' needs. Otherwise, `base` decides.
+    """
+
+    def __init__(self, base: Sampler) -> None:
+        self.base = base
+
+    def should_sample(
+        self,
+        parent_context: context.Context | None,
+        trace_id: int,
+        name: str,
+        kind: trace.SpanKind | None = None,
+        attributes: Attributes = None,
+        links: Sequence[Link] | None = None,
+        trace_state: TraceState | None = None,
+    ) -> SamplingResult:
+        parent = trace.get_current_span(parent_context).get_span_context()
+        if parent.is_valid and not parent.is_remote and not parent.trace_flags.sampled:
+            return SamplingResult(Decision.RECORD_ONLY, attributes, parent.trace_state)
+        return self.base.should_sample(
+            parent_context, trace_id, name, kind, attributes, links, trace_state
+        )
+
+    def get_description(self) -> str:
+        return f"RecordUnsampledChildren{{{self.base.get_description()}}}"
+
+
+def _install_sampler() -> None:
+    """Wrap the provider's sampler -- before any (new) tracers are made."""
+    provider = trace.get_tracer_provider()
+    if isinstance(provider, TracerProvider) and not isinstance(
+        provider.sampler, _RecordUnsampledChildren
+    ):
+        provider.sampler = _RecordUnsampledChildren(provider.sampler)
+
+
+_install_sampler()
+
+TRACER = trace.get_tracer("tms")
+
+_UNSAMPLED: contextvars.ContextVar[bool] = contextvars.ContextVar("_UNSAMPLED", default=False)
+
+
+def _clean(attributes: dict[str, Any]) -> dict[str, Any]:
+    """Make the attributes OTel-compatible (None's are dropped)."""
+    return {
+        f"tms.{k}": (str(v) if isinstance(v, Path) else v)
+        for k, v in attributes.items()
+        if v is not None
+    }
+
+
+def _unsampled_span() -> NonRecordingSpan:
+    return NonRecordingSpan(
+        SpanContext(
+            trace_id=random.getrandbits(128) or 1,
+            span_id=random.getrandbits(64) or 1,
+            is_remote=False,
+            trace_flags=TraceFlags(TraceFlags.DEFAULT),  # not sampled
+        )
+    )
+
+
+@contextmanager
+def span(
+    name: str,
+    kind: trace.SpanKind = trace.SpanKind.INTERNAL,
+    **attributes: Any,
+) -> Iterator[trace.Span]:
+    """Start a span (a new, head-sampled trace if there's no active span).
+
+    Attributes are prefixed with 'tms.', ex: taskforce_uuid -> 'tms.taskforce_uuid'.
+    """
+    if _UNSAMPLED.get():
+        yield _unsampled_span()
+        return
+
+    if not trace.get_current_span().get_span_context().is_valid:  # -> root
+        if random.random() >= ENV.TMS_TRACE_SAMPLE_RATIO:
+            token = _UNSAMPLED.set(True)
+            try:
+                with trace.use_span(_unsampled_span()) as unsampled:
+                    yield unsampled
+            finally:
+                _UNSAMPLED.reset(token)
+            return
+
+    with TRACER.start_as_current_span(name, kind=kind, attributes=_clean(attributes)) as s:
+        yield s
+
+
+def set_attributes(s: trace.Span, **attributes: Any) -> None:
+    """Set attributes on the span (ex: results known only at the end)."""
+    if s.is_recording():
+        s.set_attributes(_clean(attributes))
@@ -1,29 +1,95 @@
 """General Utilities."""
 
+import asyncio
+import hashlib
 import logging
+import os
+import shutil
 from datetime import date
 from pathlib import Path
+from typing import Iterable
 
 from rest_tools.client import RestClient
 
-from .condor_tools import get_schedd
-from .config import ENV, WMS_URL_V_PREFIX
+from .condor_tools import get_jel_dir, get_schedd
+from .config import WMS_URL_V_PREFIX
+from .taskforce_cache import FINAL_PHASE, get_taskforce_cache
 
 LOGGER = logging.getLogger(__name__)
 
 
+class PathGuard:
+    """Paths that others must not touch yet.
+
+    ex: the paths that the startup file-manager pass may act on -- so,
+    everything else can be used right away, instead of after the pass.
+    Users wait for the guard to be armed (its first hold), so nothing slips
+    through before then.
+    """
+
+    def __init__(self) -> None:
+        self._held: set[Path] = set()
+        self._released = asyncio.Event()
+        self._armed = asyncio.Event()
+
+    def hold(self, paths: Iterable[Path]) -> None:
+        self._held.update(paths)
+        self._armed.set()
+
+    def release(self, paths: Iterable[Path]) -> None:
+        self._held.difference_update(paths)
+        self._released.set()
+
+    def release_all(self) -> None:
+        self.release(list(self._held))
+        self._armed.set()  # (in case it never held anything -- ex: an error)
+
+    async def wait_armed(self) -> None:
+        """Wait until the guard holds what it's going to hold."""
+        await self._armed.wait()
+
+    def is_held(self, path: Path) -> bool:
+        return path in self._held
+
+    async def wait(self, timeout: float) -> None:
+        """Sleep for the timeout -- or, if paths are held, until some are released."""
+        if not self._held:
+            await asyncio.sleep(timeout)
+            return
+        self._released.clear()
+        try:
+            await asyncio.wait_for(self._released.wait(), timeout)
+        except TimeoutError:
+            pass
+
+
+class _ScheddDir:
+    """A class attribute for a dir in the (current task's) schedd's JEL dir."""
+
+    def __init__(self, subdir: str = "") -> None:
+        self.subdir = subdir
+
+    def __get__(self, obj: object, objtype: type | None = None) -> Path:
+        return get_jel_dir() / self.subdir
+
+
 class JELFileLogic:
     """Logic for setting up and detecting job event log files."""
 
-    parent = ENV.JOB_EVENT_LOG_DIR
+    parent = _ScheddDir()
     extension = ".tms.jel"
 
+    @staticmethod
+    def get_todays_path() -> Path:
+        """Get today's log file name -- the one new submits use."""
+        # ex: .../2024-1-27.tms.jel
+        return JELFileLogic.parent / f"{date.today()}{JELFileLogic.extension}"
+
     @staticmethod
     def create_path() -> Path:
         """Generate a log file name and mkdir parents."""
         JELFileLogic.parent.mkdir(parents=True, exist_ok=True)
-        # ex: .../tms-2024-1-27.log
-        return JELFileLogic.parent / f"{date.today()}{JELFileLogic.extension}"
+        return JELFileLogic.get_todays_path()
 
     @staticmethod
     def is_valid(fpath: Path) -> bool:
@@ -35,23 +101,59 @@ class JELFileLogic:
         )
 
     @staticmethod
-    async def has_no_noncompleted_taskforces(ewms_rc: RestClient, fpath: Path) -> bool:
-        """Return whether there are no non-completed taskforces using JEL."""
+    def find_all() -> list[Path]:
+        """Get the schedd's (valid) log files."""
+        return [f for f in JELFileLogic.parent.iterdir() if JELFileLogic.is_valid(f)]
+
+    @staticmethod
+    async def _query_in_use(ewms_rc: RestClient, fpaths: list[Path]) -> set[str]:
+        """Get which of the JELs are used by non-completed taskforces (one request)."""
         resp = await ewms_rc.request(
             "POST",
             f"/{WMS_URL_V_PREFIX}/query/taskforces",
             {
                 "query": {
-                    "job_event_log_fpath": str(fpath),
+                    "job_event_log_fpath": {"$in": [str(f) for f in fpaths]},
                     "schedd": get_schedd(),
                     "phase": {"$ne": "condor-complete"},  # only non-completed tfs
                 },
-                "projection": ["taskforce_uuid"],
+                "projection": ["job_event_log_fpath"],
             },
         )
-        noncompleted_tfs = resp["taskforces"]
+        in_use = {tf["job_event_log_fpath"] for tf in resp["taskforces"]}
+
+        tf_cache = get_taskforce_cache()
+        for f in fpaths:
+            tf_cache.put_jel_usage(f, str(f) in in_use)
+        return in_use
+
+    @staticmethod
+    async def prefetch_usage(ewms_rc: RestClient, fpaths: list[Path]) -> None:
+        """Look up, in one request, whether each JEL is still used.
+
+        The results are used by `has_no_noncompleted_taskforces()`, for
+        'TMS_JEL_USAGE_CACHE_TTL' seconds (or until a taskforce's state changes).
+        """
+        tf_cache = get_taskforce_cache()
+        if todo := [f for f in fpaths if tf_cache.get_jel_usage(f) is None]:
+            LOGGER.debug(f"looking up usage of {len(todo)} JEL(s)")
+            await JELFileLogic._query_in_use(ewms_rc, todo)
+
+    @staticmethod
+    async def has_no_noncompleted_taskforces(
+        ewms_rc: RestClient,
+        fpath: Path,
+        fresh: bool = False,
+    ) -> bool:
+        """Return whether there are no non-completed taskforces using JEL.
+
+        If `fresh`, EWMS is asked even if the JEL's usage is cached.
+        """
+        is_used = None if fresh else get_taskforce_cache().get_jel_usage(fpath)
+        if is_used is None:
+            is_used = bool(await JELFileLogic._query_in_use(ewms_rc, [fpath]))
 
-        if noncompleted_tfs:
+        if is_used:
             LOGGER.debug(
                 f"There are still non-completed taskforces using JEL {fpath} -- DON'T DELETE"
             )
@@ -66,7 +168,7 @@ class JELFileLogic:
 class TaskforceDirLogic:
     """Logic for setting up a taskforce dir."""
 
-    parent = ENV.JOB_EVENT_LOG_DIR
+    parent = _ScheddDir()
     prefix = "ewms-taskforce-"
 
     @staticmethod
@@ -75,3 +177,81 @@ class TaskforceDirLogic:
         path = TaskforceDirLogic.parent / f"{TaskforceDirLogic.prefix}{taskforce_uuid}"
         path.mkdir(exist_ok=True)
         return path
+
+    @staticmethod
+    async def is_not_in_use(ewms_rc: RestClient, dpath: Path) -> bool:
+        """Return whether the dir's taskforce is not non-completed (its jobs are done)."""
+        taskforce_uuid = dpath.name.removeprefix(TaskforceDirLogic.prefix)
+        if get_taskforce_cache().get_phase(taskforce_uuid) == FINAL_PHASE:
+            return True
+
+        resp = await ewms_rc.request(
+            "POST",
+            f"/{WMS_URL_V_PREFIX}/query/taskforces",
+            {
+                "query": {
+                    "taskforce_uuid": taskforce_uuid,
+                    "schedd": get_schedd(),
+                    "phase": {"$ne": "condor-complete"},  # only non-completed tfs
+                },
+                "projection": ["taskforce_uuid"],
+            },
+        )
+        if resp["taskforces"]:
+            LOGGER.debug(f"taskforce dir {dpath} is still in use")
+            return False
+        return True
+
+
+class SharedFileLogic:
+    """Logic for a content-addressed store of files shared by taskforce dirs.
+
+    Identical files are written once, then hardlinked into each taskforce dir.
+    """
+
+    parent = _ScheddDir("ewms-shared-files")
+
+    @staticmethod
+    def _write_object(content: bytes, mode: int) -> Path:
+        """Write the content to the store (if it's not already there)."""
+        obj = SharedFileLogic.parent / hashlib.sha256(content).hexdigest()
+        if obj.exists():
+            return obj
+
+        SharedFileLogic.parent.mkdir(parents=True, exist_ok=True)
+        tmp = obj.with_name(f".{obj.name}.{os.getpid()}.tmp")
+        try:
+            tmp.write_bytes(content)
+            tmp.chmod(mode)
+            os.replace(tmp, obj)  # atomic on same filesystem
+        finally:
+            tmp.unlink(missing_ok=True)
+        return obj
+
+    @staticmethod
+    def link(content: bytes, dest: Path, mode: int = 0o644) -> Path:
+        """Place a file with `content` at `dest`, hardlinked from the store."""
+        dest.unlink(missing_ok=True)
+
+        for _ in range(2):  # 2nd try: the object was removed between write and link
+            obj = SharedFileLogic._write_object(content, mode)
+            try:
+                os.link(obj, dest)
+                return dest
+            except FileNotFoundError:
+                continue
+            except OSError as e:  # ex: hardlinks not supported
+                LOGGER.warning(f"could not hardlink {obj} -> {dest}, copying: {e!r}")
+                break
+
+        shutil.copyfile(obj, dest)
+        dest.chmod(mode)
+        return dest
+
+    @staticmethod
+    async def is_unreferenced(fpath: Path) -> bool:
+        """Return whether the stored file is no longer linked into any taskforce dir."""
+        try:
+            return fpath.stat().st_nlink <= 1
+        except FileNotFoundError:
+            return False
@@ -11,6 +11,7 @@ from rest_tools.client import RestClient
 from .. import condor_tools, types
 from ..condor_tools import get_schedd
 from ..config import WMS_URL_V_PREFIX
+from ..taskforce_cache import FINAL_PHASE, get_taskforce_cache
 
 LOGGER = logging.getLogger(__name__)
 
@@ -111,7 +112,9 @@ async def query_all_taskforces(
             "projection": ["taskforce_uuid", "cluster_id"],
         },
     )
+    tf_cache = get_taskforce_cache()
     for dicto in res["taskforces"]:
+        tf_cache.put(dicto["taskforce_uuid"], dicto["cluster_id"], jel_fpath)
         yield dicto["taskforce_uuid"], dicto["cluster_id"]
 
 
@@ -121,6 +124,9 @@ async def get_taskforce_uuid(
     jel_fpath: Path,
 ) -> str:
     """Get the taskforce uuid for the given cluster id + jel."""
+    if taskforce_uuid := get_taskforce_cache().get_uuid(jel_fpath, cluster_id):
+        return taskforce_uuid
+
     LOGGER.debug(
         f"Querying for taskforce_uuid for {cluster_id=} in '{jel_fpath.name}'..."
     )
@@ -137,9 +143,11 @@ async def get_taskforce_uuid(
         },
     )
     try:
-        return res["taskforces"][0]["taskforce_uuid"]
+        taskforce_uuid = res["taskforces"][0]["taskforce_uuid"]
     except Exception as e:
-        raise ClusterNotTrackedByEWMSError(cluster_id) from e
+        raise ClusterNotTrackedByEWMSError(cluster_id) from e  # (not cached, may be soon)
+    get_taskforce_cache().put(taskforce_uuid, cluster_id, jel_fpath)
+    return taskforce_uuid
 
 
 async def send_condor_complete(
@@ -155,3 +163,6 @@ async def send_condor_complete(
             "condor_complete_ts": timestamp,
         },
     )
+    tf_cache = get_taskforce_cache()
+    tf_cache.invalidate(taskforce_uuid)
+    tf_cache.put(taskforce_uuid, phase=FINAL_PHASE)
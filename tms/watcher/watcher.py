@@ -5,6 +5,7 @@ import collections
 import enum
 import logging
 import pprint
+import time
 from logging import Logger
 from pathlib import Path
 from typing import Any, AsyncIterator
@@ -23,12 +24,13 @@ from .utils import (
     query_all_taskforces,
     send_condor_complete,
 )
-from .. import condor_tools, types
+from .. import condor_tools, metrics, startup, tracing, types
 from ..config import (
     ENV,
     WATCHER_N_TOP_TASK_ERRORS,
     WMS_URL_V_PREFIX,
 )
+from ..ewms_client import EWMSRequestShed
 from ..types import ClusterId
 
 sdict = dict[str, Any]
@@ -231,6 +233,8 @@ class ClusterInfo:
         jie: JobInfoKey,
         value_code_tuple: JobInfoVal,
     ) -> None:
+        # NOTE: procs are added lazily, since with late materialization the schedd
+        #   creates (and logs) procs over the lifetime of the cluster
         if job_event.proc not in self._jobs:
             self._jobs[job_event.proc] = {}
 
@@ -340,6 +344,17 @@ class JobEventLogWatcher:
 
         self._verbose_logging_timer_seconds = ENV.TMS_MAX_LOGGING_INTERVAL
 
+        # metrics -- bind labels once, this is a hot path
+        # ex: '2024-01-05.tms.jel' -- or, w/ 'TMS_SCHEDDS', 'ap1/2024-01-05.tms.jel'
+        self._metrics_jel = (
+            str(self.jel_fpath.relative_to(ENV.JOB_EVENT_LOG_DIR))
+            if self.jel_fpath.is_relative_to(ENV.JOB_EVENT_LOG_DIR)
+            else self.jel_fpath.name
+        )
+        self._m_events = metrics.JEL_EVENTS.labels(self._metrics_jel)
+        self._newest_event_timestamp: int | None = None
+        self._n_events_read = 0  # total, for tracing
+
     async def start(self) -> None:
         """Watch over one JEL file, containing multiple taskforces.
 
@@ -360,6 +375,8 @@ class JobEventLogWatcher:
         jel_timer = IntervalTimer(
             ENV.TMS_WATCHER_INTERVAL, f"{self.logger.name}.jel_timer"
         )
+        if ENV.TMS_WATCHER_READ_ON_START:  # don't wait an interval (ex: after a restart)
+            jel_timer.fastforward()
         verbose_logging_timer = IntervalTimer(self._verbose_logging_timer_seconds, None)
         verbose_logging_timer.fastforward()  # this way we will start w/ a verbose log
 
@@ -369,23 +386,38 @@ class JobEventLogWatcher:
             # wait for JEL to populate more
             await jel_timer.wait_until_interval()
 
-            # parse & update
-            try:
-                await self._look_at_job_event_log(jel)
-            except JobEventLogDeleted:
-                # ensure we flush any pending state
-                await self.maybe_update_ewms(log_verbose=True, force=True)
-                self.logger.info(
-                    "job event log was deleted; flushed final updates and stopping watcher."
-                )
-                return
+            # one trace per pass
+            with tracing.span("watcher.pass", jel=self._metrics_jel):
+                # parse & update
+                try:
+                    with tracing.span("watcher.read_jel", jel=self._metrics_jel) as span:
+                        n_events_before = self._n_events_read
+                        await self._look_at_job_event_log(jel)
+                        tracing.set_attributes(
+                            span,
+                            events=self._n_events_read - n_events_before,
+                            clusters=len(self.cluster_infos),
+                        )
+                except JobEventLogDeleted:
+                    # ensure we flush any pending state
+                    await self.maybe_update_ewms(log_verbose=True, force=True)
+                    self.logger.info(
+                        "job event log was deleted; flushed final updates and stopping watcher."
+                    )
+                    metrics.forget_jel(self._metrics_jel)
+                    return
 
-            # logging
-            if log_verbose := verbose_logging_timer.has_interval_elapsed():
-                self._verbose_log_event_counts()
+                if self._newest_event_timestamp is not None:
+                    metrics.JEL_READ_LAG.labels(self._metrics_jel).set(
+                        time.time() - self._newest_event_timestamp
+                    )
+
+                # logging
+                if log_verbose := verbose_logging_timer.has_interval_elapsed():
+                    self._verbose_log_event_counts()
 
-            # update ewms
-            await self.maybe_update_ewms(log_verbose, force=True)
+                # update ewms
+                await self.maybe_update_ewms(log_verbose, force=True)
 
     async def _look_at_job_event_log(self, jel: htcondor.JobEventLog) -> None:
         """The main logic for parsing a job event log and sending updates to EWMS."""
@@ -408,6 +440,9 @@ class JobEventLogWatcher:
                 await asyncio.sleep(0)  # since htcondor is not async
                 job_event = next(events_iter)
                 self._logging_summary[_LCEnum.N_EVENTS][job_event.cluster] += 1
+                self._m_events.inc()
+                self._n_events_read += 1
+                self._newest_event_timestamp = job_event.timestamp
                 await asyncio.sleep(0)  # since htcondor is not async
             except StopIteration:
                 break
@@ -509,10 +544,33 @@ class JobEventLogWatcher:
             )
 
         # snapshot cluster_infos, then update ewms
-        patch_body = self._snapshot_cluster_infos_per_taskforce(
-            self.cluster_infos, self.logger
+        with (
+            metrics.timed(metrics.SNAPSHOT_DURATION.labels(self._metrics_jel)),
+            tracing.span("watcher.snapshot", jel=self._metrics_jel) as span,
+        ):
+            patch_body = self._snapshot_cluster_infos_per_taskforce(
+                self.cluster_infos, self.logger
+            )
+            tracing.set_attributes(
+                span,
+                clusters=len(self.cluster_infos),
+                changed_statuses=len(patch_body[_ALL_COMP_STAT_KEY]),
+                changed_errors=len(patch_body[_ALL_TOP_ERRORS_KEY]),
+            )
+        metrics.TRACKED_CLUSTERS.labels(self._metrics_jel).set(len(self.cluster_infos))
+        metrics.TRACKED_PROCS.labels(self._metrics_jel).set(
+            sum(len(c._jobs) for c in self.cluster_infos.values())
         )
-        await self._update_ewms(self.ewms_rc, patch_body, log_verbose, self.logger)
+        try:
+            await self._update_ewms(self.ewms_rc, patch_body, log_verbose, self.logger)
+        except EWMSRequestShed as e:
+            # EWMS is overloaded -- forget what was snapshotted, so it's re-sent next time
+            self.logger.warning(f"status update was shed, will re-send: {e}")
+            for info in self.cluster_infos.values():
+                if info.taskforce_uuid in patch_body[_ALL_COMP_STAT_KEY]:
+                    info.compound_statuses = {}
+                if info.taskforce_uuid in patch_body[_ALL_TOP_ERRORS_KEY]:
+                    info.top_task_errors = {}
 
     @staticmethod
     def _snapshot_cluster_infos_per_taskforce(
@@ -572,6 +630,7 @@ class JobEventLogWatcher:
                 patch_body,
             )
             logger.info("ewms updates sent.")
+            startup.milestone("first EWMS status update")
         else:
             if log_verbose:
                 logger.info("no updates needed for ewms.")
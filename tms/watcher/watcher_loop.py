@@ -7,16 +7,24 @@ from pathlib import Path
 from rest_tools.client import RestClient
 
 from . import watcher
+from .. import startup
 from ..config import ENV
-from ..utils import JELFileLogic
+from ..utils import JELFileLogic, PathGuard
 
 LOGGER = logging.getLogger(__name__)
 
 
-async def run(ewms_rc: RestClient) -> None:
-    """Watch over all JEL files and send EWMS taskforce updates."""
+async def run(ewms_rc: RestClient, startup_guard: PathGuard | None = None) -> None:
+    """Watch over all JEL files and send EWMS taskforce updates.
+
+    JELs held by the `startup_guard` (ex: they may be archived) are skipped
+    until released.
+    """
     LOGGER.info("Activated.")
 
+    if startup_guard:
+        await startup_guard.wait_armed()
+
     # track which JEL paths are already being watched
     in_progress: set[Path] = set()
 
@@ -25,15 +33,15 @@ async def run(ewms_rc: RestClient) -> None:
     async with asyncio.TaskGroup() as tg:
         while True:
             LOGGER.debug(  # very chatty
-                f"Analyzing JEL directory for new logs ({ENV.JOB_EVENT_LOG_DIR})..."
+                f"Analyzing JEL directory for new logs ({JELFileLogic.parent})..."
             )
-            for jel_fpath in ENV.JOB_EVENT_LOG_DIR.iterdir():
-                if not JELFileLogic.is_valid(jel_fpath):
-                    continue
-
+            for jel_fpath in JELFileLogic.find_all():
                 # skip if already in progress
                 if jel_fpath in in_progress:
                     continue
+                if startup_guard and startup_guard.is_held(jel_fpath):
+                    LOGGER.debug(f"JEL {jel_fpath} is held by the startup file manager")
+                    continue
 
                 # mark as in-progress
                 in_progress.add(jel_fpath)
@@ -41,10 +49,16 @@ async def run(ewms_rc: RestClient) -> None:
                 # go!
                 LOGGER.info(f"Creating new watcher for JEL {jel_fpath}...")
                 jel_watcher = watcher.JobEventLogWatcher(jel_fpath, ewms_rc)
-                task = tg.create_task(jel_watcher.start())
+                task = tg.create_task(
+                    jel_watcher.start(), name=f"watcher:{jel_fpath.name}"
+                )
 
                 # when the watcher exits (normal/error), allow re-watching this path
                 task.add_done_callback(lambda _t, p=jel_fpath: in_progress.remove(p))  # type: ignore
+                startup.milestone("first watcher started")
 
-            # wait before scanning for new logs again
-            await asyncio.sleep(ENV.TMS_OUTER_LOOP_WAIT)
+            # wait before scanning for new logs again (or, until a held JEL is released)
+            if startup_guard:
+                await startup_guard.wait(ENV.TMS_OUTER_LOOP_WAIT)
+            else:
+                await asyncio.sleep(ENV.TMS_OUTER_LOOP_WAIT)